@@ -1,50 +1,192 @@
+import argparse
 import asyncio
+import contextlib
+import io
+import threading
+import time
 from rich.console import Console
-from rich.markdown import Markdown
-from rich.progress import Progress, SpinnerColumn, TextColumn
-from tracking.check_state import check_files_state
-from query_handler import query_with_llm
+from daemon_client import DaemonUnavailable, is_daemon_running, send_request, stream_request
+from settings import setup_logging
 
 console = Console()
 
-async def main():
-    progress = Progress(
-        SpinnerColumn(),
-        TextColumn("[progress.description]{task.description}"),
-        console=console,
-        transient=True
-    )
 
+def refresh_index(use_daemon):
+    """Updates embeddings through the daemon if one is running, otherwise in-process."""
+    if use_daemon:
+        return send_request({"action": "refresh"}).get("changed")
+    from tracking.check_state import check_files_state
+    return check_files_state()
+
+
+def load_embedding_model():
+    from embeddings_manager import get_embedding_model
+    get_embedding_model()
+
+
+def open_collection():
+    from embeddings_manager import get_chroma_collection
+    from vaults import writable_vaults
+    for vault in writable_vaults():
+        get_chroma_collection(vault)
+
+
+def connect_llm_client():
+    from settings import config
+    from query_handler import initialize_client
+    initialize_client(config["llm"].get("provider", "groq").lower())
+
+
+def run_in_background(func, *args):
+    """Runs func in a daemon thread and returns an asyncio future for its result.
+
+    Daemon threads let Ctrl+C at the prompt exit immediately instead of waiting
+    for an index refresh to finish.
+    """
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+
+    def set_result(result):
+        if not future.done():
+            future.set_result(result)
+
+    def set_exception(exc):
+        if not future.done():
+            future.set_exception(exc)
+
+    def target():
+        try:
+            result = func(*args)
+        except BaseException as e:
+            loop.call_soon_threadsafe(set_exception, e)
+        else:
+            loop.call_soon_threadsafe(set_result, result)
+
+    threading.Thread(target=target, name=f"startup-{func.__name__}", daemon=True).start()
+    return future
+
+
+def start_startup_tasks(use_daemon):
+    """Starts the work that does not depend on the query, so it overlaps with typing.
+
+    Returns a dict of task name to future. Only the index refresh is required to
+    succeed; the other tasks only warm things up and are retried by the query path.
+    """
+    if use_daemon:
+        return {"index refresh": run_in_background(refresh_index, True)}
+    return {
+        "index refresh": run_in_background(refresh_index, False),
+        "embedding model": run_in_background(load_embedding_model),
+        "ChromaDB collection": run_in_background(open_collection),
+        "LLM client": run_in_background(connect_llm_client),
+    }
+
+
+async def finish_startup_tasks(tasks):
+    """Waits for whichever startup tasks are still running and re-raises index refresh errors."""
+    pending = [name for name, task in tasks.items() if not task.done()]
+    if pending:
+        with console.status(f"[bold cyan]Waiting for {', '.join(pending)}...", spinner="dots"):
+            await asyncio.wait(list(tasks.values()))
+    for task in tasks.values():
+        task.exception()  # warm-up failures resurface (and are retried) in the query path
+    return tasks["index refresh"].result()
+
+
+def stream_query(query, use_daemon, vaults=None):
+    """Yields answer events through the daemon if one is running, otherwise in-process."""
+    if use_daemon:
+        started = False
+        request = {"action": "query_stream", "query": query}
+        if vaults:
+            request["vaults"] = vaults
+        try:
+            for event in stream_request(request):
+                started = True
+                yield event
+            return
+        except DaemonUnavailable:
+            if started:
+                raise
+    from query_handler import stream_query_with_llm
+    yield from stream_query_with_llm(query, vaults=vaults)
+
+
+def render_stream(events):
+    """Prints referenced documents, then renders the answer as Markdown while it streams in."""
+    from rich.live import Live
+    from rich.markdown import Markdown
+
+    start_time = time.perf_counter()
+    first_token_time = None
+    response_content = ""
+    live = None
+    status = console.status("[bold cyan]Searching documents and asking the LLM...", spinner="dots")
+    status.start()
     try:
-        with progress:
-            task = progress.add_task("Checking file states & updating embeddings...", total=None)
-            await asyncio.to_thread(check_files_state)
-            progress.remove_task(task)
+        for event in events:
+            if event["type"] == "ids":
+                referenced_ids = event.get("referenced_ids")
+                if referenced_ids:
+                    status.stop()
+                    console.print("\n[bold yellow]Referencing documents:[/bold yellow]")
+                    for doc_id in referenced_ids:
+                        console.print(f"- [dim]{doc_id}[/dim]")
+                    console.print()
+                    status.start()
+            elif event["type"] == "text":
+                if first_token_time is None:
+                    first_token_time = time.perf_counter() - start_time
+                    status.stop()
+                    live = Live(Markdown(""), console=console, refresh_per_second=12, vertical_overflow="visible")
+                    live.start()
+                response_content += event["text"]
+                live.update(Markdown(response_content))
+    finally:
+        status.stop()
+        if live is not None:
+            live.stop()
+
+    total_time = time.perf_counter() - start_time
+    if first_token_time is not None:
+        console.print(f"\n[dim]Time to first token: {first_token_time:.2f}s · Total: {total_time:.2f}s[/dim]")
+    return response_content
+
+
+async def main(profile=False, trace_path=None, vaults=None):
+    # Profiling needs every stage in this process, so it bypasses the daemon.
+    use_daemon = False if profile else await asyncio.to_thread(is_daemon_running)
+    if profile:
+        import profiling
+        profiling.enable()
+    tasks = start_startup_tasks(use_daemon)
 
+    # Background work prints progress; hold it back while the user is typing.
+    startup_output = io.StringIO()
+    try:
+        console.print("[bold blue]Enter your query: [/bold blue]", end="")
+        with contextlib.redirect_stdout(startup_output):
+            query = await run_in_background(input)
+    except (KeyboardInterrupt, EOFError):
+        return
+
+    if startup_output.getvalue().strip():
+        console.print(startup_output.getvalue(), style="dim", end="", markup=False, highlight=False)
+
+    try:
+        await finish_startup_tasks(tasks)
     except Exception as e:
         console.print(f"\n[bold red]Error during file checking/processing:[/bold red] {e}")
         return
 
     try:
-        query = console.input("[bold blue]Enter your query: [/bold blue]")
         if not query.strip():
             return
 
-        response_content = ""
-        referenced_ids = None
-
-        with console.status("[bold cyan]Searching documents and asking the LLM...", spinner="dots"):
-            response_content, referenced_ids = query_with_llm(query)
-
-        if referenced_ids:
-            console.print("\n[bold yellow]Referencing documents:[/bold yellow]")
-            for doc_id in referenced_ids:
-                console.print(f"- [dim]{doc_id}[/dim]")
-            console.print()
-
-        if response_content:
-            response_md = Markdown(response_content)
-            console.print(response_md)
+        render_stream(stream_query(query, use_daemon, vaults))
+        if profile:
+            import profiling
+            profiling.report(trace_path)
 
     except KeyboardInterrupt:
         pass
@@ -53,7 +195,23 @@ async def main():
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ask questions about your Markdown notes.")
+    parser.add_argument("--watch", action="store_true",
+                        help="keep the index up to date as notes change instead of asking a query")
+    parser.add_argument("--profile", action="store_true",
+                        help="run in-process and print a per-stage timing breakdown after the answer")
+    parser.add_argument("--profile-trace", metavar="PATH",
+                        help="with --profile, also write the spans as a Chrome trace JSON file")
+    parser.add_argument("--vault", action="append", metavar="NAME",
+                        help="search only this vault (repeatable or comma-separated; default: [retrieval] vaults)")
+    args = parser.parse_args()
+    setup_logging()
     try:
-        asyncio.run(main())
+        if args.watch:
+            from watcher import watch
+            watch()
+        else:
+            vaults = [name.strip() for value in args.vault or [] for name in value.split(",") if name.strip()]
+            asyncio.run(main(args.profile or bool(args.profile_trace), args.profile_trace, vaults or None))
     except KeyboardInterrupt:
         pass
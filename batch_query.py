@@ -0,0 +1,191 @@
+import argparse
+import asyncio
+import contextlib
+import json
+import sys
+from itertools import islice
+from note_metadata import parse_filters
+from settings import config, get_logger, setup_logging
+from vaults import get_vault
+
+log = get_logger(__name__)
+
+batch_config = config.get("batch", {})
+
+CONCURRENCY = int(batch_config.get("concurrency", 8))
+RETRIEVAL_BATCH_SIZE = int(batch_config.get("retrieval_batch_size", 64))
+N_RESULTS = int(batch_config.get("n_results", 3))
+
+
+def parse_record(index, line):
+    """Turns one JSONL input line into a record dict with `index`, `id`, `query`, `n_results` and `vaults`.
+
+    A line is either a JSON string (the query) or an object with a `query` key and
+    optional `id`, `n_results` and `vaults` (a list of vault names or a
+    comma-separated string). Filter terms in the query (tag:, path:, after:,
+    before:) are split off into `question` and `filters`, a JSON-encoded
+    ChromaDB where clause. Invalid lines get an `error` instead of a query.
+    """
+    record = {"index": index, "id": index}
+    try:
+        value = json.loads(line)
+    except json.JSONDecodeError as e:
+        return {**record, "error": f"Invalid JSON: {e}"}
+    if isinstance(value, str):
+        value = {"query": value}
+    if not isinstance(value, dict) or not isinstance(value.get("query"), str) or not value["query"].strip():
+        return {**record, "error": "Expected a JSON string or an object with a non-empty 'query'."}
+    try:
+        n_results = int(value.get("n_results", N_RESULTS))
+    except (TypeError, ValueError):
+        return {**record, "id": value.get("id", index), "error": "'n_results' must be an integer."}
+    vaults = value.get("vaults") or ()
+    if isinstance(vaults, str):
+        vaults = [name.strip() for name in vaults.split(",") if name.strip()]
+    try:
+        vaults = tuple(get_vault(name).name for name in vaults)
+    except (TypeError, ValueError) as e:
+        return {**record, "id": value.get("id", index), "error": f"Invalid 'vaults': {e}"}
+    question, where = parse_filters(value["query"])
+    return {**record, "id": value.get("id", index), "query": value["query"], "question": question,
+            "filters": json.dumps(where, sort_keys=True), "n_results": n_results, "vaults": vaults}
+
+
+def read_batch(lines, start_index, size):
+    """Reads up to `size` non-blank lines and returns their records, numbered from start_index."""
+    records = []
+    for line in islice((line for line in lines if line.strip()), size):
+        records.append(parse_record(start_index + len(records), line))
+    return records
+
+
+def prepare_batch(records):
+    """Retrieves and packs the context of a batch of records, in place.
+
+    All queries are embedded in one call and queries sharing n_results, vaults
+    and filters go to ChromaDB together; each valid record gets its packed `chunks`.
+    """
+    from query_handler import get_query_embeddings, pack_context, retrieve_chunks_batch
+    valid = [record for record in records if "error" not in record]
+    if not valid:
+        return records
+    embeddings = dict(zip((record["index"] for record in valid), get_query_embeddings([record["question"] for record in valid])))
+    for key in sorted({(record["n_results"], record["vaults"], record["filters"]) for record in valid}):
+        n_results, vaults, filters = key
+        group = [record for record in valid if (record["n_results"], record["vaults"], record["filters"]) == key]
+        query_embeddings = [embeddings[record["index"]] for record in group]
+        retrieved = retrieve_chunks_batch(
+            [record["question"] for record in group], n_results, query_embeddings, vaults or None, json.loads(filters)
+        )
+        for record, chunks, query_embedding in zip(group, retrieved, query_embeddings):
+            record["chunks"] = pack_context(record["question"], chunks, query_embedding)
+    return records
+
+
+async def answer_record(record, client, semaphore):
+    """Returns the output line for a record, holding a semaphore slot while the LLM is queried."""
+    from query_handler import answer_with_async_client
+    output = {"index": record["index"], "id": record["id"], "query": record.get("query")}
+    if "error" in record:
+        return {**output, "error": record["error"]}
+    if isinstance(client, Exception):
+        return {**output, "error": f"Error initializing LLM client: {client}"}
+    async with semaphore:
+        answer, referenced_ids = await answer_with_async_client(client, record["question"], record["chunks"])
+    return {**output, "answer": answer, "referenced_ids": referenced_ids}
+
+
+async def run_batch(lines, out, concurrency=CONCURRENCY, batch_size=RETRIEVAL_BATCH_SIZE):
+    """Answers every JSONL query in lines and writes one JSON line per query to out, in input order.
+
+    Retrieval runs batch by batch in a worker thread while up to `concurrency`
+    LLM requests from earlier batches are in flight. A line is written as soon
+    as it and every line before it are answered; the queries of a batch whose
+    retrieval fails get an `error` line. Returns the number of lines written.
+    """
+    from query_handler import initialize_async_client
+    provider = config["llm"].get("provider", "groq").lower()
+    try:
+        client = await asyncio.to_thread(initialize_async_client, provider)
+    except (ValueError, ImportError, ConnectionError) as e:
+        log.error(f"Error initializing LLM client: {e}")
+        client = e
+
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    # Answer tasks in input order; the bound keeps a slow early answer from piling up finished ones.
+    pending = asyncio.Queue(maxsize=max(batch_size, concurrency) * 2)
+    written = 0
+
+    async def write_in_order():
+        nonlocal written
+        while (task := await pending.get()) is not None:
+            out.write(json.dumps(await task, ensure_ascii=False) + "\n")
+            out.flush()
+            written += 1
+
+    lines = iter(lines)
+
+    def next_batch(start):
+        records = read_batch(lines, start, batch_size)
+        try:
+            return prepare_batch(records)
+        except Exception as e:
+            log.error(f"Error retrieving context for queries {start}-{start + len(records) - 1}: {e}")
+            return [record if "error" in record else {**record, "error": f"Error retrieving context: {e}"} for record in records]
+
+    writer = asyncio.create_task(write_in_order())
+    index = 0
+    try:
+        while records := await asyncio.to_thread(next_batch, index):
+            index += len(records)
+            log.info(f"Retrieved context for {index} queries so far...")
+            for record in records:
+                await pending.put(asyncio.create_task(answer_record(record, client, semaphore)))
+    finally:
+        await pending.put(None)
+        await writer
+    return written
+
+
+def main(input_path="-", output_path="-", concurrency=CONCURRENCY, batch_size=RETRIEVAL_BATCH_SIZE,
+         refresh=True, profile=False, trace_path=None):
+    if profile:
+        import profiling
+        profiling.enable()
+    if refresh:
+        from tracking.check_state import check_files_state
+        check_files_state()
+
+    with contextlib.ExitStack() as stack:
+        source = sys.stdin if input_path == "-" else stack.enter_context(open(input_path, "r", encoding="utf-8"))
+        out = sys.stdout if output_path == "-" else stack.enter_context(open(output_path, "w", encoding="utf-8"))
+        written = asyncio.run(run_batch(source, out, concurrency, batch_size))
+    log.info(f"Wrote {written} answer(s).")
+
+    if profile:
+        import profiling
+        with contextlib.redirect_stdout(sys.stderr):
+            profiling.report(trace_path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Answer a JSONL file of queries (one JSON string or {\"id\", \"query\", \"n_results\"} object per line)."
+    )
+    parser.add_argument("input", nargs="?", default="-", help="JSONL file of queries, or - for stdin (default)")
+    parser.add_argument("-o", "--output", default="-", help="JSONL file for the answers, or - for stdout (default)")
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY, help="maximum LLM requests in flight")
+    parser.add_argument("--batch-size", type=int, default=RETRIEVAL_BATCH_SIZE,
+                        help="queries embedded and retrieved together")
+    parser.add_argument("--no-refresh", action="store_true", help="skip updating the index before answering")
+    parser.add_argument("--profile", action="store_true", help="print a per-stage timing breakdown to stderr")
+    parser.add_argument("--profile-trace", metavar="PATH",
+                        help="with --profile, also write the spans as a Chrome trace JSON file")
+    args = parser.parse_args()
+    # stdout carries the answers, so diagnostics go to stderr.
+    setup_logging(stream=sys.stderr)
+    try:
+        main(args.input, args.output, args.concurrency, args.batch_size, not args.no_refresh,
+             args.profile or bool(args.profile_trace), args.profile_trace)
+    except KeyboardInterrupt:
+        pass
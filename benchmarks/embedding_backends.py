@@ -0,0 +1,117 @@
+"""Compares the CPU embedding backends on synthetic notes.
+
+For every backend in --backends (see [embeddings] backend in config.toml) it
+loads the model with embeddings_manager.load_embedding_model, encodes the
+chunks of a synthetic vault (see vault.py) and reports load time, encode
+throughput and, against the first backend (normally "torch"):
+
+* the mean and minimum cosine similarity between the two backends' vectors;
+* retrieval agreement: the mean overlap of the top --k chunks for sampled
+  queries, so quality loss from quantization shows up as a retrieval metric.
+
+Hugging Face downloads are disabled, so the model (and, for --onnx-file, that
+ONNX export) must already be in the local cache.
+
+Usage (from the repository root):
+    python benchmarks/embedding_backends.py [--model all-MiniLM-L6-v2] [--backends torch,onnx,int8] [--json out.json]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+os.environ.setdefault("HF_HUB_OFFLINE", "1")
+os.environ.setdefault("TRANSFORMERS_OFFLINE", "1")
+
+import numpy as np  # noqa: E402
+
+BENCHMARKS_DIR = Path(__file__).resolve().parent
+REPO_ROOT = BENCHMARKS_DIR.parent
+sys.path.insert(0, str(REPO_ROOT))
+sys.path.insert(0, str(BENCHMARKS_DIR))
+
+from chunker import chunk_markdown  # noqa: E402
+from vault import generate_vault, sample_queries  # noqa: E402
+
+
+def vault_chunks(notes, seed):
+    """Generates a synthetic vault and returns (chunk texts, queries)."""
+    with tempfile.TemporaryDirectory(prefix="querymd-backends-") as tmp_dir:
+        vault_dir = Path(tmp_dir) / "vault"
+        paths = generate_vault(vault_dir, notes=notes, seed=seed)
+        texts = []
+        for relative_path in paths:
+            content = (vault_dir / relative_path).read_text(encoding="utf-8")
+            texts.extend(chunk["text"] for chunk in chunk_markdown(content))
+        queries = sample_queries(vault_dir, paths, 50, seed=seed + 2)
+    return texts, queries
+
+
+def measure(model, texts, queries, batch_size):
+    model.encode(texts[:batch_size], batch_size=batch_size)  # warm-up
+    start = time.perf_counter()
+    vectors = model.encode(texts, batch_size=batch_size, normalize_embeddings=True)
+    seconds = time.perf_counter() - start
+    query_vectors = model.encode(queries, batch_size=batch_size, normalize_embeddings=True)
+    return np.asarray(vectors, dtype=np.float32), np.asarray(query_vectors, dtype=np.float32), seconds
+
+
+def top_k(vectors, query_vectors, k):
+    return np.argsort(-(query_vectors @ vectors.T), axis=1, kind="stable")[:, :k]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="all-MiniLM-L6-v2")
+    parser.add_argument("--backends", default="torch,onnx,int8", help="comma-separated; the first is the reference")
+    parser.add_argument("--onnx-file", help="ONNX export used by the onnx backend, e.g. onnx/model_qint8_avx512_vnni.onnx")
+    parser.add_argument("--threads", type=int, default=0, help="CPU threads per backend (0 = library default)")
+    parser.add_argument("--notes", type=int, default=300)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", dest="json_path")
+    args = parser.parse_args()
+
+    from embeddings_manager import load_embedding_model
+
+    texts, queries = vault_chunks(args.notes, args.seed)
+    print(f"{len(texts)} chunks from {args.notes} notes, {len(queries)} queries, top-{args.k}")
+    results = {"model": args.model, "chunks": len(texts), "queries": len(queries), "k": args.k, "backends": []}
+    reference = None
+    print(f"{'backend':>8}  {'load s':>7}  {'chunks/s':>9}  {'mean cos':>8}  {'min cos':>8}  {'top-k overlap':>13}")
+    for backend in [name.strip() for name in args.backends.split(",") if name.strip()]:
+        start = time.perf_counter()
+        try:
+            model = load_embedding_model(args.model, backend, args.threads, args.onnx_file if backend == "onnx" else None)
+        except Exception as e:
+            print(f"{backend:>8}  skipped: {e}")
+            results["backends"].append({"backend": backend, "error": str(e)})
+            continue
+        load_seconds = time.perf_counter() - start
+        vectors, query_vectors, seconds = measure(model, texts, queries, args.batch_size)
+        result = {"backend": backend, "load_s": load_seconds, "encode_s": seconds, "chunks_per_s": len(texts) / seconds}
+        if reference is None:
+            reference = (vectors, top_k(vectors, query_vectors, args.k))
+        else:
+            cosines = np.sum(vectors * reference[0], axis=1)
+            ranked = top_k(vectors, query_vectors, args.k)
+            overlap = np.mean([len(set(a) & set(b)) / args.k for a, b in zip(ranked, reference[1])])
+            result.update(mean_cosine=float(cosines.mean()), min_cosine=float(cosines.min()), topk_overlap=float(overlap))
+        results["backends"].append(result)
+        print(
+            f"{backend:>8}  {load_seconds:>7.2f}  {result['chunks_per_s']:>9.1f}  "
+            f"{result.get('mean_cosine', 1.0):>8.4f}  {result.get('min_cosine', 1.0):>8.4f}  "
+            f"{result.get('topk_overlap', 1.0):>13.3f}"
+        )
+
+    if args.json_path:
+        Path(args.json_path).write_text(json.dumps(results, indent=2))
+        print(f"Results written to {args.json_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Measures the selection overhead of maximal marginal relevance.
+
+Times diversity.maximal_marginal_relevance on random unit vectors for several
+candidate pool sizes (n_results * fetch_multiplier), next to a straightforward
+pure-Python MMR loop for reference. Fetching the candidates' embeddings from
+ChromaDB is the other part of the cost; `python app.py --profile` shows it
+under chroma.query / chroma.get.
+
+Usage (from the repository root):
+    python benchmarks/mmr.py [--dims 384] [--k 3] [--json out.json]
+"""
+import argparse
+import json
+import sys
+import timeit
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from diversity import maximal_marginal_relevance  # noqa: E402
+
+
+def python_mmr(relevance, embeddings, k, lambda_mult):
+    """Reference MMR that recomputes cosine similarities with Python loops."""
+    def cosine(a, b):
+        dot = sum(x * y for x, y in zip(a, b))
+        return dot / ((sum(x * x for x in a) ** 0.5) * (sum(y * y for y in b) ** 0.5) or 1)
+
+    selected = []
+    remaining = list(range(len(relevance)))
+    while remaining and len(selected) < k:
+        best = max(remaining, key=lambda i: lambda_mult * relevance[i] - (1 - lambda_mult) * max(
+            (cosine(embeddings[i], embeddings[j]) for j in selected), default=0.0))
+        selected.append(best)
+        remaining.remove(best)
+    return selected
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dims", type=int, default=384)
+    parser.add_argument("--k", type=int, default=3, help="results selected (n_results)")
+    parser.add_argument("--lambda-mult", type=float, default=0.7)
+    parser.add_argument("--pools", default="6,12,20,40,100,400", help="comma-separated candidate pool sizes")
+    parser.add_argument("--json", dest="json_path")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    results = {"dims": args.dims, "k": args.k, "lambda": args.lambda_mult, "pools": []}
+    print(f"{'candidates':>10}  {'numpy us':>10}  {'python us':>10}")
+    for size in [int(value) for value in args.pools.split(",")]:
+        embeddings = rng.standard_normal((size, args.dims)).astype(np.float32)
+        relevance = rng.random(size).astype(np.float32)
+        number = max(3, 2000 // size)
+        numpy_us = min(timeit.repeat(
+            lambda: maximal_marginal_relevance(relevance, embeddings, args.k, args.lambda_mult), number=number, repeat=3
+        )) / number * 1e6
+        embeddings_list, relevance_list = embeddings.tolist(), relevance.tolist()
+        python_us = min(timeit.repeat(
+            lambda: python_mmr(relevance_list, embeddings_list, args.k, args.lambda_mult), number=1, repeat=3
+        )) * 1e6
+        assert maximal_marginal_relevance(relevance, embeddings, args.k, args.lambda_mult) == \
+            python_mmr(relevance_list, embeddings_list, args.k, args.lambda_mult)
+        results["pools"].append({"candidates": size, "numpy_us": numpy_us, "python_us": python_us})
+        print(f"{size:>10}  {numpy_us:>10.1f}  {python_us:>10.1f}")
+
+    if args.json_path:
+        Path(args.json_path).write_text(json.dumps(results, indent=2))
+        print(f"Results written to {args.json_path}")
+
+
+if __name__ == "__main__":
+    main()
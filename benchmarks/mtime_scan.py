@@ -0,0 +1,117 @@
+"""Benchmarks a no-change mtime scan over a synthetic vault.
+
+Creates N Markdown files (plus a .git directory full of objects that must be
+pruned) under a temporary directory, then times:
+
+* the previous scanner: os.walk + Path.resolve + is_file + getmtime + getsize;
+* scan_markdown_files with one worker and with --workers threads;
+* the full no-change check: load the SQLite state store, scan and compare.
+
+Usage (from the repository root):
+    python benchmarks/mtime_scan.py [--files 100000] [--workers 8] [--json out.json]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from tracking.mtime_tracking import MtimeStateStore, file_content_hash, scan_markdown_files  # noqa: E402
+
+
+def build_vault(root, n_files, files_per_dir=200, git_objects=2000):
+    """Writes n_files small notes spread over nested directories, plus a fake .git tree."""
+    for i in range(n_files):
+        directory = root / f"area{i % 10}" / f"topic{(i // files_per_dir) % 50}" / f"batch{i // (files_per_dir * 50)}"
+        directory.mkdir(parents=True, exist_ok=True)
+        (directory / f"note{i}.md").write_text(f"# Note {i}\n\nSome text for note {i}.\n")
+    objects = root / ".git" / "objects"
+    for i in range(git_objects):
+        directory = objects / f"{i % 256:02x}"
+        directory.mkdir(parents=True, exist_ok=True)
+        (directory / f"{i:038x}").write_bytes(b"x")
+
+
+def legacy_scan(base_dir):
+    """The os.walk-based scan this tracker used before switching to os.scandir."""
+    found = {}
+    for root, _, filenames in os.walk(base_dir):
+        if '.git' in Path(root).parts:
+            continue
+        for filename in filenames:
+            file_path = Path(root) / filename
+            if file_path.suffix.lower() not in ('.md', '.markdown'):
+                continue
+            abs_path_str = str(file_path.resolve())
+            if not file_path.is_file():
+                continue
+            found[abs_path_str] = {'mtime': os.path.getmtime(file_path), 'size': os.path.getsize(file_path)}
+    return found
+
+
+def timed(func, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=100_000)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", dest="json_path")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="querymd-scan-") as tmp:
+        vault = Path(tmp) / "vault"
+        print(f"Creating {args.files} notes in {vault}...")
+        build_vault(vault, args.files)
+
+        store = MtimeStateStore(Path(tmp) / "state.sqlite3")
+        store.apply({
+            path: (mtime_ns, size, file_content_hash(vault / path))
+            for path, (mtime_ns, size) in scan_markdown_files(vault, workers=args.workers).items()
+        }, [])
+
+        def no_change_check():
+            previous = store.load()
+            current = scan_markdown_files(vault, workers=args.workers)
+            changed = [p for p, (m, s) in current.items() if previous.get(p, (None, None))[:2] != (m, s)]
+            deleted = [p for p in previous if p not in current]
+            return changed, deleted
+
+        results = {"files": args.files, "workers": args.workers}
+        results["legacy_os_walk_s"], legacy = timed(lambda: legacy_scan(vault), args.repeat)
+        results["scandir_1_worker_s"], found = timed(lambda: scan_markdown_files(vault, workers=1), args.repeat)
+        results[f"scandir_{args.workers}_workers_s"], _ = timed(
+            lambda: scan_markdown_files(vault, workers=args.workers), args.repeat
+        )
+        results["no_change_check_s"], (changed, deleted) = timed(no_change_check, args.repeat)
+        results["state_db_bytes"] = os.path.getsize(store.path)
+        store.close()
+
+        legacy_json = json.dumps(legacy, indent=4)
+        results["legacy_json_state_bytes"] = len(legacy_json.encode())
+
+        assert len(found) == len(legacy) == args.files, (len(found), len(legacy))
+        assert not changed and not deleted
+
+    for key, value in results.items():
+        print(f"  {key:<28} {value:.3f}" if isinstance(value, float) else f"  {key:<28} {value}")
+
+    if args.json_path:
+        Path(args.json_path).write_text(json.dumps(results, indent=2))
+        print(f"Results written to {args.json_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""Measures QueryMD cold-start cost.
+
+Two measurements are taken from the repository root:
+
+* `python -X importtime -c "import <module>"` for the entry-point modules, reporting
+  the cumulative import time and the heaviest imports pulled in;
+* the wall time from launching `python app.py` until the query prompt appears.
+
+Usage: python benchmarks/startup.py [--repeat N] [--json out.json]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+MODULES = ["app", "daemon_client", "tracking.check_state", "query_handler", "embeddings_manager"]
+PROMPT = b"Enter your query"
+
+
+def import_profile(module):
+    """Returns (cumulative_us, [(cumulative_us, name), ...]) for importing module in a fresh interpreter."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=REPO_ROOT, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr.strip().splitlines()[-1]}")
+
+    entries = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, raw_name = line[len("import time:"):].split("|", 2)
+        # Nested imports are indented by two extra spaces per level.
+        depth = (len(raw_name) - len(raw_name.lstrip()) - 1) // 2
+        entries.append((int(cumulative_us), raw_name.strip(), depth))
+
+    # Entries are printed in post-order: the module's subtree directly precedes it.
+    end = next((i for i, (_, name, depth) in enumerate(entries) if name == module and depth == 0), None)
+    if end is None:
+        return 0, []
+    start = end
+    while start > 0 and entries[start - 1][2] > 0:
+        start -= 1
+    heaviest = sorted((cumulative, name) for cumulative, name, depth in entries[start:end] if depth == 1)
+    return entries[end][0], heaviest[::-1][:10]
+
+
+def time_to_prompt(timeout=120.0):
+    """Launches app.py and returns the seconds until the query prompt is printed."""
+    env = dict(os.environ, PYTHONUNBUFFERED="1")
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "app.py"], cwd=REPO_ROOT, env=env,
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+    )
+    output = b""
+    try:
+        while PROMPT not in output:
+            chunk = os.read(proc.stdout.fileno(), 4096)
+            if not chunk:
+                raise RuntimeError(f"app.py exited before showing the prompt:\n{output.decode(errors='replace')}")
+            output += chunk
+            if time.perf_counter() - start > timeout:
+                raise TimeoutError("Timed out waiting for the query prompt.")
+        elapsed = time.perf_counter() - start
+    finally:
+        proc.stdin.close()
+        try:
+            proc.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=3, help="number of app.py launches to time")
+    parser.add_argument("--json", dest="json_path", help="write the results to this JSON file")
+    args = parser.parse_args()
+
+    results = {"imports": {}, "time_to_prompt_s": None}
+
+    print("Import time (cumulative, fresh interpreter):")
+    for module in MODULES:
+        try:
+            total, heaviest = import_profile(module)
+        except RuntimeError as e:
+            print(f"  {module:<24} failed: {e}")
+            continue
+        results["imports"][module] = {
+            "cumulative_ms": total / 1000,
+            "heaviest": [{"module": name, "cumulative_ms": us / 1000} for us, name in heaviest],
+        }
+        print(f"  {module:<24} {total / 1000:8.1f} ms")
+        for us, name in heaviest[:5]:
+            if name != module:
+                print(f"      {name:<28} {us / 1000:8.1f} ms")
+
+    samples = []
+    for _ in range(args.repeat):
+        try:
+            samples.append(time_to_prompt())
+        except (RuntimeError, TimeoutError) as e:
+            print(f"Launch to prompt failed: {e}")
+            break
+    if samples:
+        results["time_to_prompt_s"] = {
+            "samples": samples,
+            "median": statistics.median(samples),
+            "min": min(samples),
+        }
+        print(f"Launch to prompt: median {statistics.median(samples):.3f}s, min {min(samples):.3f}s over {len(samples)} run(s)")
+
+    if args.json_path:
+        Path(args.json_path).write_text(json.dumps(results, indent=2))
+        print(f"Results written to {args.json_path}")
+
+
+if __name__ == "__main__":
+    main()
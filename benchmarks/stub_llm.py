@@ -0,0 +1,99 @@
+"""A local stand-in for an OpenAI-compatible chat completions endpoint.
+
+It answers every request with a fixed reply after a configurable delay, in
+plain or streamed (server-sent events) form, so that end-to-end query latency
+can be measured offline. Point QueryMD at it with:
+
+    [llm]
+    provider = "openai"
+    model_name = "stub"
+    base_url = "http://127.0.0.1:PORT/v1"
+
+and any non-empty OPENAI_API_KEY.
+
+Usage: python benchmarks/stub_llm.py [--port 8765] [--latency-ms 50]
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+REPLY = "This is a canned answer from the benchmark stub LLM. It is based only on the provided context."
+
+
+class StubLLMHandler(BaseHTTPRequestHandler):
+    latency = 0.05
+    token_delay = 0.0
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        if not self.path.endswith("/chat/completions"):
+            self.send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+            return
+
+        time.sleep(self.latency)
+        model = request.get("model", "stub")
+        created = int(time.time())
+        if not request.get("stream"):
+            self.send_json(200, {
+                "id": "chatcmpl-stub", "object": "chat.completion", "created": created, "model": model,
+                "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": REPLY}}],
+                "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        for word in REPLY.split(" "):
+            chunk = {
+                "id": "chatcmpl-stub", "object": "chat.completion.chunk", "created": created, "model": model,
+                "choices": [{"index": 0, "finish_reason": None, "delta": {"content": word + " "}}],
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+            time.sleep(self.token_delay)
+        self.wfile.write(b"data: [DONE]\n\n")
+
+
+def start_stub_llm(port=0, latency_ms=50, token_delay_ms=0):
+    """Starts the stub server in a daemon thread; returns (server, base_url)."""
+    handler = type("ConfiguredStubLLMHandler", (StubLLMHandler,), {
+        "latency": latency_ms / 1000, "token_delay": token_delay_ms / 1000,
+    })
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="stub-llm", daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=50, help="delay before each response")
+    parser.add_argument("--token-delay-ms", type=float, default=0, help="delay between streamed words")
+    args = parser.parse_args()
+
+    server, base_url = start_stub_llm(args.port, args.latency_ms, args.token_delay_ms)
+    print(f"Stub LLM listening on {base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+"""End-to-end QueryMD benchmark suite.
+
+For each state tracking method it generates a synthetic vault (see vault.py),
+writes a throwaway config and, in a fresh interpreter, measures:
+
+* full index time of the whole vault;
+* no-change scan time (median of --scan-repeat runs);
+* incremental re-index time after editing --edits notes;
+* `relevant_documents` latency percentiles over --queries queries;
+* end-to-end `query_with_llm` latency against a local stub LLM (stub_llm.py).
+
+The query caches are disabled so every query does the full work. Everything
+runs offline: Hugging Face downloads are disabled, so --encoder model needs the
+embedding model in the local cache, while --encoder stub uses a hashing
+encoder instead (this leaves out model cost but keeps every other stage real).
+
+Usage (from the repository root):
+    python benchmarks/suite.py [--notes 2000] [--methods mtime,git] [--encoder stub] [--json results.json]
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+from datetime import datetime, timezone
+from pathlib import Path
+
+import toml
+
+BENCHMARKS_DIR = Path(__file__).resolve().parent
+REPO_ROOT = BENCHMARKS_DIR.parent
+
+from stub_llm import start_stub_llm  # noqa: E402
+from vault import edit_notes, generate_vault, sample_queries  # noqa: E402
+
+
+class HashingEncoder:
+    """Offline stand-in for a SentenceTransformer: hashed bag-of-words vectors, L2-normalised."""
+
+    def __init__(self, dimensions=384):
+        self.dimensions = dimensions
+
+    def encode(self, sentences, batch_size=32, **kwargs):
+        import numpy as np
+        vectors = np.zeros((len(sentences), self.dimensions), dtype=np.float32)
+        for row, sentence in enumerate(sentences):
+            for token in sentence.lower().split():
+                vectors[row, zlib.crc32(token.encode("utf-8")) % self.dimensions] += 1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1, norms)
+
+    def parameters(self):
+        return []
+
+
+def percentiles(samples):
+    """Returns min/p50/p90/p99/max/mean in milliseconds for a list of seconds."""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+
+    def rank(p):
+        return ordered[min(len(ordered) - 1, max(0, round(p / 100 * len(ordered) + 0.5) - 1))] * 1000
+
+    return {
+        "count": len(ordered), "min_ms": ordered[0] * 1000, "p50_ms": rank(50), "p90_ms": rank(90),
+        "p99_ms": rank(99), "max_ms": ordered[-1] * 1000, "mean_ms": statistics.fmean(ordered) * 1000,
+    }
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+def write_config(path, work_dir, vault_dir, method, encoder, model_name, base_url):
+    config = {
+        "embeddings": {
+            "embeddings_function": "stub-hashing" if encoder == "stub" else model_name,
+            "collection_name": "bench_notes",
+            "embeddings_path": str(work_dir / "embeddings"),
+        },
+        "files": {"markdown_directory": str(vault_dir), "state_file": str(work_dir / "state.json")},
+        "state_tracking": {"method": method},
+        "llm": {"provider": "openai", "model_name": "stub", "base_url": base_url, "temperature": 0.0, "additonal_info": "False"},
+        "cache": {"enabled": False},
+    }
+    path.write_text(toml.dumps(config))
+
+
+def run_worker(args):
+    """Runs the measurements for one tracking method; the config comes from QUERYMD_CONFIG."""
+    sys.path.insert(0, str(REPO_ROOT))
+    from settings import setup_logging
+    setup_logging()
+    import embeddings_manager
+    if args.encoder == "stub":
+        embeddings_manager._model = HashingEncoder()
+    from tracking.check_state import check_files_state
+    from query_handler import initialize_client, query_with_llm, relevant_documents
+
+    vault_dir = Path(args.vault)
+    paths = [str(p.relative_to(vault_dir)) for p in sorted(vault_dir.rglob("*.md")) if ".git" not in p.parts]
+    results = {"notes": len(paths)}
+
+    results["full_index_s"], _ = timed(check_files_state)
+    results["chunks"] = embeddings_manager.get_chroma_collection().count()
+    results["full_index_docs_per_s"] = len(paths) / results["full_index_s"]
+
+    scans = [timed(check_files_state)[0] for _ in range(args.scan_repeat)]
+    results["no_change_scan_s"] = statistics.median(scans)
+
+    edited = edit_notes(vault_dir, paths, args.edits)
+    results["edits"] = len(edited)
+    results["incremental_reindex_s"], _ = timed(check_files_state)
+
+    queries = sample_queries(vault_dir, paths, args.queries + 1)
+    relevant_documents(queries[0])  # warm-up: model, collection and BM25 index are opened lazily
+    results["relevant_documents"] = percentiles([timed(relevant_documents, q)[0] for q in queries[1:]])
+
+    initialize_client("openai")  # warm-up: the provider SDK is imported on first use
+    llm_queries = queries[1:args.llm_queries + 1]
+    latencies = []
+    for query in llm_queries:
+        elapsed, (answer, _) = timed(query_with_llm, query)
+        if answer.startswith(("Error", "An error occurred")):
+            raise RuntimeError(answer)
+        latencies.append(elapsed)
+    results["query_with_llm"] = percentiles(latencies)
+    results["stub_llm_latency_ms"] = args.llm_latency_ms
+
+    Path(args.result_file).write_text(json.dumps(results))
+
+
+def run_method(args, method, tmp_dir, base_url):
+    """Generates a vault for one method and runs the worker for it in a subprocess."""
+    work_dir = tmp_dir / method
+    vault_dir = work_dir / "vault"
+    print(f"[{method}] generating {args.notes} notes...")
+    generate_vault(vault_dir, args.notes, args.depth, args.fanout, args.words, args.seed, use_git=(method == "git"))
+
+    config_path = work_dir / "config.toml"
+    result_path = work_dir / "result.json"
+    log_path = work_dir / "worker.log"
+    write_config(config_path, work_dir, vault_dir, method, args.encoder, args.model, base_url)
+
+    env = dict(os.environ, QUERYMD_CONFIG=str(config_path), OPENAI_API_KEY="stub",
+               HF_HUB_OFFLINE="1", TRANSFORMERS_OFFLINE="1", ANONYMIZED_TELEMETRY="False")
+    command = [sys.executable, str(Path(__file__).resolve()), "--worker", "--vault", str(vault_dir),
+               "--result-file", str(result_path), *worker_arguments(args)]
+    print(f"[{method}] indexing and querying (log: {log_path})...")
+    with open(log_path, "w") as log:
+        completed = subprocess.run(command, cwd=REPO_ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+    if completed.returncode != 0:
+        tail = log_path.read_text(errors="replace").strip().splitlines()[-15:]
+        raise RuntimeError(f"{method} benchmark failed:\n" + "\n".join(tail))
+    return json.loads(result_path.read_text())
+
+
+def worker_arguments(args):
+    return ["--encoder", args.encoder, "--edits", str(args.edits), "--queries", str(args.queries),
+            "--llm-queries", str(args.llm_queries), "--scan-repeat", str(args.scan_repeat),
+            "--llm-latency-ms", str(args.llm_latency_ms)]
+
+
+def metadata(args):
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = None
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": commit or None,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "parameters": {
+            "notes": args.notes, "depth": args.depth, "fanout": args.fanout, "words": args.words,
+            "seed": args.seed, "encoder": args.encoder, "model": args.model if args.encoder == "model" else None,
+            "edits": args.edits, "queries": args.queries, "llm_queries": args.llm_queries,
+            "llm_latency_ms": args.llm_latency_ms,
+        },
+    }
+
+
+def print_summary(method, result):
+    print(f"[{method}] {result['notes']} notes, {result['chunks']} chunks")
+    print(f"  full index            {result['full_index_s']:8.2f} s  ({result['full_index_docs_per_s']:.1f} docs/s)")
+    print(f"  no-change scan        {result['no_change_scan_s'] * 1000:8.1f} ms")
+    print(f"  re-index {result['edits']:>4} edits   {result['incremental_reindex_s'] * 1000:8.1f} ms")
+    for name in ("relevant_documents", "query_with_llm"):
+        stats = result[name]
+        if stats:
+            print(f"  {name:<21} p50 {stats['p50_ms']:.1f} ms, p90 {stats['p90_ms']:.1f} ms, p99 {stats['p99_ms']:.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--notes", type=int, default=2000)
+    parser.add_argument("--depth", type=int, default=3, help="directory nesting levels")
+    parser.add_argument("--fanout", type=int, default=5, help="subdirectories per level")
+    parser.add_argument("--words", type=int, default=300, help="average words per note")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--methods", default="mtime,git", help="comma-separated state tracking methods")
+    parser.add_argument("--edits", type=int, default=50, help="notes edited before the incremental re-index")
+    parser.add_argument("--queries", type=int, default=200, help="queries for relevant_documents latency")
+    parser.add_argument("--llm-queries", type=int, default=50, help="queries for end-to-end query_with_llm latency")
+    parser.add_argument("--scan-repeat", type=int, default=3)
+    parser.add_argument("--llm-latency-ms", type=float, default=50, help="stub LLM response delay")
+    parser.add_argument("--encoder", choices=["model", "stub"], default="model",
+                        help="'model' uses the SentenceTransformer from the local cache, 'stub' a hashing encoder")
+    parser.add_argument("--model", default="all-MiniLM-L6-v2", help="embedding model for --encoder model")
+    parser.add_argument("--json", dest="json_path", help="write the results to this JSON file")
+    parser.add_argument("--keep", action="store_true", help="keep the generated vaults and indexes")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--vault", help=argparse.SUPPRESS)
+    parser.add_argument("--result-file", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args)
+        return
+
+    server, base_url = start_stub_llm(latency_ms=args.llm_latency_ms)
+    results = {"meta": metadata(args), "results": {}}
+    tmp_dir = Path(tempfile.mkdtemp(prefix="querymd-bench-"))
+    try:
+        for method in [m.strip() for m in args.methods.split(",") if m.strip()]:
+            results["results"][method] = run_method(args, method, tmp_dir, base_url)
+            print_summary(method, results["results"][method])
+    finally:
+        server.shutdown()
+        if args.keep:
+            print(f"Benchmark files kept in {tmp_dir}")
+        else:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    if args.json_path:
+        Path(args.json_path).write_text(json.dumps(results, indent=2))
+        print(f"Results written to {args.json_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""Compares storing chunk text in ChromaDB with reading it lazily from the notes.
+
+For both values of [embeddings] store_text it indexes the same synthetic vault
+(see vault.py) into a fresh embeddings directory and reports:
+
+* the on-disk size of the ChromaDB store (chroma.sqlite3 and the HNSW segment
+  files; the BM25 index and caches are the same in both modes and left out);
+* the time to open the persistent store and the collection in a fresh
+  interpreter (median of --open-repeat runs);
+* full index time and `relevant_documents` latency percentiles, which include
+  the memory-mapped span reads and hash checks of the lazy mode.
+
+--encoder stub uses the hashing encoder from suite.py so the run is offline
+and fast; --encoder model uses the SentenceTransformer from the local cache.
+
+Usage (from the repository root):
+    python benchmarks/text_storage.py [--notes 2000] [--encoder stub] [--json out.json]
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+import toml
+
+BENCHMARKS_DIR = Path(__file__).resolve().parent
+REPO_ROOT = BENCHMARKS_DIR.parent
+
+from suite import HashingEncoder, percentiles, timed  # noqa: E402
+from vault import generate_vault, sample_queries  # noqa: E402
+
+MODES = {"stored": True, "lazy": False}
+OPEN_SCRIPT = """
+import sys, time
+start = time.perf_counter()
+import chromadb
+client = chromadb.PersistentClient(path=sys.argv[1])
+collection = client.get_collection(sys.argv[2])
+collection.count()
+print(time.perf_counter() - start)
+"""
+
+
+def write_config(path, work_dir, vault_dir, store_text, encoder, model_name):
+    config = {
+        "embeddings": {
+            "embeddings_function": "stub-hashing" if encoder == "stub" else model_name,
+            "collection_name": "bench_notes",
+            "embeddings_path": str(work_dir / "embeddings"),
+            "store_text": store_text,
+        },
+        "files": {"markdown_directory": str(vault_dir), "state_file": str(work_dir / "state.json")},
+        "state_tracking": {"method": "mtime"},
+        "llm": {"provider": "openai", "model_name": "stub"},
+        "cache": {"enabled": False},
+    }
+    path.write_text(toml.dumps(config))
+
+
+def store_size(embeddings_dir):
+    """Returns the bytes used by chroma.sqlite3 (with its WAL) and the collection segment directories."""
+    total = 0
+    for path in embeddings_dir.iterdir():
+        if path.name.startswith("chroma.sqlite3"):
+            total += path.stat().st_size
+        elif path.is_dir():
+            total += sum(file.stat().st_size for file in path.rglob("*") if file.is_file())
+    return total
+
+
+def run_worker(args):
+    """Indexes the vault and measures query latency; the config comes from QUERYMD_CONFIG."""
+    sys.path.insert(0, str(REPO_ROOT))
+    from settings import setup_logging
+    setup_logging("WARNING")
+    import embeddings_manager
+    if args.encoder == "stub":
+        embeddings_manager._model = HashingEncoder()
+    from tracking.check_state import check_files_state
+    from query_handler import relevant_documents
+
+    vault_dir = Path(args.vault)
+    paths = [str(p.relative_to(vault_dir)) for p in sorted(vault_dir.rglob("*.md"))]
+    results = {"notes": len(paths)}
+    results["full_index_s"], _ = timed(check_files_state)
+    results["chunks"] = embeddings_manager.get_chroma_collection().count()
+
+    queries = sample_queries(vault_dir, paths, args.queries + 1)
+    relevant_documents(queries[0])  # warm-up
+    results["relevant_documents"] = percentiles([timed(relevant_documents, q)[0] for q in queries[1:]])
+    Path(args.result_file).write_text(json.dumps(results))
+
+
+def run_mode(args, mode, vault_dir, tmp_dir):
+    work_dir = tmp_dir / mode
+    work_dir.mkdir(parents=True)
+    config_path = work_dir / "config.toml"
+    result_path = work_dir / "result.json"
+    write_config(config_path, work_dir, vault_dir, MODES[mode], args.encoder, args.model)
+
+    env = dict(os.environ, QUERYMD_CONFIG=str(config_path), HF_HUB_OFFLINE="1", TRANSFORMERS_OFFLINE="1",
+               ANONYMIZED_TELEMETRY="False")
+    command = [sys.executable, str(Path(__file__).resolve()), "--worker", "--vault", str(vault_dir),
+               "--result-file", str(result_path), "--encoder", args.encoder, "--queries", str(args.queries)]
+    print(f"[{mode}] indexing and querying...")
+    completed = subprocess.run(command, cwd=REPO_ROOT, env=env, capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(f"{mode} benchmark failed:\n" + "\n".join(completed.stderr.strip().splitlines()[-15:]))
+    result = json.loads(result_path.read_text())
+
+    embeddings_dir = work_dir / "embeddings"
+    result["store_bytes"] = store_size(embeddings_dir)
+    opens = []
+    for _ in range(args.open_repeat):
+        output = subprocess.run([sys.executable, "-c", OPEN_SCRIPT, str(embeddings_dir), "bench_notes"],
+                                env=env, capture_output=True, text=True, check=True).stdout
+        opens.append(float(output.strip().splitlines()[-1]))
+    result["open_s"] = statistics.median(opens)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--notes", type=int, default=2000)
+    parser.add_argument("--words", type=int, default=300, help="average words per note")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--queries", type=int, default=200, help="queries for relevant_documents latency")
+    parser.add_argument("--open-repeat", type=int, default=5, help="fresh interpreters timed for the store open")
+    parser.add_argument("--encoder", choices=["model", "stub"], default="stub")
+    parser.add_argument("--model", default="all-MiniLM-L6-v2", help="embedding model for --encoder model")
+    parser.add_argument("--json", dest="json_path")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--vault", help=argparse.SUPPRESS)
+    parser.add_argument("--result-file", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args)
+        return
+
+    tmp_dir = Path(tempfile.mkdtemp(prefix="querymd-text-"))
+    results = {}
+    try:
+        vault_dir = tmp_dir / "vault"
+        print(f"Generating {args.notes} notes...")
+        generate_vault(vault_dir, args.notes, words=args.words, seed=args.seed)
+        vault_bytes = sum(p.stat().st_size for p in vault_dir.rglob("*.md"))
+        for mode in MODES:
+            results[mode] = run_mode(args, mode, vault_dir, tmp_dir)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    print(f"\nNotes on disk: {vault_bytes / 1e6:.1f} MB")
+    print(f"{'mode':<8} {'chunks':>7} {'store MB':>9} {'open ms':>8} {'index s':>8} {'query p50':>10} {'p90':>7}")
+    for mode, result in results.items():
+        stats = result["relevant_documents"]
+        print(f"{mode:<8} {result['chunks']:>7} {result['store_bytes'] / 1e6:>9.1f} {result['open_s'] * 1000:>8.0f} "
+              f"{result['full_index_s']:>8.2f} {stats['p50_ms']:>8.1f}ms {stats['p90_ms']:>5.1f}ms")
+
+    if args.json_path:
+        Path(args.json_path).write_text(json.dumps({"notes_bytes": vault_bytes, "results": results}, indent=2))
+        print(f"Results written to {args.json_path}")
+
+
+if __name__ == "__main__":
+    main()
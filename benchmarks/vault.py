@@ -0,0 +1,143 @@
+"""Generates synthetic Markdown vaults for benchmarking.
+
+Notes are spread over a directory tree of configurable depth and fan-out and
+contain headings, paragraphs, lists and the occasional exact identifier
+(error codes, hostnames, ticket IDs) so that both vector and keyword search
+have something to find. Output is deterministic for a given seed.
+
+Usage (from the repository root):
+    python benchmarks/vault.py OUT_DIR [--notes 1000] [--depth 3] [--fanout 5] [--words 300] [--git]
+"""
+import argparse
+import random
+import subprocess
+from pathlib import Path
+
+SYLLABLES = ["ka", "lo", "mi", "ne", "ru", "sa", "to", "vi", "xe", "zu", "dra", "pel", "qua", "ston", "ber", "lin"]
+
+
+def make_vocabulary(rng, size=5000):
+    """Returns `size` distinct pseudo-words."""
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+
+def note_directory(index, depth, fanout):
+    """Returns the relative directory of the index-th note in a tree of the given depth and fan-out."""
+    parts = []
+    value = index
+    for level in range(depth):
+        value //= fanout
+        parts.append(f"level{level}-{value % fanout}")
+    return Path(*parts) if parts else Path()
+
+
+def make_identifier(rng):
+    kind = rng.randrange(3)
+    if kind == 0:
+        return f"ERR-{rng.randint(1000, 9999)}"
+    if kind == 1:
+        return f"host{rng.randint(1, 300)}.internal.example"
+    return f"TICKET-{rng.randint(10000, 99999)}"
+
+
+def make_paragraph(rng, vocabulary, words):
+    tokens = [rng.choice(vocabulary) for _ in range(words)]
+    if rng.random() < 0.2:
+        tokens.insert(rng.randrange(len(tokens) + 1), make_identifier(rng))
+    return " ".join(tokens).capitalize() + "."
+
+
+def make_note(rng, vocabulary, index, words):
+    """Returns the Markdown text of one note with roughly `words` words."""
+    title = " ".join(rng.choice(vocabulary) for _ in range(3)).title()
+    lines = [f"# {title}", "", f"Note {index}. " + make_paragraph(rng, vocabulary, 12), ""]
+    remaining = max(0, words - 15)
+    section = 0
+    while remaining > 0:
+        section += 1
+        lines += [f"## {rng.choice(vocabulary).title()} {section}", ""]
+        for _ in range(rng.randint(1, 3)):
+            size = min(remaining, rng.randint(20, 80))
+            if size <= 0:
+                break
+            if rng.random() < 0.25:
+                lines += [f"- {make_paragraph(rng, vocabulary, max(1, size // 4))}" for _ in range(4)]
+            else:
+                lines.append(make_paragraph(rng, vocabulary, size))
+            lines.append("")
+            remaining -= size
+    return "\n".join(lines)
+
+
+def git(vault_dir, *args):
+    subprocess.run(["git", *args], cwd=vault_dir, check=True, capture_output=True)
+
+
+def generate_vault(out_dir, notes=1000, depth=3, fanout=5, words=300, seed=0, use_git=False):
+    """Writes a synthetic vault and returns the list of relative note paths.
+
+    Note lengths vary between half and one and a half times `words`. With
+    use_git, the vault is initialised as a git repository with one commit.
+    """
+    rng = random.Random(seed)
+    vocabulary = make_vocabulary(rng)
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    paths = []
+    for index in range(notes):
+        relative_path = note_directory(index, depth, fanout) / f"note-{index:06d}.md"
+        (out_dir / relative_path).parent.mkdir(parents=True, exist_ok=True)
+        length = rng.randint(max(20, words // 2), max(20, words * 3 // 2))
+        (out_dir / relative_path).write_text(make_note(rng, vocabulary, index, length), encoding="utf-8")
+        paths.append(str(relative_path))
+
+    if use_git:
+        git(out_dir, "init", "-q")
+        git(out_dir, "add", "-A")
+        git(out_dir, "-c", "user.name=bench", "-c", "user.email=bench@example.com", "commit", "-q", "-m", "Synthetic vault")
+    return paths
+
+
+def edit_notes(vault_dir, paths, count, seed=1):
+    """Appends a new section to `count` notes and returns their relative paths."""
+    rng = random.Random(seed)
+    vocabulary = make_vocabulary(random.Random(seed + 1), size=500)
+    edited = rng.sample(paths, min(count, len(paths)))
+    for relative_path in edited:
+        with open(Path(vault_dir) / relative_path, "a", encoding="utf-8") as f:
+            f.write(f"\n## Edit {rng.randint(0, 10**6)}\n\n{make_paragraph(rng, vocabulary, 40)}\n")
+    return edited
+
+
+def sample_queries(vault_dir, paths, count, seed=2):
+    """Returns `count` queries built from phrases that occur in random notes."""
+    rng = random.Random(seed)
+    queries = []
+    for relative_path in rng.choices(paths, k=count):
+        words = (Path(vault_dir) / relative_path).read_text(encoding="utf-8").split()
+        start = rng.randrange(max(1, len(words) - 6))
+        queries.append(" ".join(words[start:start + rng.randint(2, 6)]).strip(".#-"))
+    return queries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("out_dir")
+    parser.add_argument("--notes", type=int, default=1000)
+    parser.add_argument("--depth", type=int, default=3, help="directory nesting levels")
+    parser.add_argument("--fanout", type=int, default=5, help="subdirectories per level")
+    parser.add_argument("--words", type=int, default=300, help="average words per note")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--git", action="store_true", help="initialise the vault as a git repository")
+    args = parser.parse_args()
+
+    paths = generate_vault(args.out_dir, args.notes, args.depth, args.fanout, args.words, args.seed, args.git)
+    print(f"Wrote {len(paths)} notes to {args.out_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+"""Compares the ChromaDB (HNSW) vector store with the exact memory-mapped matrix store.
+
+For both values of [embeddings] vector_store it loads the same synthetic,
+clustered set of normalized vectors into a fresh embeddings directory through
+embeddings_manager.get_chroma_collection() and reports:
+
+* build time (upserts in write_batch_size batches) and on-disk size;
+* the time to open the store in a fresh interpreter;
+* single-query latency percentiles, unfiltered and with a metadata filter
+  matching 1/--folders of the vectors (the include list matches query_handler;
+  the matrix store caches the rows matching a filter until the next write, so
+  after the first query this is the latency of a repeated filter);
+* recall@k against exact float32 search, for both kinds of query;
+* resident memory of the query process: the growth from opening the store and
+  running the queries, and the peak (Linux only, from /proc/self/status).
+
+The vectors stand in for chunk embeddings, so no model or notes are needed.
+
+Usage (from the repository root):
+    python benchmarks/vector_store.py [--vectors 100000] [--dim 384] [--k 10] [--json out.json]
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import toml
+
+BENCHMARKS_DIR = Path(__file__).resolve().parent
+REPO_ROOT = BENCHMARKS_DIR.parent
+
+from suite import percentiles, timed  # noqa: E402
+
+STORES = ("chroma", "matrix")
+
+
+def memory_mb():
+    """Returns (current, peak) resident memory in MB, or (None, None) where /proc is not available."""
+    try:
+        fields = dict(line.split(":", 1) for line in Path("/proc/self/status").read_text().splitlines() if ":" in line)
+        return int(fields["VmRSS"].split()[0]) / 1024, int(fields["VmHWM"].split()[0]) / 1024
+    except (OSError, KeyError, ValueError):
+        return None, None
+
+
+def generate_data(path, count, dim, clusters, queries, folders, seed):
+    """Writes clustered unit vectors, queries near them and folder labels to an .npz file."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, clusters, count)] + 0.6 * rng.standard_normal((count, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    picked = vectors[rng.integers(0, count, queries)]
+    query_vectors = picked + 0.02 * rng.standard_normal(picked.shape).astype(np.float32)
+    query_vectors /= np.linalg.norm(query_vectors, axis=1, keepdims=True)
+    np.savez(path, vectors=vectors, queries=query_vectors, folders=np.arange(count) % folders)
+
+
+def exact_neighbours(vectors, queries, k, mask=None):
+    """Returns the row indices of the exact top k by cosine similarity, per query."""
+    scores = queries @ vectors.T
+    if mask is not None:
+        scores[:, ~mask] = -np.inf
+    return np.argsort(-scores, axis=1)[:, :k]
+
+
+def recall(results, truth):
+    return float(np.mean([len(set(found) & set(expected)) / len(expected) for found, expected in zip(results, truth)]))
+
+
+def write_config(path, work_dir, store):
+    config = {
+        "embeddings": {
+            "embeddings_function": "bench-vectors",
+            "collection_name": "bench_vectors",
+            "embeddings_path": str(work_dir / "embeddings"),
+            "vector_store": store,
+        },
+        "files": {"markdown_directory": str(work_dir), "state_file": str(work_dir / "state.json")},
+        "llm": {"provider": "openai", "model_name": "stub"},
+        "cache": {"enabled": False},
+    }
+    path.write_text(toml.dumps(config))
+
+
+def run_build(args):
+    """Loads every vector into the store; the config comes from QUERYMD_CONFIG."""
+    sys.path.insert(0, str(REPO_ROOT))
+    from settings import setup_logging
+    setup_logging("WARNING")
+    import embeddings_manager
+
+    data = np.load(args.data)
+    vectors, folders = data["vectors"], data["folders"]
+    collection = embeddings_manager.get_chroma_collection()
+    batch = embeddings_manager._write_batch_size()
+    start = time.perf_counter()
+    for offset in range(0, len(vectors), batch):
+        rows = range(offset, min(offset + batch, len(vectors)))
+        collection.upsert(
+            ids=[f"v{row}" for row in rows],
+            embeddings=vectors[offset:offset + len(rows)],
+            metadatas=[{"source": f"note{row // 4}.md", "dir_0": f"folder{folders[row]}"} for row in rows],
+        )
+    build_s = time.perf_counter() - start
+    if hasattr(collection, "close"):
+        collection.close()
+    Path(args.result_file).write_text(json.dumps({"build_s": build_s, "vectors": len(vectors)}))
+
+
+def run_query(args):
+    """Opens the store in this fresh process and times the queries."""
+    sys.path.insert(0, str(REPO_ROOT))
+    from settings import setup_logging
+    setup_logging("WARNING")
+    import embeddings_manager
+
+    data = np.load(args.data)
+    queries = data["queries"]
+    rss_before, _ = memory_mb()
+    open_s, collection = timed(embeddings_manager.get_chroma_collection)
+    include = ["metadatas", "embeddings"]
+    results = {"open_s": open_s}
+    for name, where in (("unfiltered", None), ("filtered", {"dir_0": "folder0"})):
+        found, samples = [], []
+        for query in queries:
+            elapsed, result = timed(lambda: collection.query(
+                query_embeddings=[query.tolist()], n_results=args.k, where=where, include=include
+            ))
+            samples.append(elapsed)
+            found.append([int(chunk_id[1:]) for chunk_id in result["ids"][0]])
+        results[name] = {"latency": percentiles(samples[1:]), "ids": found}
+    rss_after, rss_peak = memory_mb()
+    if rss_before is not None:
+        results["rss_growth_mb"] = rss_after - rss_before
+        results["rss_peak_mb"] = rss_peak
+    Path(args.result_file).write_text(json.dumps(results))
+
+
+def run_worker(command, store, work_dir, data_path, k):
+    config_path = work_dir / "config.toml"
+    result_path = work_dir / f"{command}.json"
+    write_config(config_path, work_dir, store)
+    env = dict(os.environ, QUERYMD_CONFIG=str(config_path), ANONYMIZED_TELEMETRY="False")
+    completed = subprocess.run(
+        [sys.executable, str(Path(__file__).resolve()), "--worker", command, "--data", str(data_path),
+         "--result-file", str(result_path), "--k", str(k)],
+        cwd=REPO_ROOT, env=env, capture_output=True, text=True,
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"{store} {command} failed:\n" + "\n".join(completed.stderr.strip().splitlines()[-15:]))
+    return json.loads(result_path.read_text())
+
+
+def run_store(store, tmp_dir, data_path, truth, k):
+    work_dir = tmp_dir / store
+    work_dir.mkdir(parents=True)
+    print(f"[{store}] building...")
+    result = run_worker("build", store, work_dir, data_path, k)
+    print(f"[{store}] querying...")
+    result.update(run_worker("query", store, work_dir, data_path, k))
+    result["store_bytes"] = sum(f.stat().st_size for f in (work_dir / "embeddings").rglob("*") if f.is_file())
+    for name in ("unfiltered", "filtered"):
+        result[name]["recall"] = recall(result[name].pop("ids"), truth[name])
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vectors", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--folders", type=int, default=10, help="the filtered queries match 1/folders of the vectors")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--stores", default=",".join(STORES))
+    parser.add_argument("--json", dest="json_path")
+    parser.add_argument("--worker", choices=["build", "query"], help=argparse.SUPPRESS)
+    parser.add_argument("--data", help=argparse.SUPPRESS)
+    parser.add_argument("--result-file", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        (run_build if args.worker == "build" else run_query)(args)
+        return
+
+    tmp_dir = Path(tempfile.mkdtemp(prefix="querymd-vectors-"))
+    results = {}
+    try:
+        data_path = tmp_dir / "data.npz"
+        print(f"Generating {args.vectors} vectors of dimension {args.dim}...")
+        generate_data(data_path, args.vectors, args.dim, args.clusters, args.queries, args.folders, args.seed)
+        data = np.load(data_path)
+        truth = {
+            "unfiltered": exact_neighbours(data["vectors"], data["queries"], args.k).tolist(),
+            "filtered": exact_neighbours(data["vectors"], data["queries"], args.k, data["folders"] == 0).tolist(),
+        }
+        for store in args.stores.split(","):
+            results[store] = run_store(store.strip(), tmp_dir, data_path, truth, args.k)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    print(f"\n{args.vectors} vectors x {args.dim}, k={args.k}")
+    print(f"{'store':<8} {'build s':>8} {'disk MB':>8} {'open ms':>8} {'p50 ms':>7} {'p90 ms':>7} {'recall':>7} "
+          f"{'filt p50':>9} {'recall':>7} {'RSS +MB':>8} {'peak MB':>8}")
+    for store, result in results.items():
+        unfiltered, filtered = result["unfiltered"], result["filtered"]
+        print(f"{store:<8} {result['build_s']:>8.1f} {result['store_bytes'] / 1e6:>8.1f} {result['open_s'] * 1000:>8.0f} "
+              f"{unfiltered['latency']['p50_ms']:>7.2f} {unfiltered['latency']['p90_ms']:>7.2f} {unfiltered['recall']:>7.3f} "
+              f"{filtered['latency']['p50_ms']:>9.2f} {filtered['recall']:>7.3f} "
+              f"{result.get('rss_growth_mb', float('nan')):>8.0f} {result.get('rss_peak_mb', float('nan')):>8.0f}")
+
+    if args.json_path:
+        Path(args.json_path).write_text(json.dumps({"args": vars(args), "results": results}, indent=2))
+        print(f"Results written to {args.json_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+import math
+import re
+import sqlite3
+import threading
+from collections import Counter
+from pathlib import Path
+
+TOKEN_RE = re.compile(r"\w+(?:[\-\.:/@]\w+)*")
+PART_RE = re.compile(r"\w+")
+
+
+def tokenize(text):
+    """Lowercases text and splits it into terms for the lexical index.
+
+    Compound identifiers such as error codes (ERR-1234), hostnames
+    (db01.prod.example.com) and ticket IDs (OPS-42) are kept whole and are also
+    indexed by their alphanumeric parts, so both exact and partial lookups match.
+    """
+    terms = []
+    for match in TOKEN_RE.finditer(text.lower()):
+        token = match.group(0)
+        terms.append(token)
+        if not PART_RE.fullmatch(token):
+            terms.extend(PART_RE.findall(token))
+    return terms
+
+
+class BM25Index:
+    """Incrementally maintained BM25 inverted index over chunks, stored in SQLite.
+
+    With read_only=True an existing index file is opened for queries only.
+    """
+
+    def __init__(self, path, k1=1.2, b=0.75, read_only=False):
+        self.path = Path(path)
+        self.k1 = k1
+        self.b = b
+        self.read_only = read_only
+        self._lock = threading.Lock()
+        if read_only:
+            self._conn = sqlite3.connect(f"{self.path.resolve().as_uri()}?mode=ro", uri=True, check_same_thread=False)
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS docs (
+                chunk_id TEXT PRIMARY KEY,
+                source TEXT NOT NULL,
+                length INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS docs_source ON docs (source);
+            CREATE TABLE IF NOT EXISTS postings (
+                term TEXT NOT NULL,
+                chunk_id TEXT NOT NULL,
+                tf INTEGER NOT NULL,
+                PRIMARY KEY (term, chunk_id)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS postings_chunk ON postings (chunk_id);
+            CREATE TABLE IF NOT EXISTS meta (
+                name TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            );
+            INSERT OR IGNORE INTO meta (name, value) VALUES ('doc_count', 0), ('total_length', 0);
+            """
+        )
+        self._conn.commit()
+
+    def _delete_chunks(self, chunk_ids):
+        """Deletes chunks and their postings, keeping the corpus statistics in meta up to date."""
+        for start in range(0, len(chunk_ids), 500):
+            batch = chunk_ids[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            count, length = self._conn.execute(
+                f"SELECT COUNT(*), COALESCE(SUM(length), 0) FROM docs WHERE chunk_id IN ({placeholders})", batch
+            ).fetchone()
+            if not count:
+                continue
+            self._conn.execute(f"DELETE FROM postings WHERE chunk_id IN ({placeholders})", batch)
+            self._conn.execute(f"DELETE FROM docs WHERE chunk_id IN ({placeholders})", batch)
+            self._conn.execute("UPDATE meta SET value = value - ? WHERE name = 'doc_count'", (count,))
+            self._conn.execute("UPDATE meta SET value = value - ? WHERE name = 'total_length'", (length,))
+
+    def add(self, chunks):
+        """Adds or replaces chunks given as (chunk_id, text, source) tuples."""
+        chunks = list(chunks)
+        if not chunks:
+            return
+        with self._lock:
+            self._delete_chunks([chunk_id for chunk_id, _, _ in chunks])
+            total_length = 0
+            for chunk_id, text, source in chunks:
+                terms = Counter(tokenize(text))
+                length = sum(terms.values())
+                total_length += length
+                self._conn.execute(
+                    "INSERT INTO docs (chunk_id, source, length) VALUES (?, ?, ?)", (chunk_id, source, length)
+                )
+                self._conn.executemany(
+                    "INSERT INTO postings (term, chunk_id, tf) VALUES (?, ?, ?)",
+                    [(term, chunk_id, tf) for term, tf in terms.items()],
+                )
+            self._conn.execute("UPDATE meta SET value = value + ? WHERE name = 'doc_count'", (len(chunks),))
+            self._conn.execute("UPDATE meta SET value = value + ? WHERE name = 'total_length'", (total_length,))
+            self._conn.commit()
+
+    def remove_sources(self, sources):
+        """Removes every chunk whose source document is in sources."""
+        sources = list(set(sources))
+        if not sources:
+            return
+        with self._lock:
+            chunk_ids = []
+            for start in range(0, len(sources), 500):
+                batch = sources[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                chunk_ids.extend(row[0] for row in self._conn.execute(
+                    f"SELECT chunk_id FROM docs WHERE source IN ({placeholders})", batch
+                ))
+            self._delete_chunks(chunk_ids)
+            self._conn.commit()
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute("SELECT value FROM meta WHERE name = 'doc_count'").fetchone()[0]
+
+    def query(self, query_text, n_results=10):
+        """Returns up to n_results (chunk_id, score) pairs ordered by descending BM25 score."""
+        terms = set(tokenize(query_text))
+        if not terms:
+            return []
+        with self._lock:
+            meta = dict(self._conn.execute("SELECT name, value FROM meta"))
+            doc_count = meta.get("doc_count", 0)
+            if not doc_count:
+                return []
+            avg_length = max(meta.get("total_length", 0) / doc_count, 1.0)
+
+            scores = {}
+            for term in terms:
+                rows = self._conn.execute(
+                    "SELECT p.chunk_id, p.tf, d.length FROM postings p JOIN docs d ON d.chunk_id = p.chunk_id "
+                    "WHERE p.term = ?",
+                    (term,),
+                ).fetchall()
+                if not rows:
+                    continue
+                idf = math.log(1 + (doc_count - len(rows) + 0.5) / (len(rows) + 0.5))
+                for chunk_id, tf, length in rows:
+                    norm = tf + self.k1 * (1 - self.b + self.b * length / avg_length)
+                    scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (self.k1 + 1) / norm
+
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:n_results]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def reciprocal_rank_fusion(ranked_lists, weights=None, k=60):
+    """Fuses several ranked lists of IDs with weighted reciprocal rank fusion.
+
+    Returns (id, score) pairs ordered by descending fused score.
+    """
+    weights = weights or [1.0] * len(ranked_lists)
+    scores = {}
+    for ranked_ids, weight in zip(ranked_lists, weights):
+        for rank, item_id in enumerate(ranked_ids):
+            scores[item_id] = scores.get(item_id, 0.0) + weight / (k + rank + 1)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
@@ -0,0 +1,174 @@
+import re
+
+HEADING_RE = re.compile(r"^(#{1,6})\s+(.*?)\s*#*\s*$")
+FENCE_RE = re.compile(r"^\s*(```|~~~)")
+TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+
+
+def count_tokens(text):
+    """Approximates the number of model tokens in text (words and punctuation marks)."""
+    return len(TOKEN_RE.findall(text))
+
+
+def _split_blocks(lines):
+    """Groups lines into paragraph blocks, keeping fenced code blocks whole.
+
+    Returns a list of dicts with the 0-based start/end line indexes (end exclusive),
+    the heading path active for the block and whether the block is a heading line.
+    """
+    blocks = []
+    headings = []
+    current = None
+    in_fence = False
+
+    def flush():
+        nonlocal current
+        if current is not None:
+            blocks.append(current)
+            current = None
+
+    for index, line in enumerate(lines):
+        stripped = line.strip()
+
+        if FENCE_RE.match(line):
+            if current is None:
+                current = {"start": index, "end": index + 1, "headings": list(headings), "heading": False}
+            current["end"] = index + 1
+            in_fence = not in_fence
+            continue
+
+        if in_fence:
+            current["end"] = index + 1
+            continue
+
+        heading_match = HEADING_RE.match(line)
+        if heading_match:
+            flush()
+            level = len(heading_match.group(1))
+            headings = [h for h in headings if h[0] < level] + [(level, heading_match.group(2))]
+            blocks.append({"start": index, "end": index + 1, "headings": list(headings), "heading": True})
+            continue
+
+        if not stripped:
+            flush()
+            continue
+
+        if current is None:
+            current = {"start": index, "end": index + 1, "headings": list(headings), "heading": False}
+        current["end"] = index + 1
+
+    flush()
+    return blocks
+
+
+def _split_oversized(lines, block, max_tokens):
+    """Splits a block that exceeds max_tokens by lines, and single long lines by words."""
+    pieces = []
+    piece_start = block["start"]
+    piece_tokens = 0
+
+    for index in range(block["start"], block["end"]):
+        line_tokens = count_tokens(lines[index])
+
+        if line_tokens > max_tokens:
+            if index > piece_start:
+                pieces.append({**block, "start": piece_start, "end": index, "tokens": piece_tokens})
+            words = lines[index].split()
+            part, part_tokens = [], 0
+            for word in words:
+                word_tokens = count_tokens(word)
+                if part and part_tokens + word_tokens > max_tokens:
+                    pieces.append({**block, "start": index, "end": index + 1, "tokens": part_tokens, "text": " ".join(part)})
+                    part, part_tokens = [], 0
+                part.append(word)
+                part_tokens += word_tokens
+            if part:
+                pieces.append({**block, "start": index, "end": index + 1, "tokens": part_tokens, "text": " ".join(part)})
+            piece_start = index + 1
+            piece_tokens = 0
+            continue
+
+        if piece_tokens + line_tokens > max_tokens and index > piece_start:
+            pieces.append({**block, "start": piece_start, "end": index, "tokens": piece_tokens})
+            piece_start = index
+            piece_tokens = 0
+        piece_tokens += line_tokens
+
+    if piece_start < block["end"]:
+        pieces.append({**block, "start": piece_start, "end": block["end"], "tokens": piece_tokens})
+    return pieces
+
+
+def chunk_markdown(content, max_tokens=200, overlap_tokens=32, skip_lines=0):
+    """Splits a Markdown note into chunks on headings and paragraphs.
+
+    Each chunk stays within max_tokens (approximate) and starts a fresh chunk at
+    every heading. Consecutive chunks of the same section share up to
+    overlap_tokens worth of trailing paragraphs. The first skip_lines lines
+    (e.g. YAML frontmatter) are left out of every chunk. Returns a list of dicts
+    with `text`, `heading`, 1-based inclusive `start_line`/`end_line` and the
+    UTF-8 `start_byte`/`end_byte` of the span in content.
+    """
+    lines = content.splitlines(keepends=True)
+    if not lines:
+        return []
+
+    line_offsets = [0]
+    for line in lines:
+        line_offsets.append(line_offsets[-1] + len(line.encode("utf-8")))
+
+    blocks = []
+    # Skipped lines are blanked for block detection only, so offsets still refer to the full content.
+    for block in _split_blocks([""] * skip_lines + lines[skip_lines:]):
+        tokens = sum(count_tokens(lines[i]) for i in range(block["start"], block["end"]))
+        if tokens > max_tokens:
+            blocks.extend(_split_oversized(lines, block, max_tokens))
+        else:
+            blocks.append({**block, "tokens": tokens})
+
+    chunks = []
+    current = []
+    current_tokens = 0
+
+    def emit():
+        if not current or all(b["heading"] for b in current):
+            return
+        start, end = current[0]["start"], current[-1]["end"]
+        if any("text" in b for b in current):
+            text = "\n\n".join(b.get("text") or "".join(lines[b["start"]:b["end"]]).strip() for b in current)
+        else:
+            text = "".join(lines[start:end]).strip()
+        heading_path = current[-1]["headings"]
+        chunks.append({
+            "text": text,
+            "heading": " > ".join(h[1] for h in heading_path),
+            "start_line": start + 1,
+            "end_line": end,
+            "start_byte": line_offsets[start],
+            "end_byte": line_offsets[end],
+            "tokens": current_tokens,
+        })
+
+    for block in blocks:
+        starts_section = block["heading"] and current and not all(b["heading"] for b in current)
+        if starts_section:
+            emit()
+            current, current_tokens = [], 0
+        elif current and current_tokens + block["tokens"] > max_tokens:
+            emit()
+            carried = []
+            carried_tokens = 0
+            for previous in reversed(current):
+                if previous["heading"] or "text" in previous or carried_tokens + previous["tokens"] > overlap_tokens:
+                    break
+                carried.insert(0, previous)
+                carried_tokens += previous["tokens"]
+            if carried_tokens + block["tokens"] > max_tokens:
+                carried, carried_tokens = [], 0
+            current, current_tokens = carried, carried_tokens
+
+        current.append(block)
+        current_tokens += block["tokens"]
+
+    emit()
+    return chunks
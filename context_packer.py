@@ -0,0 +1,100 @@
+import re
+import numpy as np
+from chunker import FENCE_RE, _split_blocks, count_tokens
+from embedding_cache import content_hash
+
+SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s+")
+OMISSION_MARKER = "[…]"
+# Tokens charged per included chunk for its "Document '<reference>':" header.
+HEADER_TOKENS = 12
+
+
+def split_spans(text, max_span_tokens=60):
+    """Splits chunk text into candidate spans: paragraphs, and sentences of long paragraphs.
+
+    Fenced code blocks are never split, even across blank lines. Returns the
+    spans in document order.
+    """
+    lines = text.split("\n")
+    # Blocks that are not separated by a blank line (e.g. a heading and its text) form one paragraph.
+    paragraphs = []
+    for block in _split_blocks(lines):
+        if paragraphs and paragraphs[-1][1] == block["start"]:
+            paragraphs[-1][1] = block["end"]
+        else:
+            paragraphs.append([block["start"], block["end"]])
+
+    spans = []
+    for start, end in paragraphs:
+        paragraph = "\n".join(lines[start:end]).strip()
+        if not paragraph:
+            continue
+        if count_tokens(paragraph) <= max_span_tokens or any(FENCE_RE.match(line) for line in lines[start:end]):
+            spans.append(paragraph)
+            continue
+        spans.extend(sentence.strip() for sentence in SENTENCE_END_RE.split(paragraph) if sentence.strip())
+    return spans
+
+
+def _normalize(matrix):
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+
+def pack_chunks(query_vector, chunks, budget_tokens, encode, rank_weight=0.05, max_span_tokens=60):
+    """Fits retrieved chunks into a token budget by keeping their most query-relevant spans.
+
+    chunks are dicts with `id`, `text` and `metadata`, best first. If they fit
+    the budget as they are, they are returned unchanged. Otherwise each chunk is
+    split into spans (see split_spans), every span is embedded with encode(texts)
+    and scored by cosine similarity to query_vector, minus rank_weight per
+    retrieval rank of its chunk, and spans are taken greedily by score while they
+    fit. Kept spans stay in document order under their chunk's ID and metadata,
+    with OMISSION_MARKER where text was dropped; chunks with no kept span are
+    dropped. Returns (chunks, tokens_used).
+    """
+    total_tokens = sum(count_tokens(chunk["text"]) + HEADER_TOKENS for chunk in chunks)
+    if budget_tokens <= 0 or total_tokens <= budget_tokens:
+        return chunks, total_tokens
+
+    candidates = []
+    for rank, chunk in enumerate(chunks):
+        for position, text in enumerate(split_spans(chunk["text"], max_span_tokens)):
+            candidates.append((rank, position, text, count_tokens(text)))
+    if not candidates:
+        return [], 0
+
+    vectors = _normalize(np.asarray(encode([text for _, _, text, _ in candidates]), dtype=np.float32))
+    scores = vectors @ _normalize(np.asarray(query_vector, dtype=np.float32))
+    scores -= rank_weight * np.asarray([rank for rank, _, _, _ in candidates], dtype=np.float32)
+
+    selected = {}
+    used = 0
+    for index in np.argsort(-scores, kind="stable"):
+        rank, position, text, tokens = candidates[index]
+        cost = tokens + (HEADER_TOKENS if rank not in selected else 0)
+        if used + cost > budget_tokens:
+            continue
+        selected.setdefault(rank, []).append(position)
+        used += cost
+
+    packed = []
+    for rank, chunk in enumerate(chunks):
+        if rank not in selected:
+            continue
+        spans = {position: text for r, position, text, _ in candidates if r == rank}
+        positions = sorted(selected[rank])
+        parts = [OMISSION_MARKER] if positions[0] > 0 else []
+        for previous, position in zip([None] + positions, positions):
+            if previous is not None and position != previous + 1:
+                parts.append(OMISSION_MARKER)
+            parts.append(spans[position])
+        if positions[-1] < len(spans) - 1:
+            parts.append(OMISSION_MARKER)
+        text = "\n\n".join(parts)
+        packed.append({
+            "id": chunk["id"],
+            "text": text,
+            "metadata": {**chunk["metadata"], "content_hash": content_hash(text)},
+        })
+    return packed, used
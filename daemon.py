@@ -0,0 +1,153 @@
+import argparse
+import json
+import os
+import socketserver
+import threading
+import time
+from tracking.check_state import check_files_state
+from embeddings_manager import get_embedding_model, get_chroma_collection
+from query_handler import initialize_client, query_with_llm, stream_query_with_llm
+from daemon_client import SOCKET_PATH, is_daemon_running
+from query_cache import get_query_cache
+from settings import config, get_logger, setup_logging
+from vaults import writable_vaults
+
+log = get_logger(__name__)
+
+_refresh_lock = threading.Lock()
+
+
+def refresh_index():
+    """Runs an incremental index refresh, serialising concurrent requests."""
+    with _refresh_lock:
+        return check_files_state()
+
+
+def query_kwargs(request):
+    """Returns the optional query_with_llm arguments (n_results, vaults) given in a request."""
+    kwargs = {"n_results": int(request["n_results"])} if "n_results" in request else {}
+    if request.get("vaults"):
+        kwargs["vaults"] = request["vaults"]
+    return kwargs
+
+
+def handle_request(request):
+    """Dispatches one decoded JSON request and returns the JSON-serialisable response."""
+    action = request.get("action")
+
+    if action == "ping":
+        return {"ok": True, "pid": os.getpid()}
+
+    if action == "refresh":
+        changed = refresh_index()
+        return {"ok": True, "changed": bool(changed)}
+
+    if action == "cache_stats":
+        cache = get_query_cache()
+        return {"ok": True, "stats": cache.stats() if cache is not None else None}
+
+    if action == "query":
+        query_text = request.get("query", "")
+        if not query_text.strip():
+            return {"ok": False, "error": "Empty query."}
+        response_content, referenced_ids = query_with_llm(query_text, **query_kwargs(request))
+        return {"ok": True, "response": response_content, "referenced_ids": referenced_ids}
+
+    return {"ok": False, "error": f"Unknown action: {action!r}"}
+
+
+def stream_request_events(request):
+    """Yields the JSON-serialisable events of a streamed query, ending with a "done" event."""
+    query_text = request.get("query", "")
+    if not query_text.strip():
+        yield {"ok": False, "error": "Empty query."}
+        return
+    for event in stream_query_with_llm(query_text, **query_kwargs(request)):
+        yield {"ok": True, **event}
+    yield {"ok": True, "type": "done"}
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    """Reads newline-delimited JSON requests and writes JSON lines back.
+
+    Every request gets one response line, except "query_stream", which gets one
+    line per event until a {"type": "done"} line.
+    """
+
+    def send(self, response):
+        self.wfile.write(json.dumps(response).encode('utf-8') + b"\n")
+        self.wfile.flush()
+
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+                if request.get("action") == "query_stream":
+                    for event in stream_request_events(request):
+                        self.send(event)
+                    continue
+                response = handle_request(request)
+            except Exception as e:
+                response = {"ok": False, "error": str(e)}
+            self.send(response)
+
+
+class QueryMDServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def warm_up():
+    """Loads the model, opens the collections and connects the LLM client ahead of the first query."""
+    start_time = time.perf_counter()
+    get_embedding_model()
+    for vault in writable_vaults():
+        get_chroma_collection(vault)
+    provider = config["llm"].get("provider", "groq").lower()
+    try:
+        initialize_client(provider)
+    except (ValueError, ImportError, ConnectionError) as e:
+        log.warning(f"LLM client not ready ({e}). Queries will retry initialisation.")
+    refresh_index()
+    log.info(f"Daemon warm-up finished in {time.perf_counter() - start_time:.2f} seconds.")
+
+
+def serve(watch=False):
+    if is_daemon_running():
+        log.info(f"A QueryMD daemon is already listening on {SOCKET_PATH}.")
+        return
+
+    SOCKET_PATH.parent.mkdir(parents=True, exist_ok=True)
+    if SOCKET_PATH.exists():
+        SOCKET_PATH.unlink()
+
+    warm_up()
+
+    if watch:
+        from watcher import start_watch_thread
+        start_watch_thread(_refresh_lock)
+
+    old_umask = os.umask(0o177)
+    try:
+        server = QueryMDServer(str(SOCKET_PATH), RequestHandler)
+    finally:
+        os.umask(old_umask)
+
+    log.info(f"QueryMD daemon listening on {SOCKET_PATH}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if SOCKET_PATH.exists():
+            SOCKET_PATH.unlink()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Keep QueryMD warm and answer queries over a Unix socket.")
+    parser.add_argument("--watch", action="store_true", help="re-index notes as they change on disk")
+    args = parser.parse_args()
+    setup_logging()
+    serve(watch=args.watch)
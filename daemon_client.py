@@ -0,0 +1,74 @@
+import json
+import socket
+from pathlib import Path
+from settings import config
+
+SOCKET_PATH = Path(config.get("daemon", {}).get("socket_path", "~/.cache/querymd/querymd.sock")).expanduser()
+CONNECT_TIMEOUT = 1.0
+
+
+class DaemonUnavailable(Exception):
+    """Raised when no QueryMD daemon is listening on the configured socket."""
+
+
+def _connect():
+    """Connects to the daemon socket, raising DaemonUnavailable if nobody is listening."""
+    if not SOCKET_PATH.exists():
+        raise DaemonUnavailable(f"No daemon socket at {SOCKET_PATH}")
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(CONNECT_TIMEOUT)
+    try:
+        sock.connect(str(SOCKET_PATH))
+    except (FileNotFoundError, ConnectionRefusedError, socket.timeout) as e:
+        sock.close()
+        raise DaemonUnavailable(f"Could not connect to daemon at {SOCKET_PATH}: {e}")
+    sock.settimeout(None)
+    return sock
+
+
+def send_request(payload):
+    """Sends one JSON request to the daemon and returns its JSON response."""
+    sock = _connect()
+    try:
+        with sock, sock.makefile('rwb') as stream:
+            stream.write(json.dumps(payload).encode('utf-8') + b"\n")
+            stream.flush()
+            line = stream.readline()
+    except OSError as e:
+        raise DaemonUnavailable(f"Lost connection to daemon: {e}")
+
+    if not line:
+        raise DaemonUnavailable("Daemon closed the connection without replying.")
+    response = json.loads(line)
+    if not response.get("ok"):
+        raise RuntimeError(response.get("error", "Unknown daemon error"))
+    return response
+
+
+def stream_request(payload):
+    """Sends one JSON request to the daemon and yields its JSON event lines until "done"."""
+    sock = _connect()
+    with sock, sock.makefile('rwb') as stream:
+        try:
+            stream.write(json.dumps(payload).encode('utf-8') + b"\n")
+            stream.flush()
+        except OSError as e:
+            raise DaemonUnavailable(f"Lost connection to daemon: {e}")
+
+        for line in stream:
+            event = json.loads(line)
+            if not event.get("ok"):
+                raise RuntimeError(event.get("error", "Unknown daemon error"))
+            if event.get("type") == "done":
+                return
+            yield event
+    raise RuntimeError("Daemon closed the connection before the response finished.")
+
+
+def is_daemon_running():
+    """Returns True if a daemon answers a ping on the configured socket."""
+    try:
+        send_request({"action": "ping"})
+        return True
+    except (DaemonUnavailable, RuntimeError, ValueError):
+        return False
@@ -0,0 +1,45 @@
+import numpy as np
+
+
+def cosine_similarity_matrix(vectors, others=None):
+    """Returns the cosine similarities between the rows of vectors (and others, if given)."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    vectors = vectors / np.where(norms == 0, 1, norms)
+    if others is None:
+        return vectors @ vectors.T
+    others = np.asarray(others, dtype=np.float32)
+    norms = np.linalg.norm(others, axis=-1, keepdims=True)
+    return vectors @ (others / np.where(norms == 0, 1, norms)).T
+
+
+def maximal_marginal_relevance(relevance, embeddings, k, lambda_mult=0.7):
+    """Picks k candidates that are relevant but not redundant with each other.
+
+    relevance holds one score per candidate (higher is better, ideally in
+    [0, 1]); embeddings holds their vectors. Each step selects the candidate
+    maximising lambda_mult * relevance - (1 - lambda_mult) * (max cosine
+    similarity to anything already selected). The pairwise similarities are
+    computed once as a matrix, and the running maximum is updated with one
+    vector operation per step. Returns candidate indexes in selection order.
+    """
+    relevance = np.asarray(relevance, dtype=np.float32)
+    count = len(relevance)
+    if count == 0 or k <= 0:
+        return []
+    k = min(k, count)
+    similarity = cosine_similarity_matrix(embeddings)
+
+    first = int(np.argmax(relevance))
+    selected = [first]
+    max_similarity = similarity[first].copy()
+    available = np.ones(count, dtype=bool)
+    available[first] = False
+    while len(selected) < k:
+        scores = lambda_mult * relevance - (1 - lambda_mult) * max_similarity
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        np.maximum(max_similarity, similarity[best], out=max_similarity)
+    return selected
@@ -0,0 +1,128 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+
+def content_hash(text):
+    """Returns the SHA-256 hex digest of text, used as the cache key for its embedding."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """Persistent SQLite cache of embedding vectors keyed by (model name, content hash).
+
+    Entries are evicted least-recently-used first once the stored vectors exceed
+    max_bytes. The size of the vectors is summed once on open and then kept up
+    to date by this instance's writes.
+    """
+
+    def __init__(self, path, max_bytes=512 * 1024 * 1024):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS embeddings (
+                   model TEXT NOT NULL,
+                   content_hash TEXT NOT NULL,
+                   vector BLOB NOT NULL,
+                   last_used REAL NOT NULL,
+                   PRIMARY KEY (model, content_hash)
+               )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+        self._conn.commit()
+        self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings").fetchone()[0]
+
+    def get_many(self, model, hashes):
+        """Returns {content_hash: float32 vector} for the hashes present in the cache."""
+        found = {}
+        hashes = list(dict.fromkeys(hashes))
+        if not hashes:
+            return found
+        now = time.time()
+        with self._lock:
+            for start in range(0, len(hashes), 500):
+                batch = hashes[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT content_hash, vector FROM embeddings WHERE model = ? AND content_hash IN ({placeholders})",
+                    [model, *batch],
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32)
+            if found:
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE model = ? AND content_hash = ?",
+                    [(now, model, key) for key in found],
+                )
+                self._conn.commit()
+        return found
+
+    def put_many(self, model, items):
+        """Stores an iterable of (content_hash, vector) pairs and evicts old entries if needed."""
+        now = time.time()
+        rows = [
+            (model, key, np.asarray(vector, dtype=np.float32).tobytes(), now)
+            for key, vector in items
+        ]
+        if not rows:
+            return
+        rows = list({row[1]: row for row in rows}.values())
+        with self._lock:
+            # Replaced entries no longer count towards the total.
+            replaced = 0
+            for start in range(0, len(rows), 500):
+                batch = [row[1] for row in rows[start:start + 500]]
+                placeholders = ",".join("?" * len(batch))
+                replaced += self._conn.execute(
+                    f"SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings WHERE model = ? AND content_hash IN ({placeholders})",
+                    [model, *batch],
+                ).fetchone()[0]
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, content_hash, vector, last_used) VALUES (?, ?, ?, ?)",
+                rows,
+            )
+            self._conn.commit()
+            self._total_bytes += sum(len(row[2]) for row in rows) - replaced
+            self._evict()
+
+    def _evict(self):
+        """Deletes least-recently-used entries until the cache is below 90% of max_bytes."""
+        if self._total_bytes <= self.max_bytes:
+            return
+        target = int(self.max_bytes * 0.9)
+        freed = 0
+        rowids = []
+        # Entries written together share last_used; rowid order evicts the older ones first.
+        for rowid, size in self._conn.execute(
+            "SELECT rowid, LENGTH(vector) FROM embeddings ORDER BY last_used, rowid"
+        ):
+            if self._total_bytes - freed <= target:
+                break
+            rowids.append(rowid)
+            freed += size
+        for start in range(0, len(rowids), 500):
+            batch = rowids[start:start + 500]
+            self._conn.execute(f"DELETE FROM embeddings WHERE rowid IN ({','.join('?' * len(batch))})", batch)
+        self._conn.commit()
+        self._total_bytes -= freed
+
+    def stats(self):
+        """Returns the number of cached vectors and their total size in bytes."""
+        with self._lock:
+            count, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings"
+            ).fetchone()
+        return {"entries": count, "bytes": size}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
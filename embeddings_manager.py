@@ -1,99 +1,604 @@
-from sentence_transformers import SentenceTransformer
-import chromadb
-from chromadb.utils import embedding_functions
-import toml
 from pathlib import Path
+import json
+import os
+import re
+import shutil
 import threading
+import time
+from chunker import chunk_markdown, count_tokens
+from embedding_cache import EmbeddingCache, content_hash
+from query_cache import invalidate_sources
+from bm25_index import BM25Index
+from indexing_pipeline import run_pipeline
+from note_metadata import METADATA_VERSION, note_metadata, split_frontmatter
+from profiling import span
+from settings import config, get_logger
+from span_reader import load_chunk_texts
+from vaults import get_vault
+
+log = get_logger(__name__)
 
-config = toml.load("config.toml")
 embeddings_config = config["embeddings"]
-files_config = config["files"]
+chunking_config = config.get("chunking", {})
+retrieval_config = config.get("retrieval", {})
+indexing_config = config.get("indexing", {})
+
+EMBEDDING_BACKEND = str(embeddings_config.get("backend", "torch")).lower()
+EMBEDDING_THREADS = int(embeddings_config.get("threads", 0))
+ONNX_FILE = embeddings_config.get("onnx_file")
+# ONNX exports that compute the same float32 vectors as PyTorch (O4 is float16, qint8/quint8 are quantized).
+FLOAT32_ONNX_FILE_RE = re.compile(r"^(onnx/)?model(_O[123])?\.onnx$")
+ENCODE_BATCH_SIZE = int(embeddings_config.get("batch_size", 64))
+WRITE_BATCH_SIZE = int(embeddings_config.get("write_batch_size", 1024))
+CHUNK_MAX_TOKENS = int(chunking_config.get("max_tokens", 200))
+CHUNK_OVERLAP_TOKENS = int(chunking_config.get("overlap_tokens", 32))
+EMBEDDING_CACHE_PATH = Path(embeddings_config.get(
+    "cache_path", Path(embeddings_config["embeddings_path"]) / "embedding_cache.sqlite3"
+))
+EMBEDDING_CACHE_MAX_MB = float(embeddings_config.get("cache_max_mb", 512))
+# With store_text = false, ChromaDB only keeps each chunk's path, byte span and hash; text is read from the note on demand.
+STORE_TEXT = bool(embeddings_config.get("store_text", True))
+# "chroma" (HNSW, approximate) or "matrix" (exact search over a memory-mapped float16 matrix, see matrix_store.py).
+VECTOR_STORE = str(embeddings_config.get("vector_store", "chroma")).lower()
+if VECTOR_STORE not in ("chroma", "matrix"):
+    log.warning(f"Invalid vector_store '{VECTOR_STORE}'. Must be 'chroma' or 'matrix'. Defaulting to 'chroma'.")
+    VECTOR_STORE = "chroma"
+HYBRID_SEARCH = bool(retrieval_config.get("hybrid", True))
+READER_WORKERS = int(indexing_config.get("reader_workers", 2))
+ENCODE_WORKERS = int(indexing_config.get("encode_workers", 1))
+CHUNK_QUEUE_DEPTH = int(indexing_config.get("chunk_queue_depth", 4096))
+WRITE_QUEUE_DEPTH = int(indexing_config.get("write_queue_depth", 2))
+# Starting encoder processes loads the model once per process; only worth it for big runs.
+POOL_MIN_FILES = int(indexing_config.get("pool_min_files", 200))
 
 _model = None
-_chroma_client = None
-_collection = None
-_lock = threading.Lock()
+# ChromaDB clients by embeddings_path, and each vault's collection (shard) and BM25 index by vault name.
+_chroma_clients = {}
+_collections = {}
+_embedding_cache = None
+_bm25_indexes = {}
+# Separate locks so the model load and the ChromaDB open can run concurrently.
+_model_lock = threading.Lock()
+_collection_lock = threading.Lock()
+_cache_lock = threading.Lock()
+_bm25_lock = threading.Lock()
+
+def embedding_signature():
+    """Identifies the vector space of the configured model and backend.
+
+    Backends that produce the same float32 vectors (PyTorch and plain ONNX
+    exports) share the model name as signature; quantized variants get their own.
+    It keys the embedding caches and is stored with the index.
+    """
+    model_name = embeddings_config["embeddings_function"]
+    if EMBEDDING_BACKEND == "int8":
+        return f"{model_name}|int8-dynamic"
+    if EMBEDDING_BACKEND == "onnx" and ONNX_FILE and not FLOAT32_ONNX_FILE_RE.match(ONNX_FILE):
+        return f"{model_name}|onnx:{ONNX_FILE}"
+    return model_name
+
+
+def load_embedding_model(model_name, backend="torch", threads=0, onnx_file=None):
+    """Loads a SentenceTransformer for a backend: "torch", "onnx" or "int8".
+
+    "onnx" runs an ONNX Runtime export (exported on the fly if the model has
+    none; onnx_file selects a specific, e.g. quantized, export) and needs
+    `pip install sentence-transformers[onnx]`. "int8" applies PyTorch dynamic
+    int8 quantization to the model's Linear layers. threads > 0 sets the
+    number of intra-op CPU threads.
+    """
+    from sentence_transformers import SentenceTransformer
+    if backend == "onnx":
+        import onnxruntime
+        model_kwargs = {"provider": "CPUExecutionProvider"}
+        if onnx_file:
+            model_kwargs["file_name"] = onnx_file
+        if threads > 0:
+            session_options = onnxruntime.SessionOptions()
+            session_options.intra_op_num_threads = threads
+            model_kwargs["session_options"] = session_options
+        return SentenceTransformer(model_name, device="cpu", backend="onnx", model_kwargs=model_kwargs)
+
+    if backend not in ("torch", "int8"):
+        raise ValueError(f"Unsupported embeddings backend: {backend}. Supported backends are 'torch', 'onnx', 'int8'.")
+    import torch
+    if threads > 0:
+        torch.set_num_threads(threads)
+    model = SentenceTransformer(model_name, device="cpu")
+    if backend == "int8":
+        model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    return model
+
 
 def get_embedding_model():
-    """Lazily initializes and returns the SentenceTransformer model."""
+    """Lazily initializes and returns the SentenceTransformer model for the configured backend."""
     global _model
     if _model is None:
-        with _lock:
+        with _model_lock:
             if _model is None:
-                print("Initializing SentenceTransformer model...")
-                _model = SentenceTransformer(embeddings_config["embeddings_function"])
-                print("SentenceTransformer model initialized.")
+                log.info(f"Initializing SentenceTransformer model ({EMBEDDING_BACKEND} backend)...")
+                start_time = time.perf_counter()
+                with span("model.load", model=embeddings_config["embeddings_function"]):
+                    _model = load_embedding_model(
+                        embeddings_config["embeddings_function"], EMBEDDING_BACKEND, EMBEDDING_THREADS, ONNX_FILE
+                    )
+                load_seconds = time.perf_counter() - start_time
+                # Only PyTorch weights are all parameters: ONNX Runtime keeps its own copy and
+                # int8 quantization packs the Linear weights outside of parameters().
+                if EMBEDDING_BACKEND == "torch":
+                    weight_mb = sum(p.numel() * p.element_size() for p in _model.parameters()) / (1024 * 1024)
+                    log.info(f"SentenceTransformer model initialized in {load_seconds:.2f}s ({weight_mb:.0f} MB of weights).")
+                    log.info(f"Model is shared by indexing and queries: saved a second load (~{load_seconds:.2f}s, ~{weight_mb:.0f} MB).")
+                else:
+                    log.info(f"SentenceTransformer model initialized in {load_seconds:.2f}s.")
+                    log.info(f"Model is shared by indexing and queries: saved a second load (~{load_seconds:.2f}s).")
     return _model
 
-def get_chroma_collection():
-    """Lazily initializes and returns the ChromaDB client and collection."""
-    global _chroma_client, _collection
-    if _collection is None:
-        with _lock:
-            if _collection is None:
-                # print("Initializing ChromaDB client...")
-                _chroma_client = chromadb.PersistentClient(path=embeddings_config["embeddings_path"])
-                # print("ChromaDB client initialized.")
-                collection_name = embeddings_config["collection_name"]
-                # print(f"Getting or creating ChromaDB collection: {collection_name}...")
-                _collection = _chroma_client.get_or_create_collection(
-                    name=collection_name,
-                    embedding_function=embedding_functions.SentenceTransformerEmbeddingFunction(
-                        model_name=embeddings_config["embeddings_function"]
-                    )
-                )
-                print("ChromaDB collection ready.")
-    return _collection
 
-def remove_document_from_collection(doc_id):
-    """Remove a document from the collection by its ID."""
-    collection = get_chroma_collection()
-    try:
-        collection.delete(ids=[doc_id])
-        print(f"Successfully removed document with ID: {doc_id}")
-    except Exception as e:
-        print(f"Error removing document {doc_id}: {e}")
+class SharedModelEmbeddingFunction:
+    """ChromaDB embedding function backed by the process-wide SentenceTransformer model.
 
+    Using this instead of chromadb's SentenceTransformerEmbeddingFunction keeps a
+    single copy of the weights in memory for both indexing and `query_texts`
+    lookups. The model is only loaded on the first call. It implements chromadb's
+    EmbeddingFunction protocol without subclassing it, so importing this module
+    does not import chromadb.
+    """
 
-def process_file_for_embeddings(file_path, base_dir):
-    """Process a single file and add its embeddings to the collection."""
-    model = get_embedding_model()
-    collection = get_chroma_collection()
+    def __call__(self, input):
+        model = get_embedding_model()
+        return model.encode(list(input), batch_size=ENCODE_BATCH_SIZE).tolist()
+
+
+def _get_chroma_client(vault):
+    client = _chroma_clients.get(str(vault.embeddings_path))
+    if client is None:
+        import chromadb
+        log.debug("Initializing ChromaDB client...")
+        client = chromadb.PersistentClient(path=str(vault.embeddings_path))
+        _chroma_clients[str(vault.embeddings_path)] = client
+        log.debug("ChromaDB client initialized.")
+    return client
+
+
+def _matrix_directory(vault):
+    return vault.embeddings_path / f"{vault.collection_name}.matrix"
+
+
+def get_chroma_collection(vault=None, create=True):
+    """Lazily initializes and returns the ChromaDB collection (shard) of a vault, by default the first one.
+
+    With vector_store = "matrix" this is a MatrixCollection, which has the same
+    interface. With create=False a missing collection is not created and None
+    is returned, which is how archive shards are opened.
+    """
+    vault = get_vault(vault)
+    collection = _collections.get(vault.name)
+    if collection is None:
+        with _collection_lock:
+            collection = _collections.get(vault.name)
+            if collection is None:
+                with span("chroma.open", vault=vault.name):
+                    if VECTOR_STORE == "matrix":
+                        from matrix_store import MatrixCollection
+                        try:
+                            collection = MatrixCollection(_matrix_directory(vault), create=create)
+                        except FileNotFoundError as e:
+                            log.warning(f"Collection {vault.collection_name} of vault '{vault.name}' is not available ({e}).")
+                            return None
+                    else:
+                        client = _get_chroma_client(vault)
+                        log.debug(f"Getting ChromaDB collection: {vault.collection_name}...")
+                        if create:
+                            collection = client.get_or_create_collection(
+                                name=vault.collection_name,
+                                embedding_function=SharedModelEmbeddingFunction()
+                            )
+                        else:
+                            try:
+                                collection = client.get_collection(
+                                    name=vault.collection_name,
+                                    embedding_function=SharedModelEmbeddingFunction()
+                                )
+                            except Exception as e:
+                                log.warning(f"Collection {vault.collection_name} of vault '{vault.name}' is not available ({e}).")
+                                return None
+                _collections[vault.name] = collection
+                log.info(f"{'Vector matrix' if VECTOR_STORE == 'matrix' else 'ChromaDB collection'} ready ({vault.collection_name}).")
+    return collection
+
+
+def _index_signature_path(vault):
+    return vault.index_path("index_signature", ".json")
+
+
+def _read_index_signature(vault):
+    """Returns the recorded (signature, metadata version, vector store), or (None, None, None)."""
     try:
-        with open(file_path, 'r', encoding='utf-8') as file:
-            content = file.read()
-            path_obj = Path(file_path)
-            base_dir_obj = Path(base_dir).resolve()
-            try:
-                doc_id = str(path_obj.relative_to(base_dir_obj))
-            except ValueError:
-                print(f"Warning: Could not make {path_obj} relative to {base_dir_obj}. Using absolute path as ID.")
-                doc_id = str(path_obj.resolve())
+        with open(_index_signature_path(vault), 'r') as f:
+            data = json.load(f)
+        return data.get("signature"), data.get("metadata_version", 0), data.get("vector_store", "chroma")
+    except (OSError, json.JSONDecodeError, AttributeError):
+        return None, None, None
 
-            title = content.split('\n', 1)[0].strip('# ').strip() if content else "Untitled"
-            metadata = {"title": title, "source": doc_id}
 
-            if not content.strip():
-                print(f"Skipping empty file: {file_path}")
-                return
-            try:
-                embedding = model.encode([content])[0].tolist()
-            except Exception as encode_err:
-                print(f"Error encoding content from {file_path}: {encode_err}")
-                return
+def _write_index_signature(vault, signature):
+    path = _index_signature_path(vault)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump({"signature": signature, "backend": EMBEDDING_BACKEND, "metadata_version": METADATA_VERSION,
+                   "vector_store": VECTOR_STORE}, f)
 
+
+def drop_index(vault=None):
+    """Deletes a vault's collection (of the configured vector store) and BM25 index so they can be rebuilt from scratch."""
+    vault = get_vault(vault)
+    with _collection_lock:
+        if VECTOR_STORE == "matrix":
+            collection = _collections.get(vault.name)
+            if collection is not None:
+                collection.close()
+            shutil.rmtree(_matrix_directory(vault), ignore_errors=True)
+        else:
             try:
-                collection.add(
-                    documents=[content],
-                    embeddings=[embedding],
-                    ids=[doc_id],
-                    metadatas=[metadata]
+                _get_chroma_client(vault).delete_collection(vault.collection_name)
+            except Exception as e:
+                log.warning(f"Could not delete collection {vault.collection_name}: {e}")
+        _collections.pop(vault.name, None)
+    with _bm25_lock:
+        bm25_index = _bm25_indexes.pop(vault.name, None)
+        if bm25_index is not None:
+            bm25_index.close()
+        for suffix in ("", "-wal", "-shm"):
+            Path(str(vault.index_path("bm25", ".sqlite3")) + suffix).unlink(missing_ok=True)
+
+
+def check_index_compatibility(vault=None):
+    """Drops a vault's index if its vectors came from an incompatible model or backend.
+
+    Returns True if every note has to be re-indexed: because the index was
+    dropped for incompatible vectors, or because it predates the chunks and
+    note metadata that are stored now or was built in the other vector store.
+    In the latter cases the index is dropped too, as chunk IDs may have
+    changed, and the vectors come back from the embedding cache. Indexes from
+    before the signature was recorded were built with the PyTorch backend and
+    ChromaDB.
+    """
+    vault = get_vault(vault)
+    signature = embedding_signature()
+    stored, metadata_version, vector_store = _read_index_signature(vault)
+    if stored is None and vault.is_default and (vault.embeddings_path / "chroma.sqlite3").exists():
+        stored, metadata_version, vector_store = embeddings_config["embeddings_function"], 0, "chroma"
+    if stored is None or stored == signature:
+        if stored is not None and vector_store != VECTOR_STORE:
+            # Whatever the newly selected store still holds predates the notes' current state.
+            log.info(f"Vault '{vault.name}' was indexed into '{vector_store}'; re-indexing it into '{VECTOR_STORE}'...")
+            drop_index(vault)
+            _write_index_signature(vault, signature)
+            return True
+        if stored is not None and metadata_version != METADATA_VERSION:
+            log.info(f"Re-indexing the notes of vault '{vault.name}' to store their frontmatter, tag and path metadata...")
+            drop_index(vault)
+            _write_index_signature(vault, signature)
+            return True
+        if stored is None:
+            _write_index_signature(vault, signature)
+        return False
+
+    log.warning(f"Embeddings of vault '{vault.name}' were built with '{stored}' but the configured backend produces '{signature}'.")
+    log.warning("The vectors are not compatible; rebuilding the index from scratch...")
+    drop_index(vault)
+    _write_index_signature(vault, signature)
+    return True
+
+
+def get_embedding_cache():
+    """Lazily opens the persistent embedding cache, or returns None if it is disabled."""
+    global _embedding_cache
+    if _embedding_cache is None and EMBEDDING_CACHE_MAX_MB > 0:
+        with _cache_lock:
+            if _embedding_cache is None:
+                _embedding_cache = EmbeddingCache(
+                    EMBEDDING_CACHE_PATH, max_bytes=int(EMBEDDING_CACHE_MAX_MB * 1024 * 1024)
+                )
+    return _embedding_cache
+
+
+def get_bm25_index(vault=None, create=True):
+    """Lazily opens a vault's BM25 index, or returns None if hybrid search is disabled.
+
+    If the index is empty while the collection already holds chunks (e.g. after
+    upgrading), it is backfilled from the documents stored in ChromaDB once.
+    With create=False (queries on archive shards) the index is opened read-only,
+    without a backfill, and a missing index file is not created.
+    """
+    if not HYBRID_SEARCH:
+        return None
+    vault = get_vault(vault)
+    bm25_index = _bm25_indexes.get(vault.name)
+    if bm25_index is None or (create and bm25_index.read_only):
+        path = vault.index_path("bm25", ".sqlite3")
+        if not create and not path.exists():
+            return None
+        collection = get_chroma_collection(vault, create=create)
+        if collection is None:
+            return None
+        with _bm25_lock:
+            bm25_index = _bm25_indexes.get(vault.name)
+            if bm25_index is None or (create and bm25_index.read_only):
+                bm25_index = BM25Index(
+                    path,
+                    k1=float(retrieval_config.get("bm25_k1", 1.2)),
+                    b=float(retrieval_config.get("bm25_b", 0.75)),
+                    read_only=not create,
                 )
-                print(f"Successfully added/updated document: {doc_id}")
-            except Exception as add_err:
-                print(f"Error adding document {doc_id} to collection: {add_err}")
-
-    except FileNotFoundError:
-        print(f"Error: File not found during processing: {file_path}")
-    except Exception as e:
-        print(f"Error processing file {file_path}: {e}")
+                if create and bm25_index.count() == 0 and collection.count() > 0:
+                    log.info(f"Building BM25 index from existing collection {vault.collection_name}...")
+                    page_size = _write_batch_size(vault)
+                    for offset in range(0, collection.count(), page_size):
+                        page = collection.get(include=['documents', 'metadatas'], limit=page_size, offset=offset)
+                        chunks = load_chunk_texts([
+                            {"id": chunk_id, "text": text, "metadata": metadata or {}}
+                            for chunk_id, text, metadata in zip(page['ids'], page['documents'], page['metadatas'])
+                        ], vault.documents_dir)
+                        bm25_index.add(
+                            (chunk["id"], chunk["text"] or "", chunk["metadata"].get("source", chunk["id"])) for chunk in chunks
+                        )
+                    log.info(f"BM25 index built with {bm25_index.count()} chunk(s).")
+                _bm25_indexes[vault.name] = bm25_index
+    return bm25_index
+
+
+def encode_texts(texts, pool=None):
+    """Encodes texts in batches, reusing cached vectors for text that was embedded before.
+
+    With a pool from start_encode_pool, the texts are split across its processes.
+    """
+    model_name = embedding_signature()
+    cache = get_embedding_cache()
+    hashes = [content_hash(text) for text in texts]
+    with span("embedding_cache.get", texts=len(texts)) as s:
+        cached = cache.get_many(model_name, hashes) if cache else {}
+        s.set(hits=len(cached))
+
+    missing = {}
+    for text, key in zip(texts, hashes):
+        if key not in cached and key not in missing:
+            missing[key] = text
+
+    if missing:
+        model = get_embedding_model()
+        with span("encode", texts=len(missing), batch_size=ENCODE_BATCH_SIZE, processes=len(pool["processes"]) if pool else 1) as s:
+            if s.recording:
+                s.set(tokens=sum(count_tokens(text) for text in missing.values()))
+            if pool is not None:
+                vectors = model.encode_multi_process(list(missing.values()), pool, batch_size=ENCODE_BATCH_SIZE)
+            else:
+                vectors = model.encode(list(missing.values()), batch_size=ENCODE_BATCH_SIZE)
+        encoded = dict(zip(missing.keys(), vectors))
+        if cache:
+            with span("embedding_cache.put", texts=len(encoded)):
+                cache.put_many(model_name, encoded.items())
+        cached.update(encoded)
+
+    if texts and len(missing) < len(texts):
+        log.info(f"  - Embedding cache: {len(texts) - len(missing)}/{len(texts)} chunk(s) reused.")
+    return [cached[key].tolist() for key in hashes]
+
+
+def start_encode_pool(workers=ENCODE_WORKERS):
+    """Starts a multi-process SentenceTransformer pool with one CPU process per worker, or returns None."""
+    if workers <= 1:
+        return None
+    if EMBEDDING_BACKEND != "torch":
+        log.info(f"encode_workers is ignored with the {EMBEDDING_BACKEND} backend; use [embeddings] threads instead.")
+        return None
+    model = get_embedding_model()
+    log.info(f"Starting {workers} encoder process(es)...")
+    return model.start_multi_process_pool(["cpu"] * workers)
+
+
+def stop_encode_pool(pool):
+    if pool is not None:
+        get_embedding_model().stop_multi_process_pool(pool)
+
+
+def _write_batch_size(vault=None):
+    """Returns the number of records sent to ChromaDB per add/delete call."""
+    vault = get_vault(vault)
+    if VECTOR_STORE == "matrix":
+        return max(1, WRITE_BATCH_SIZE)
+    get_chroma_collection(vault)
+    try:
+        return max(1, min(WRITE_BATCH_SIZE, _get_chroma_client(vault).get_max_batch_size()))
+    except Exception:
+        return max(1, WRITE_BATCH_SIZE)
+
+
+def _batched(items, size):
+    """Yields successive slices of at most `size` items."""
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _document_id(file_path, base_dir):
+    """Returns the collection ID for a file: its path relative to base_dir."""
+    path_obj = Path(file_path)
+    base_dir_obj = Path(base_dir).resolve()
+    try:
+        return str(path_obj.relative_to(base_dir_obj))
+    except ValueError:
+        log.warning(f"Could not make {path_obj} relative to {base_dir_obj}. Using absolute path as ID.")
+        return str(path_obj.resolve())
+
+
+def _read_document(file_path, base_dir):
+    """Reads a file and returns its chunks as (chunk_id, text, metadata) tuples; raises if it cannot be read."""
+    with span("file.read") as s, open(file_path, 'r', encoding='utf-8') as file:
+        content = file.read()
+        mtime = os.fstat(file.fileno()).st_mtime
+        s.set(chars=len(content))
+
+    if not content.strip():
+        log.info(f"Skipping empty file: {file_path}")
+        return []
+
+    doc_id = _document_id(file_path, base_dir)
+    frontmatter, body = split_frontmatter(content)
+    title = str(frontmatter.get("title") or body.lstrip().split('\n', 1)[0].strip('# ').strip() or "Untitled")
+    note_fields = note_metadata(frontmatter, doc_id, mtime)
+
+    # The frontmatter is stored as metadata, not embedded as text of its own.
+    frontmatter_lines = content[:len(content) - len(body)].count('\n') + 1 if len(body) < len(content) else 0
+    with span("chunk") as s:
+        markdown_chunks = chunk_markdown(content, CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS, skip_lines=frontmatter_lines)
+        s.set(chunks=len(markdown_chunks))
+    encoded = None if STORE_TEXT else content.encode('utf-8')
+
+    chunks = []
+    seen_ids = set()
+    for index, chunk in enumerate(markdown_chunks):
+        chunk_id = f"{doc_id}#L{chunk['start_line']}-L{chunk['end_line']}"
+        if chunk_id in seen_ids:
+            chunk_id = f"{chunk_id}.{index}"
+        seen_ids.add(chunk_id)
+        metadata = {
+            "title": title,
+            "source": doc_id,
+            "heading": chunk["heading"],
+            "chunk_index": index,
+            "start_line": chunk["start_line"],
+            "end_line": chunk["end_line"],
+            "start_byte": chunk["start_byte"],
+            "end_byte": chunk["end_byte"],
+            "content_hash": content_hash(chunk["text"]),
+            **note_fields,
+        }
+        if encoded is not None and encoded[chunk["start_byte"]:chunk["end_byte"]].decode('utf-8').strip() != chunk["text"]:
+            metadata["text"] = chunk["text"]  # not reproducible from its byte span (see span_reader)
+        chunks.append((chunk_id, chunk["text"], metadata))
+    return chunks
+
+
+def remove_documents_from_collection(doc_ids, vault=None):
+    """Remove all chunks of several documents from a vault's collection, matched by their `source` metadata.
+
+    Returns the IDs of the documents whose chunks could not be removed.
+    """
+    doc_ids = list(dict.fromkeys(doc_ids))
+    if not doc_ids:
+        return []
+    vault = get_vault(vault)
+    collection = get_chroma_collection(vault)
+    removed = 0
+    failed = []
+    for batch in _batched(doc_ids, _write_batch_size(vault)):
+        try:
+            with span("chroma.delete", sources=len(batch)):
+                collection.delete(where={"source": {"$in": batch}})
+            removed += len(batch)
+        except Exception as e:
+            log.error(f"Error removing {len(batch)} document(s): {e}")
+            failed.extend(batch)
+    bm25_index = get_bm25_index(vault)
+    if bm25_index is not None:
+        with span("bm25.remove", sources=len(doc_ids)):
+            bm25_index.remove_sources(doc_ids)
+    invalidate_sources(vault.document_id(doc_id) for doc_id in doc_ids)
+    log.info(f"Successfully removed {removed} document(s).")
+    return failed
+
+
+def remove_document_from_collection(doc_id, vault=None):
+    """Remove all chunks of a document from the collection by its ID."""
+    remove_documents_from_collection([doc_id], vault)
+
+
+def _encode_documents(documents, pool=None):
+    """Encodes the text of (chunk_id, text, metadata) tuples; returns None if encoding failed."""
+    try:
+        return encode_texts([content for _, content, _ in documents], pool)
+    except Exception as encode_err:
+        log.error(f"Error encoding batch of {len(documents)} chunk(s): {encode_err}")
+        return None
+
+
+def _upsert_documents(documents, embeddings, vault=None):
+    """Upserts encoded (chunk_id, text, metadata) tuples into a vault's collection and BM25 index in one call."""
+    if embeddings is None:
+        return 0
+    collection = get_chroma_collection(vault)
+    ids = [doc_id for doc_id, _, _ in documents]
+    try:
+        with span("chroma.upsert", chunks=len(ids)):
+            collection.upsert(
+                documents=[content for _, content, _ in documents] if STORE_TEXT else None,
+                embeddings=embeddings,
+                ids=ids,
+                metadatas=[metadata for _, _, metadata in documents]
+            )
+    except Exception as add_err:
+        log.error(f"Error adding batch of {len(ids)} chunk(s) to collection: {add_err}")
+        return 0
+
+    bm25_index = get_bm25_index(vault)
+    if bm25_index is not None:
+        with span("bm25.add", chunks=len(ids)):
+            bm25_index.add((chunk_id, text, metadata["source"]) for chunk_id, text, metadata in documents)
+    return len(ids)
+
+
+def _encode_and_upsert(documents, vault=None):
+    """Encodes a list of (chunk_id, text, metadata) in batches and upserts them in one call."""
+    return _upsert_documents(documents, _encode_documents(documents), vault)
+
+
+def process_files_for_embeddings(file_paths, base_dir, on_commit=None, vault=None):
+    """Reads, chunks, encodes and upserts many files through the staged indexing pipeline.
+
+    Reading and chunking, encoding, and ChromaDB writes run concurrently,
+    connected by bounded queues (see indexing_pipeline.run_pipeline). Large runs
+    also spread encoding over `encode_workers` processes. After every ChromaDB
+    write, on_commit(done_ids, {doc_id: error}) receives the document IDs that
+    are now completely indexed or that failed.
+    """
+    file_paths = list(dict.fromkeys(str(p) for p in file_paths))
+    if not file_paths:
+        return 0
+
+    vault = get_vault(vault)
+    write_batch_size = _write_batch_size(vault)
+    get_bm25_index(vault)  # open (and backfill) before the writer thread needs it
+    pool = start_encode_pool() if len(file_paths) >= POOL_MIN_FILES else None
+    try:
+        with span("index.pipeline", files=len(file_paths)) as s:
+            stats = run_pipeline(
+                file_paths,
+                read=lambda file_path: _read_document(file_path, base_dir),
+                encode=lambda documents: _encode_documents(documents, pool),
+                write=lambda documents, embeddings: _upsert_documents(documents, embeddings, vault),
+                batch_size=write_batch_size,
+                reader_workers=READER_WORKERS,
+                chunk_queue_depth=CHUNK_QUEUE_DEPTH,
+                write_queue_depth=WRITE_QUEUE_DEPTH,
+                progress_every=max(1, write_batch_size // 4) if len(file_paths) > write_batch_size else None,
+                on_commit=None if on_commit is None else lambda done, failures: on_commit(
+                    [_document_id(file_path, base_dir) for file_path in done],
+                    {_document_id(file_path, base_dir): error for file_path, error in failures.items()},
+                ),
+            )
+            s.set(chunks=stats.chunks)
+    finally:
+        stop_encode_pool(pool)
+
+    invalidate_sources(vault.document_id(_document_id(file_path, base_dir)) for file_path in file_paths)
+    log.info(f"Successfully added/updated {stats.written} chunk(s) from {len(file_paths) - stats.failed_files} file(s).")
+    if stats.failed_files:
+        log.warning(f"  - {stats.failed_files} file(s) could not be indexed.")
+    log.info(f"  - Indexing throughput: {stats.summary()}")
+    return stats.written
+
+
+def process_file_for_embeddings(file_path, base_dir, vault=None):
+    """Process a single file and add its embeddings to the collection."""
+    process_files_for_embeddings([file_path], base_dir, vault=vault)
@@ -0,0 +1,233 @@
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from settings import get_logger
+
+log = get_logger(__name__)
+
+_DONE = object()
+
+
+class PipelineStats:
+    """Counters filled in by the pipeline stages, reported as throughput at the end."""
+
+    def __init__(self):
+        self.files = 0
+        self.failed_files = 0
+        self.chunks = 0
+        self.written = 0
+        self.read_seconds = 0.0
+        self.encode_seconds = 0.0
+        self.write_seconds = 0.0
+        self.start_time = time.perf_counter()
+        self.end_time = None
+
+    @property
+    def elapsed(self):
+        return (self.end_time or time.perf_counter()) - self.start_time
+
+    def docs_per_second(self):
+        return self.files / self.elapsed if self.elapsed > 0 else 0.0
+
+    def summary(self):
+        return (
+            f"{self.files} file(s), {self.chunks} chunk(s) in {self.elapsed:.2f}s "
+            f"({self.docs_per_second():.1f} docs/s, {self.chunks / self.elapsed if self.elapsed > 0 else 0.0:.1f} chunks/s; "
+            f"busy time read {self.read_seconds:.2f}s, encode {self.encode_seconds:.2f}s, write {self.write_seconds:.2f}s)"
+        )
+
+
+class FileProgress:
+    """Tracks which files have had every chunk written, so they can be checkpointed batch by batch."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._expected = {}
+        self._written = Counter()
+        self._failed = set()
+        self._done = []
+        self._new_failures = {}
+
+    def read(self, file_path, chunk_count):
+        with self._lock:
+            if chunk_count == 0:
+                self._done.append(file_path)
+            else:
+                self._expected[file_path] = chunk_count
+
+    def fail(self, file_path, error):
+        with self._lock:
+            if file_path not in self._failed:
+                self._failed.add(file_path)
+                self._new_failures[file_path] = error
+
+    def written(self, owners, ok, error=None):
+        """Records a written (ok) or failed batch, given the file each of its chunks came from."""
+        if not ok:
+            for file_path in dict.fromkeys(owners):
+                self.fail(file_path, error)
+            return
+        with self._lock:
+            for file_path in owners:
+                self._written[file_path] += 1
+                if self._written[file_path] == self._expected.get(file_path) and file_path not in self._failed:
+                    self._done.append(file_path)
+
+    def drain(self):
+        """Returns (files completed, {file: error} failed) since the previous call."""
+        with self._lock:
+            done, self._done = self._done, []
+            failures, self._new_failures = self._new_failures, {}
+        return done, failures
+
+
+def _put(target, item, failed):
+    """Blocks on a bounded queue, but gives up once another stage has failed."""
+    while not failed.is_set():
+        try:
+            target.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def run_pipeline(file_paths, read, encode, write, batch_size, reader_workers=2,
+                 chunk_queue_depth=4096, write_queue_depth=2, progress_every=None, on_commit=None):
+    """Indexes files through three overlapping stages connected by bounded queues.
+
+    * readers: `reader_workers` threads call read(path) -> [(chunk_id, text, metadata)];
+    * encoder: one thread groups chunks into batches of `batch_size` and calls
+      encode(chunks) -> vectors (which may fan out to a process pool);
+    * writer: one thread calls write(chunks, vectors), so ChromaDB only ever
+      sees a single writer while the next batch is being encoded.
+
+    The queues bound memory: at most `chunk_queue_depth` chunks wait for the
+    encoder and `write_queue_depth` encoded batches wait for the writer.
+
+    A file whose read raises, or with chunks in a batch that write() did not
+    fully write, counts as failed without stopping the others. After each
+    batch is written, on_commit(done_paths, {path: error}) is called from the
+    writer thread with the files completed or failed since the last call, so
+    the caller can checkpoint them; files without chunks complete as soon as
+    they are read. Any other exception stops the pipeline and is re-raised.
+    Returns a PipelineStats.
+    """
+    stats = PipelineStats()
+    progress = FileProgress()
+    chunk_queue = queue.Queue(maxsize=max(1, chunk_queue_depth))
+    write_queue = queue.Queue(maxsize=max(1, write_queue_depth))
+    failed = threading.Event()
+    errors = []
+    stats_lock = threading.Lock()
+
+    def fail(exc):
+        errors.append(exc)
+        failed.set()
+
+    def read_one(file_path):
+        if failed.is_set():
+            return
+        start = time.perf_counter()
+        try:
+            chunks = read(file_path)
+        except Exception as e:
+            log.error(f"Error processing file {file_path}: {e}")
+            progress.fail(file_path, str(e) or type(e).__name__)
+            chunks = []
+        else:
+            progress.read(file_path, len(chunks))
+        with stats_lock:
+            stats.read_seconds += time.perf_counter() - start
+            stats.files += 1
+            files_done = stats.files
+        for chunk in chunks:
+            if not _put(chunk_queue, (file_path, chunk), failed):
+                return
+        if progress_every and files_done % progress_every == 0:
+            log.info(f"  - Read {files_done}/{len(file_paths)} file(s) ({stats.docs_per_second():.1f} docs/s)...")
+
+    def reader_stage():
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, reader_workers), thread_name_prefix="index-read") as executor:
+                for future in [executor.submit(read_one, path) for path in file_paths]:
+                    future.result()
+        except BaseException as e:
+            fail(e)
+        finally:
+            _put(chunk_queue, _DONE, failed)
+
+    def encode_batch(batch):
+        owners = [file_path for file_path, _ in batch]
+        chunks = [chunk for _, chunk in batch]
+        start = time.perf_counter()
+        vectors = encode(chunks)
+        stats.encode_seconds += time.perf_counter() - start
+        stats.chunks += len(chunks)
+        return _put(write_queue, (owners, chunks, vectors), failed)
+
+    def commit():
+        done, failures = progress.drain()
+        stats.failed_files += len(failures)
+        if on_commit is not None and (done or failures):
+            on_commit(done, failures)
+
+    def encoder_stage():
+        try:
+            batch = []
+            while not failed.is_set():
+                try:
+                    item = chunk_queue.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                if item is _DONE:
+                    break
+                batch.append(item)
+                if len(batch) >= batch_size:
+                    if not encode_batch(batch):
+                        return
+                    batch = []
+            if batch and not failed.is_set():
+                encode_batch(batch)
+        except BaseException as e:
+            fail(e)
+        finally:
+            _put(write_queue, _DONE, failed)
+
+    def writer_stage():
+        try:
+            while not failed.is_set():
+                try:
+                    item = write_queue.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                if item is _DONE:
+                    break
+                owners, batch, vectors = item
+                start = time.perf_counter()
+                written = write(batch, vectors)
+                stats.written += written
+                stats.write_seconds += time.perf_counter() - start
+                ok = vectors is not None and written == len(batch)
+                progress.written(owners, ok, None if ok else f"{len(batch) - written} of {len(batch)} chunk(s) were not indexed")
+                commit()
+        except BaseException as e:
+            fail(e)
+
+    threads = [
+        threading.Thread(target=reader_stage, name="index-readers", daemon=True),
+        threading.Thread(target=encoder_stage, name="index-encoder", daemon=True),
+        threading.Thread(target=writer_stage, name="index-writer", daemon=True),
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    stats.end_time = time.perf_counter()
+    if errors:
+        raise errors[0]
+    commit()
+    return stats
@@ -0,0 +1,419 @@
+import json
+import os
+import sqlite3
+import threading
+from pathlib import Path
+
+import numpy as np
+
+from settings import config, get_logger
+
+log = get_logger(__name__)
+
+embeddings_config = config["embeddings"]
+
+# Rows scored per step of a query; bounds the float32 copy of the matrix that is materialized at once.
+BLOCK_ROWS = int(embeddings_config.get("matrix_block_rows", 16384))
+# Compaction starts in the background once this fraction of the matrix rows is tombstoned.
+COMPACT_RATIO = float(embeddings_config.get("matrix_compact_ratio", 0.25))
+COMPACT_MIN_ROWS = 1024
+SQL_BATCH = 500
+# Candidate rows of recent where filters, kept until the next write.
+CANDIDATE_CACHE_SIZE = 32
+
+_COMPARISONS = {"$eq": "=", "$ne": "IS NOT", "$gt": ">", "$gte": ">=", "$lt": "<", "$lte": "<="}
+
+
+def _normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def _where_sql(where):
+    """Translates a ChromaDB where filter into an SQL condition over the chunks table; returns (sql, params).
+
+    Supports $and / $or and the $eq, $ne, $gt, $gte, $lt, $lte, $in and $nin
+    operators on metadata keys, which are read from the JSON metadata column.
+    """
+    if not isinstance(where, dict) or not where:
+        raise ValueError(f"Invalid where filter: {where!r}")
+    clauses, params = [], []
+    for key, condition in where.items():
+        if key in ("$and", "$or"):
+            parts = [_where_sql(item) for item in condition]
+            clauses.append("(" + (" AND " if key == "$and" else " OR ").join(sql for sql, _ in parts) + ")")
+            params.extend(param for _, part_params in parts for param in part_params)
+            continue
+        if key == "source":
+            column, column_params = "source", []
+        elif '"' in key:
+            raise ValueError(f"Unsupported metadata key in where filter: {key!r}")
+        else:
+            column, column_params = "json_extract(metadata, ?)", [f'$."{key}"']
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        for operator, value in condition.items():
+            if operator in ("$in", "$nin"):
+                values = list(value)
+                if not values:
+                    clauses.append("0" if operator == "$in" else "1")
+                    continue
+                negation = "NOT " if operator == "$nin" else ""
+                clauses.append(f"{column} {negation}IN ({','.join('?' * len(values))})")
+                params.extend(column_params + values)
+            elif operator in _COMPARISONS:
+                clauses.append(f"{column} {_COMPARISONS[operator]} ?")
+                params.extend(column_params + [value])
+            else:
+                raise ValueError(f"Unsupported operator in where filter: {operator}")
+    return " AND ".join(clauses), params
+
+
+def exact_top_k(vectors, queries, k, alive=None, candidates=None, block_rows=BLOCK_ROWS):
+    """Returns (rows, scores) of the k largest dot products of each query with the rows of vectors, best first.
+
+    The matrix is scanned in blocks of block_rows, each converted to float32 and
+    scored with one matrix product, keeping only the running top k per query.
+    alive masks out tombstoned rows; candidates restricts the scan to the given
+    rows (a metadata pre-filter). Slots without a match have row -1.
+    """
+    queries = np.asarray(queries, dtype=np.float32)
+    best_rows = np.empty((len(queries), 0), dtype=np.int64)
+    best_scores = np.empty((len(queries), 0), dtype=np.float32)
+    if k <= 0:
+        return best_rows, best_scores
+    if candidates is not None and alive is not None:
+        candidates = candidates[alive[candidates]]
+    total = len(vectors) if candidates is None else len(candidates)
+    for start in range(0, total, block_rows):
+        stop = min(start + block_rows, total)
+        if candidates is None:
+            rows = np.arange(start, stop)
+            block = vectors[start:stop]
+        else:
+            rows = candidates[start:stop]
+            block = vectors[rows]
+        scores = queries @ np.asarray(block, dtype=np.float32).T
+        if candidates is None and alive is not None:
+            scores[:, ~alive[start:stop]] = -np.inf
+        best_rows = np.concatenate([best_rows, np.broadcast_to(rows, scores.shape)], axis=1)
+        best_scores = np.concatenate([best_scores, scores], axis=1)
+        if best_scores.shape[1] > k:
+            keep = np.argpartition(-best_scores, k - 1, axis=1)[:, :k]
+            best_rows = np.take_along_axis(best_rows, keep, axis=1)
+            best_scores = np.take_along_axis(best_scores, keep, axis=1)
+    order = np.argsort(-best_scores, axis=1, kind="stable")
+    best_rows = np.take_along_axis(best_rows, order, axis=1)
+    best_scores = np.take_along_axis(best_scores, order, axis=1)
+    best_rows[~np.isfinite(best_scores)] = -1
+    return best_rows, best_scores
+
+
+class MatrixCollection:
+    """Exact nearest-neighbour collection over normalized float16 vectors in a memory-mapped file.
+
+    Implements the part of the ChromaDB collection API that QueryMD uses
+    (upsert, delete, get, query and count), so it can stand in for a ChromaDB
+    collection. Vectors are appended to the matrix file; the SQLite ID table
+    maps each chunk ID to its matrix row and holds its metadata and text.
+    Replaced and deleted rows are marked in a tombstone bitmap, which is
+    rebuilt from the ID table on open, and are reclaimed by a compaction that
+    runs in a background thread once they make up COMPACT_RATIO of the matrix.
+    """
+
+    def __init__(self, directory, create=True):
+        self.directory = Path(directory)
+        db_path = self.directory / "ids.sqlite3"
+        if not create and not db_path.exists():
+            raise FileNotFoundError(f"No vector matrix at {self.directory}")
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()
+        self._compact_lock = threading.Lock()
+        self._compactor = None
+        self._candidates = {}
+        self._conn = sqlite3.connect(str(db_path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS chunks (
+                id TEXT PRIMARY KEY,
+                row INTEGER NOT NULL UNIQUE,
+                source TEXT,
+                metadata TEXT NOT NULL,
+                document TEXT
+            );
+            CREATE INDEX IF NOT EXISTS chunks_source ON chunks (source);
+            CREATE TABLE IF NOT EXISTS info (
+                name TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            );
+            INSERT OR IGNORE INTO info (name, value) VALUES ('dim', 0), ('generation', 0);
+            """
+        )
+        self._conn.commit()
+        info = dict(self._conn.execute("SELECT name, value FROM info"))
+        self._dim = info["dim"]
+        self._generation = info["generation"]
+        self._load()
+
+    def _matrix_path(self, generation=None):
+        return self.directory / f"vectors.{self._generation if generation is None else generation}.f16"
+
+    def _load(self):
+        """Maps the current matrix file and rebuilds the tombstone bitmap from the ID table.
+
+        Leftovers of an interrupted write or compaction are discarded: a partial
+        trailing row, rows appended without a committed ID, and the files of
+        other generations.
+        """
+        path = self._matrix_path()
+        for stale in self.directory.glob("vectors.*.f16"):
+            if stale != path:
+                stale.unlink(missing_ok=True)
+        path.touch(exist_ok=True)
+        rows = 0
+        if self._dim:
+            rows, partial = divmod(path.stat().st_size, self._dim * 2)
+            if partial:
+                os.truncate(path, rows * self._dim * 2)
+        live = np.fromiter((row for (row,) in self._conn.execute("SELECT row FROM chunks")), dtype=np.int64)
+        if (live >= rows).any():
+            log.warning(f"Dropping {int((live >= rows).sum())} chunk(s) without a stored vector from {self.directory}.")
+            with self._conn:
+                self._conn.execute("DELETE FROM chunks WHERE row >= ?", (rows,))
+            live = live[live < rows]
+        alive = np.zeros(rows, dtype=bool)
+        alive[live] = True
+        self._alive = alive
+        self._remap(rows)
+
+    def _remap(self, rows):
+        self._rows = rows
+        self._candidates = {}
+        if rows:
+            self._vectors = np.memmap(self._matrix_path(), dtype=np.float16, mode='r', shape=(rows, self._dim))
+        else:
+            self._vectors = np.empty((0, self._dim), dtype=np.float16)
+
+    def _set_dim(self, dim):
+        if not self._dim:
+            with self._conn:
+                self._conn.execute("UPDATE info SET value = ? WHERE name = 'dim'", (dim,))
+            self._dim = dim
+        elif dim != self._dim:
+            raise ValueError(f"Embedding dimension {dim} does not match the collection dimension {self._dim}.")
+
+    def _select(self, columns, ids=None, where=None, limit=None, offset=None):
+        """Runs a SELECT on the chunks table filtered by IDs and/or a where filter, in row order."""
+        condition, params = _where_sql(where) if where else ("1", [])
+        if ids is None:
+            sql = f"SELECT {columns} FROM chunks WHERE {condition} ORDER BY row"
+            if limit is not None:
+                sql += " LIMIT ? OFFSET ?"
+                params = params + [limit, offset or 0]
+            return self._conn.execute(sql, params).fetchall()
+        records = []
+        ids = list(ids)
+        for start in range(0, len(ids), SQL_BATCH):
+            batch = ids[start:start + SQL_BATCH]
+            records.extend(self._conn.execute(
+                f"SELECT {columns} FROM chunks WHERE id IN ({','.join('?' * len(batch))}) AND {condition}", batch + params
+            ))
+        return records
+
+    def _candidate_rows(self, where):
+        """Returns the rows matching a where filter; the SQL scan of the metadata is cached until the next write."""
+        key = json.dumps(where, sort_keys=True)
+        rows = self._candidates.get(key)
+        if rows is None:
+            rows = np.fromiter((row for (row,) in self._select("row", where=where)), dtype=np.int64)
+            if len(self._candidates) >= CANDIDATE_CACHE_SIZE:
+                self._candidates.pop(next(iter(self._candidates)))
+            self._candidates[key] = rows
+        return rows
+
+    def count(self):
+        with self._lock:
+            return int(np.count_nonzero(self._alive))
+
+    def upsert(self, ids, embeddings, metadatas=None, documents=None):
+        """Adds chunks, replacing any with the same IDs; their old rows become tombstones."""
+        ids = list(ids)
+        if not ids:
+            return
+        vectors = _normalize(np.asarray(embeddings, dtype=np.float32))
+        if vectors.ndim != 2 or len(vectors) != len(ids):
+            raise ValueError(f"Expected {len(ids)} embeddings, got an array of shape {vectors.shape}.")
+        metadatas = list(metadatas) if metadatas is not None else [{}] * len(ids)
+        documents = list(documents) if documents is not None else [None] * len(ids)
+        # The last occurrence of a repeated ID wins, as in ChromaDB.
+        positions = sorted({chunk_id: position for position, chunk_id in enumerate(ids)}.values())
+        if len(positions) < len(ids):
+            ids, vectors = [ids[p] for p in positions], vectors[positions]
+            metadatas, documents = [metadatas[p] for p in positions], [documents[p] for p in positions]
+
+        with self._lock:
+            self._set_dim(vectors.shape[1])
+            replaced = [row for (row,) in self._select("row", ids)]
+            start = self._rows
+            # The vectors are durable before their IDs are committed, so a crash in between only leaves unreferenced rows.
+            with open(self._matrix_path(), 'ab') as f:
+                f.write(vectors.astype(np.float16).tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO chunks (id, row, source, metadata, document) VALUES (?, ?, ?, ?, ?)",
+                    [
+                        (chunk_id, start + offset, (metadata or {}).get("source"), json.dumps(metadata or {}), document)
+                        for offset, (chunk_id, metadata, document) in enumerate(zip(ids, metadatas, documents))
+                    ],
+                )
+            # Queries hold on to the previous bitmap, so it is replaced rather than modified.
+            alive = np.concatenate([self._alive, np.ones(len(ids), dtype=bool)])
+            alive[replaced] = False
+            self._alive = alive
+            self._remap(start + len(ids))
+            self._maybe_compact()
+
+    def delete(self, ids=None, where=None):
+        """Deletes chunks by ID and/or where filter."""
+        if ids is None and where is None:
+            return
+        with self._lock:
+            rows = [row for (row,) in self._select("row", ids, where)]
+            if not rows:
+                return
+            with self._conn:
+                for start in range(0, len(rows), SQL_BATCH):
+                    batch = rows[start:start + SQL_BATCH]
+                    self._conn.execute(f"DELETE FROM chunks WHERE row IN ({','.join('?' * len(batch))})", batch)
+            alive = self._alive.copy()
+            alive[rows] = False
+            self._alive = alive
+            self._candidates = {}
+            self._maybe_compact()
+
+    def get(self, ids=None, where=None, limit=None, offset=None, include=("metadatas", "documents")):
+        """Returns chunks by ID and/or where filter in the shape of ChromaDB's Collection.get."""
+        with self._lock:
+            records = self._select("id, row, metadata, document", ids, where, limit, offset)
+            vectors = self._vectors
+        return {
+            "ids": [record[0] for record in records],
+            "embeddings": (
+                np.asarray(vectors[[record[1] for record in records]], dtype=np.float32) if "embeddings" in include else None
+            ),
+            "metadatas": [json.loads(record[2]) for record in records] if "metadatas" in include else None,
+            "documents": [record[3] for record in records] if "documents" in include else None,
+        }
+
+    def query(self, query_embeddings, n_results=10, where=None, include=("metadatas", "documents", "distances")):
+        """Exact cosine top-n_results per query in the shape of ChromaDB's Collection.query.
+
+        With a where filter, only the matching rows are scored. Distances are
+        cosine distances (1 - similarity).
+        """
+        queries = _normalize(np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32)))
+        while True:
+            with self._lock:
+                generation, vectors, alive = self._generation, self._vectors, self._alive
+                candidates = None if where is None else self._candidate_rows(where)
+            top_rows, top_scores = exact_top_k(vectors, queries, n_results, alive, candidates)
+            with self._lock:
+                # A compaction renumbers the rows; score again against the new matrix.
+                if generation != self._generation:
+                    continue
+                wanted = sorted({int(row) for row in top_rows.ravel() if row >= 0})
+                records = {}
+                for start in range(0, len(wanted), SQL_BATCH):
+                    batch = wanted[start:start + SQL_BATCH]
+                    records.update((record[0], record[1:]) for record in self._conn.execute(
+                        f"SELECT row, id, metadata, document FROM chunks WHERE row IN ({','.join('?' * len(batch))})", batch
+                    ))
+            # Some of the rows were deleted after they were scored; score again without them.
+            if len(records) < len(wanted):
+                continue
+            break
+
+        results = {"ids": [], "embeddings": [], "metadatas": [], "documents": [], "distances": []}
+        for rows, scores in zip(top_rows, top_scores):
+            hits = [(int(row), float(score)) for row, score in zip(rows, scores) if row >= 0]
+            results["ids"].append([records[row][0] for row, _ in hits])
+            results["embeddings"].append(np.asarray(vectors[[row for row, _ in hits]], dtype=np.float32))
+            results["metadatas"].append([json.loads(records[row][1]) for row, _ in hits])
+            results["documents"].append([records[row][2] for row, _ in hits])
+            results["distances"].append([1.0 - score for _, score in hits])
+        for key in ("embeddings", "metadatas", "documents", "distances"):
+            if key not in include:
+                results[key] = None
+        return results
+
+    def _maybe_compact(self):
+        dead = self._rows - int(np.count_nonzero(self._alive))
+        if self._rows < COMPACT_MIN_ROWS or dead <= COMPACT_RATIO * self._rows:
+            return
+        if self._compactor is None or not self._compactor.is_alive():
+            self._compactor = threading.Thread(target=self._compact_in_background, name="querymd-compact", daemon=True)
+            self._compactor.start()
+
+    def _compact_in_background(self):
+        try:
+            self.compact()
+        except Exception as e:
+            log.warning(f"Compaction of {self.directory} failed: {e}")
+
+    def compact(self):
+        """Rewrites the matrix without tombstoned rows; returns False if there was nothing to reclaim.
+
+        The live rows are copied to a new generation of the matrix file without
+        holding the lock, so writes and queries go on meanwhile. Rows appended
+        during the copy are added under the lock, after which the ID table is
+        renumbered and the new generation committed in one transaction.
+        """
+        with self._compact_lock:
+            with self._lock:
+                generation, vectors, rows = self._generation, self._vectors, self._rows
+                keep = np.flatnonzero(self._alive)
+            if len(keep) == rows:
+                return False
+            new_path = self._matrix_path(generation + 1)
+            with open(new_path, 'wb') as f:
+                for start in range(0, len(keep), BLOCK_ROWS):
+                    f.write(np.ascontiguousarray(vectors[keep[start:start + BLOCK_ROWS]]).tobytes())
+                with self._lock:
+                    appended = rows + np.flatnonzero(self._alive[rows:])
+                    f.write(np.ascontiguousarray(self._vectors[appended]).tobytes())
+                    f.flush()
+                    os.fsync(f.fileno())
+                    order = np.concatenate([keep, appended])
+                    # Rows deleted during the copy stay tombstoned in the new matrix.
+                    alive = self._alive[order]
+                    remap = zip(order[alive].tolist(), np.flatnonzero(alive).tolist())
+                    with self._conn:
+                        self._conn.execute("CREATE TEMP TABLE IF NOT EXISTS remap (old INTEGER PRIMARY KEY, new INTEGER NOT NULL)")
+                        self._conn.execute("DELETE FROM remap")
+                        self._conn.executemany("INSERT INTO remap (old, new) VALUES (?, ?)", remap)
+                        # Through negative rows, so the UNIQUE constraint holds at every step.
+                        self._conn.execute("UPDATE chunks SET row = -1 - (SELECT new FROM remap WHERE old = chunks.row)")
+                        self._conn.execute("UPDATE chunks SET row = -1 - row")
+                        self._conn.execute("UPDATE info SET value = ? WHERE name = 'generation'", (generation + 1,))
+                        self._conn.execute("DELETE FROM remap")
+                    old_path = self._matrix_path()
+                    self._generation = generation + 1
+                    self._alive = alive
+                    self._remap(len(order))
+            try:
+                old_path.unlink()
+            except OSError as e:
+                log.debug(f"Could not remove {old_path}: {e}")
+            log.info(f"Compacted {self.directory.name}: {rows - len(keep)} tombstoned row(s) reclaimed.")
+            return True
+
+    def close(self):
+        """Waits for a running compaction and closes the ID table."""
+        if self._compactor is not None:
+            self._compactor.join()
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,148 @@
+import datetime
+import re
+from pathlib import PurePosixPath
+from settings import get_logger
+
+log = get_logger(__name__)
+
+FRONTMATTER_RE = re.compile(r"\A---[ \t]*\r?\n(.*?)^(?:---|\.\.\.)[ \t]*$", re.DOTALL | re.MULTILINE)
+FILTER_RE = re.compile(r'(?<!\S)(tag|path|after|before):(?:"([^"]*)"|(\S+))', re.IGNORECASE)
+DATE_KEYS = ("date", "created", "updated", "modified")
+MARKDOWN_EXTENSIONS = ('.md', '.markdown')
+# Bumped when the chunks or the metadata stored per chunk change, so existing notes are re-indexed once.
+# 2: frontmatter is no longer embedded as a chunk.
+METADATA_VERSION = 2
+
+
+def split_frontmatter(content):
+    """Returns (frontmatter dict, body) for a note; notes without a YAML mapping as frontmatter are returned whole with an empty dict."""
+    match = FRONTMATTER_RE.match(content)
+    if not match:
+        return {}, content
+    import yaml
+    try:
+        data = yaml.safe_load(match.group(1))
+    except yaml.YAMLError as e:
+        log.debug(f"Ignoring invalid frontmatter ({e}).")
+        return {}, content
+    if not isinstance(data, dict):
+        # E.g. a paragraph between two thematic breaks: it is part of the note, not frontmatter.
+        return {}, content
+    return data, content[match.end():]
+
+
+def _as_list(value):
+    """Frontmatter lists may also be written as a comma or space separated string."""
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return [item for item in re.split(r"[,\s]+", value) if item]
+    if isinstance(value, (list, tuple, set)):
+        return [str(item) for item in value if item is not None]
+    return [str(value)]
+
+
+def normalize_tag(tag):
+    return str(tag).strip().lstrip("#").strip().lower()
+
+
+def tag_keys(tags):
+    """Returns the metadata keys of tags; nested tags (infra/k8s) also get their parents (infra)."""
+    keys = set()
+    for tag in tags:
+        parts = [part for part in normalize_tag(tag).split("/") if part]
+        for depth in range(1, len(parts) + 1):
+            keys.add("tag_" + "/".join(parts[:depth]))
+    return keys
+
+
+def to_timestamp(value):
+    """Converts a frontmatter date, datetime or ISO date string to Unix seconds (UTC), or None."""
+    if isinstance(value, str):
+        try:
+            value = datetime.datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    if isinstance(value, datetime.datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=datetime.timezone.utc)
+        return int(value.timestamp())
+    if isinstance(value, datetime.date):
+        return int(datetime.datetime(value.year, value.month, value.day, tzinfo=datetime.timezone.utc).timestamp())
+    return None
+
+
+def note_metadata(frontmatter, doc_id, mtime):
+    """Returns the filterable metadata of a note, flattened to ChromaDB scalar values.
+
+    Each tag becomes a boolean `tag_<tag>` key, each folder of the note's path a
+    `dir_<depth>` key, and `date` holds the frontmatter date (else its created
+    date, else the file's mtime) in Unix seconds so it can be range-filtered.
+    """
+    tags = sorted({normalize_tag(tag) for tag in _as_list(frontmatter.get("tags", frontmatter.get("tag")))} - {""})
+    aliases = _as_list(frontmatter.get("aliases", frontmatter.get("alias")))
+    folders = PurePosixPath(doc_id.replace("\\", "/")).parts[:-1]
+
+    metadata = {"folder": "/".join(folders), "mtime": int(mtime)}
+    metadata.update((f"dir_{depth}", folder) for depth, folder in enumerate(folders))
+    metadata.update((key, True) for key in tag_keys(tags))
+    if tags:
+        metadata["tags"] = ", ".join(tags)
+    if aliases:
+        metadata["aliases"] = ", ".join(aliases)
+    for key in DATE_KEYS:
+        timestamp = to_timestamp(frontmatter.get(key))
+        if timestamp is not None:
+            metadata[key] = timestamp
+    metadata.setdefault("date", metadata.get("created", int(mtime)))
+    return metadata
+
+
+def _path_clauses(value):
+    """path:runbooks/ matches every note under a folder; path:runbooks/db.md matches one note."""
+    is_folder = value.endswith("/")
+    path = value.strip().strip("/")
+    if not path:
+        return []
+    if not is_folder and path.lower().endswith(MARKDOWN_EXTENSIONS):
+        return [{"source": path}]
+    return [{f"dir_{depth}": folder} for depth, folder in enumerate(PurePosixPath(path).parts)]
+
+
+def parse_filters(query_text):
+    """Splits filter terms such as `tag:infra path:runbooks/ after:2026-01-01` off a query.
+
+    Returns (remaining query text, ChromaDB where clause or None). after: is
+    inclusive and before: exclusive, both on the `date` metadata. Terms that do
+    not parse (e.g. an invalid date) are left in the query text.
+    """
+    clauses = []
+
+    def take(match):
+        key, value = match.group(1).lower(), match.group(2) if match.group(2) is not None else match.group(3)
+        if key == "tag":
+            keys = tag_keys([value])
+            if not keys:
+                return match.group(0)
+            clauses.append({max(keys, key=len): True})
+        elif key == "path":
+            path_clauses = _path_clauses(value)
+            if not path_clauses:
+                return match.group(0)
+            clauses.extend(path_clauses)
+        else:
+            timestamp = to_timestamp(value)
+            if timestamp is None:
+                return match.group(0)
+            clauses.append({"date": {"$gte" if key == "after" else "$lt": timestamp}})
+        return ""
+
+    remaining = " ".join(FILTER_RE.sub(take, query_text).split())
+    return remaining or query_text.strip(), where_clause(clauses)
+
+
+def where_clause(clauses):
+    """Combines single-key clauses into one ChromaDB where filter ($and needs at least two)."""
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
@@ -0,0 +1,191 @@
+"""Lightweight timing spans around QueryMD's stages.
+
+Spans are only recorded after enable() is called (e.g. by the --profile flag);
+until then span() returns a shared no-op object, so the instrumentation can
+stay in place at negligible cost.
+
+    with span("chroma.query", n_results=20) as s:
+        results = collection.query(...)
+        s.set(returned=len(results["ids"][0]))
+"""
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+
+# Attributes that describe how a stage ran rather than how much it did: the
+# summary lists their distinct values instead of adding them up.
+SETTING_ATTRIBUTES = frozenset({"batch_size", "processes", "workers", "n_results", "budget", "provider", "model"})
+
+_enabled = False
+_events = []
+_lock = threading.Lock()
+_origin = time.perf_counter()
+
+
+class _NullSpan:
+    recording = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Span:
+    """Times a block and records it, with its attributes, when the block exits."""
+
+    recording = True
+
+    def __init__(self, name, attrs):
+        self.name = name
+        self.attrs = attrs
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self.start
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        record(self.name, self.start, duration, self.attrs)
+        return False
+
+    def set(self, **attrs):
+        """Adds attributes known only once the work is done (counts, sizes, ...)."""
+        self.attrs.update(attrs)
+
+
+def enable():
+    """Starts recording spans, discarding any recorded before."""
+    global _enabled, _origin
+    with _lock:
+        _events.clear()
+        _origin = time.perf_counter()
+        _enabled = True
+
+
+def is_enabled():
+    return _enabled
+
+
+def span(name, **attrs):
+    """Returns a context manager that records `name` with attrs, or a no-op when profiling is off."""
+    if not _enabled:
+        return _NULL_SPAN
+    return Span(name, attrs)
+
+
+def record(name, start, duration, attrs=None):
+    """Records a span measured by the caller, e.g. across a generator's yields.
+
+    start is a time.perf_counter() value and duration is in seconds.
+    """
+    if not _enabled:
+        return
+    thread = threading.current_thread()
+    with _lock:
+        _events.append((name, start, duration, thread.ident, thread.name, attrs or {}))
+
+
+def summary():
+    """Returns {name: {"calls", "total_ms", "mean_ms", "max_ms", **attributes}}, ordered by first start.
+
+    Numeric attributes are summed over all calls (e.g. chunks, tokens), except
+    SETTING_ATTRIBUTES, which are reported as their distinct values.
+    """
+    with _lock:
+        events = list(_events)
+    stages = {}
+    for name, start, duration, _, _, attrs in sorted(events, key=lambda event: event[1]):
+        stage = stages.setdefault(name, {
+            "calls": 0, "total_ms": 0.0, "max_ms": 0.0, "attrs": defaultdict(float), "settings": defaultdict(dict),
+        })
+        stage["calls"] += 1
+        stage["total_ms"] += duration * 1000
+        stage["max_ms"] = max(stage["max_ms"], duration * 1000)
+        for key, value in attrs.items():
+            if key in SETTING_ATTRIBUTES:
+                stage["settings"][key][value] = None
+            elif isinstance(value, (int, float)) and not isinstance(value, bool):
+                stage["attrs"][key] += value
+    return {
+        name: {
+            "calls": stage["calls"],
+            "total_ms": stage["total_ms"],
+            "mean_ms": stage["total_ms"] / stage["calls"],
+            "max_ms": stage["max_ms"],
+            **{key: int(value) if float(value).is_integer() else value for key, value in stage["attrs"].items()},
+            **{key: values.popitem()[0] if len(values) == 1 else "/".join(map(str, values))
+               for key, values in stage["settings"].items()},
+        }
+        for name, stage in stages.items()
+    }
+
+
+def format_report():
+    """Returns the per-stage breakdown as a text table.
+
+    Spans nest (e.g. "retrieve" contains "chroma.query"), so totals overlap and
+    the percentages are relative to the wall time since profiling was enabled.
+    """
+    wall_ms = (time.perf_counter() - _origin) * 1000
+    stages = summary()
+    if not stages:
+        return "No spans were recorded."
+    width = max(len("stage"), *(len(name) for name in stages))
+    lines = [
+        f"{'stage':<{width}}  {'calls':>6}  {'total ms':>10}  {'mean ms':>9}  {'max ms':>9}  {'% wall':>6}  details",
+        "-" * (width + 64),
+    ]
+    for name, stats in stages.items():
+        details = ", ".join(
+            f"{key}={value:g}" if isinstance(value, float) else f"{key}={value}"
+            for key, value in stats.items() if key not in ("calls", "total_ms", "mean_ms", "max_ms")
+        )
+        lines.append(
+            f"{name:<{width}}  {stats['calls']:>6}  {stats['total_ms']:>10.1f}  {stats['mean_ms']:>9.2f}  "
+            f"{stats['max_ms']:>9.2f}  {stats['total_ms'] / wall_ms * 100 if wall_ms else 0:>5.1f}%  {details}"
+        )
+    lines.append(f"Wall time since profiling started: {wall_ms:.1f} ms")
+    return "\n".join(lines)
+
+
+def write_trace(path):
+    """Writes the spans as Chrome trace JSON (chrome://tracing, Perfetto), plus the summary table data."""
+    with _lock:
+        events = list(_events)
+    pid = os.getpid()
+    trace_events = [
+        {"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": thread_name}}
+        for tid, thread_name in {event[3]: event[4] for event in events}.items()
+    ]
+    trace_events += [
+        {
+            "name": name, "cat": name.split(".", 1)[0], "ph": "X", "pid": pid, "tid": tid,
+            "ts": round((start - _origin) * 1_000_000, 3), "dur": round(duration * 1_000_000, 3),
+            "args": {key: value for key, value in attrs.items() if isinstance(value, (str, int, float, bool))},
+        }
+        for name, start, duration, tid, _, attrs in events
+    ]
+    with open(path, "w") as f:
+        json.dump({"traceEvents": trace_events, "displayTimeUnit": "ms", "summary": summary()}, f)
+
+
+def report(trace_path=None):
+    """Prints the breakdown table and, if trace_path is given, writes the Chrome trace there."""
+    print("\nProfile:")
+    print(format_report())
+    if trace_path:
+        write_trace(trace_path)
+        print(f"Trace written to {trace_path} (open it in chrome://tracing or https://ui.perfetto.dev)")
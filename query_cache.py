@@ -0,0 +1,227 @@
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+from settings import config
+
+cache_config = config.get("cache", {})
+
+QUERY_CACHE_PATH = Path(cache_config.get(
+    "path", Path(config["embeddings"]["embeddings_path"]) / "query_cache.sqlite3"
+)).expanduser()
+MAX_QUERY_EMBEDDINGS = int(cache_config.get("max_query_embeddings", 2000))
+MAX_ANSWERS = int(cache_config.get("max_answers", 500))
+CACHE_ENABLED = bool(cache_config.get("enabled", True))
+
+_query_cache = None
+_query_cache_lock = threading.Lock()
+
+
+def normalize_query(query_text):
+    """Lowercases a query and collapses whitespace so trivially different spellings share entries."""
+    return re.sub(r"\s+", " ", query_text).strip().lower()
+
+
+def answer_key(query_text, chunks, settings):
+    """Returns the cache key for an LLM answer.
+
+    chunks is a list of (chunk_id, content_hash) for the retrieved context and
+    settings a dict of everything else that shapes the answer (provider, model,
+    temperature, prompt options).
+    """
+    payload = json.dumps(
+        {"query": normalize_query(query_text), "chunks": list(chunks), "settings": settings},
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class QueryCache:
+    """Persistent two-layer LRU cache for queries.
+
+    The first layer maps normalized query text to its embedding. The second maps
+    an answer_key to the LLM answer and remembers which sources it was built
+    from, so invalidate_sources can drop answers whose notes changed.
+    """
+
+    def __init__(self, path, max_embeddings=2000, max_answers=500):
+        self.path = Path(path)
+        self.max_embeddings = max_embeddings
+        self.max_answers = max_answers
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS query_embeddings (
+                model TEXT NOT NULL,
+                query TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (model, query)
+            );
+            CREATE INDEX IF NOT EXISTS query_embeddings_last_used ON query_embeddings (last_used);
+            CREATE TABLE IF NOT EXISTS answers (
+                key TEXT PRIMARY KEY,
+                answer TEXT NOT NULL,
+                referenced_ids TEXT NOT NULL,
+                last_used REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS answers_last_used ON answers (last_used);
+            CREATE TABLE IF NOT EXISTS answer_sources (
+                key TEXT NOT NULL,
+                source TEXT NOT NULL,
+                PRIMARY KEY (key, source)
+            );
+            CREATE INDEX IF NOT EXISTS answer_sources_source ON answer_sources (source);
+            CREATE TABLE IF NOT EXISTS counters (
+                name TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            );
+            """
+        )
+        self._conn.commit()
+
+    def _count(self, name):
+        self._conn.execute(
+            "INSERT INTO counters (name, value) VALUES (?, 1) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + 1",
+            (name,),
+        )
+
+    def get_embedding(self, model, query_text):
+        """Returns the cached float32 embedding of a query, or None."""
+        query = normalize_query(query_text)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT vector FROM query_embeddings WHERE model = ? AND query = ?", (model, query)
+            ).fetchone()
+            if row is None:
+                self._count("embedding_misses")
+                self._conn.commit()
+                return None
+            self._conn.execute(
+                "UPDATE query_embeddings SET last_used = ? WHERE model = ? AND query = ?",
+                (time.time(), model, query),
+            )
+            self._count("embedding_hits")
+            self._conn.commit()
+        return np.frombuffer(row[0], dtype=np.float32)
+
+    def put_embedding(self, model, query_text, vector):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO query_embeddings (model, query, vector, last_used) VALUES (?, ?, ?, ?)",
+                (model, normalize_query(query_text), np.asarray(vector, dtype=np.float32).tobytes(), time.time()),
+            )
+            self._conn.execute(
+                "DELETE FROM query_embeddings WHERE rowid IN ("
+                "SELECT rowid FROM query_embeddings ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_embeddings,),
+            )
+            self._conn.commit()
+
+    def get_answer(self, key):
+        """Returns (answer, referenced_ids) for a cached answer, or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT answer, referenced_ids FROM answers WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self._count("answer_misses")
+                self._conn.commit()
+                return None
+            self._conn.execute("UPDATE answers SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._count("answer_hits")
+            self._conn.commit()
+        return row[0], json.loads(row[1])
+
+    def put_answer(self, key, answer, referenced_ids, sources):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO answers (key, answer, referenced_ids, last_used) VALUES (?, ?, ?, ?)",
+                (key, answer, json.dumps(referenced_ids), time.time()),
+            )
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO answer_sources (key, source) VALUES (?, ?)",
+                [(key, source) for source in set(sources)],
+            )
+            evicted = [row[0] for row in self._conn.execute(
+                "SELECT key FROM answers ORDER BY last_used DESC LIMIT -1 OFFSET ?", (self.max_answers,)
+            )]
+            self._delete_answers(evicted)
+            self._conn.commit()
+
+    def _delete_answers(self, keys):
+        for start in range(0, len(keys), 500):
+            batch = keys[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            self._conn.execute(f"DELETE FROM answers WHERE key IN ({placeholders})", batch)
+            self._conn.execute(f"DELETE FROM answer_sources WHERE key IN ({placeholders})", batch)
+
+    def invalidate_sources(self, sources):
+        """Drops every cached answer built from any of the given source documents."""
+        sources = list(set(sources))
+        if not sources:
+            return 0
+        with self._lock:
+            keys = set()
+            for start in range(0, len(sources), 500):
+                batch = sources[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                keys.update(row[0] for row in self._conn.execute(
+                    f"SELECT key FROM answer_sources WHERE source IN ({placeholders})", batch
+                ))
+            self._delete_answers(list(keys))
+            self._conn.commit()
+        return len(keys)
+
+    def stats(self):
+        """Returns entry counts and hit/miss counters for both layers."""
+        with self._lock:
+            counters = dict(self._conn.execute("SELECT name, value FROM counters"))
+            embeddings = self._conn.execute("SELECT COUNT(*) FROM query_embeddings").fetchone()[0]
+            answers = self._conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+        return {
+            "query_embeddings": embeddings,
+            "answers": answers,
+            "embedding_hits": counters.get("embedding_hits", 0),
+            "embedding_misses": counters.get("embedding_misses", 0),
+            "answer_hits": counters.get("answer_hits", 0),
+            "answer_misses": counters.get("answer_misses", 0),
+        }
+
+
+def get_query_cache():
+    """Lazily opens the shared query cache, or returns None if caching is disabled."""
+    global _query_cache
+    if _query_cache is None and CACHE_ENABLED:
+        with _query_cache_lock:
+            if _query_cache is None:
+                _query_cache = QueryCache(QUERY_CACHE_PATH, MAX_QUERY_EMBEDDINGS, MAX_ANSWERS)
+    return _query_cache
+
+
+def invalidate_sources(sources):
+    """Drops cached answers that reference any of the given documents, if caching is enabled."""
+    cache = get_query_cache()
+    if cache is None:
+        return 0
+    return cache.invalidate_sources(sources)
+
+
+if __name__ == "__main__":
+    cache = get_query_cache()
+    if cache is None:
+        print("Query cache is disabled in config.toml.")
+    else:
+        print(f"Query cache: {QUERY_CACHE_PATH}")
+        for name, value in cache.stats().items():
+            print(f"  {name}: {value}")
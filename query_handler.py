@@ -1,87 +1,370 @@
 import os
-try:
-    import groq
-except ImportError:
-    print("groq module not found. Please install it using 'pip install groq'")
-try:
-    from openai import OpenAI
-except ImportError:
-    print("openai module not found. Please install it using 'pip install openai'")
-try:
-    import ollama
-except ImportError:
-    print("ollama module not found. Please install it using 'pip install ollama'")
-
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-import toml
-from embeddings_manager import get_chroma_collection
+import hashlib
+import numpy as np
+import time
+from embeddings_manager import ENCODE_BATCH_SIZE, STORE_TEXT, embedding_signature, get_bm25_index, get_chroma_collection, get_embedding_model
+from context_packer import pack_chunks
+from bm25_index import reciprocal_rank_fusion
+from diversity import cosine_similarity_matrix, maximal_marginal_relevance
+from chunker import count_tokens
+from embedding_cache import content_hash
+from note_metadata import parse_filters
+from query_cache import answer_key, get_query_cache
+from profiling import record, span
+from span_reader import load_chunk_texts
+from settings import config, get_logger, setup_logging
+from vaults import get_vault, select_vaults
+
+log = get_logger(__name__)
 
 load_dotenv()
 
 _llm_client = None
-config = toml.load("config.toml")
+_llm_client_lock = threading.Lock()
+retrieval_config = config.get("retrieval", {})
+context_config = config.get("context", {})
 
 def initialize_client(provider):
     global _llm_client
 
-    if _llm_client is None:
-        provider_lower = provider.lower()
-        keymap = {"groq": "GROQ_API_KEY", "openai": "OPENAI_API_KEY"}
-
-        if provider_lower == 'groq':
-            api_key = os.environ.get(keymap[provider_lower])
-            if not api_key:
-                raise ValueError(f"{keymap[provider_lower]} environment variable not set.")
-            _llm_client = groq.Client(api_key=api_key)
-        elif provider_lower == 'openai':
-            api_key = os.environ.get(keymap[provider_lower])
-            if not api_key:
-                raise ValueError(f"{keymap[provider_lower]} environment variable not set.")
-            _llm_client = OpenAI(api_key=api_key)
-        elif provider_lower == 'ollama':
-            try:
-                _llm_client = ollama.Client()  # Using default host: http://localhost:11434
-                _llm_client.list()
-            except NameError:
-                raise ImportError("Ollama provider selected, but the 'ollama' library is not installed. Please run: pip install ollama")
-            except Exception as e:
-                raise ConnectionError(f"Failed to initialize or connect to Ollama client: {e}")
+    with _llm_client_lock:
+        if _llm_client is None:
+            with span("llm.client_init", provider=provider.lower()):
+                _llm_client = _create_client(provider)
+
+        return _llm_client
+
+
+def initialize_async_client(provider):
+    """Creates a new asyncio client for the provider (e.g. for batch mode); not shared like initialize_client's."""
+    with span("llm.client_init", provider=provider.lower()):
+        return _create_client(provider, asynchronous=True)
+
+
+def _create_client(provider, asynchronous=False):
+    """Creates the client for a provider; raises ValueError, ImportError or ConnectionError.
+
+    With asynchronous=True it returns the provider's asyncio client instead.
+    """
+    provider_lower = provider.lower()
+    keymap = {"groq": "GROQ_API_KEY", "openai": "OPENAI_API_KEY"}
+
+    # Provider SDKs are imported on demand so only the configured one is loaded.
+    if provider_lower == 'groq':
+        api_key = os.environ.get(keymap[provider_lower])
+        if not api_key:
+            raise ValueError(f"{keymap[provider_lower]} environment variable not set.")
+        try:
+            import groq
+        except ImportError:
+            raise ImportError("Groq provider selected, but the 'groq' library is not installed. Please run: pip install groq")
+        client_class = groq.AsyncClient if asynchronous else groq.Client
+        return client_class(api_key=api_key, base_url=config["llm"].get("base_url"))
+    elif provider_lower == 'openai':
+        api_key = os.environ.get(keymap[provider_lower])
+        if not api_key:
+            raise ValueError(f"{keymap[provider_lower]} environment variable not set.")
+        try:
+            from openai import AsyncOpenAI, OpenAI
+        except ImportError:
+            raise ImportError("OpenAI provider selected, but the 'openai' library is not installed. Please run: pip install openai")
+        client_class = AsyncOpenAI if asynchronous else OpenAI
+        return client_class(api_key=api_key, base_url=config["llm"].get("base_url"))
+    elif provider_lower == 'ollama':
+        try:
+            import ollama
+        except ImportError:
+            raise ImportError("Ollama provider selected, but the 'ollama' library is not installed. Please run: pip install ollama")
+        try:
+            client = ollama.Client()  # Using default host: http://localhost:11434
+            client.list()
+            return ollama.AsyncClient() if asynchronous else client
+        except Exception as e:
+            raise ConnectionError(f"Failed to initialize or connect to Ollama client: {e}")
+    else:
+        raise ValueError(f"Unsupported provider: {provider}. Supported providers are 'groq', 'openai', 'ollama'.")
+
+
+def format_chunk_reference(chunk_id, metadata):
+    """Returns a human-readable 'path (lines a-b, heading)' reference for a chunk."""
+    if not metadata:
+        return chunk_id
+    reference = f"{_chunk_source(chunk_id, metadata)} (lines {metadata.get('start_line')}-{metadata.get('end_line')}"
+    if metadata.get("heading"):
+        reference += f", {metadata['heading']}"
+    return reference + ")"
+
+
+def _chunk_source(chunk_id, metadata):
+    """Returns the note a chunk came from, prefixed with its vault when several vaults are configured."""
+    source = metadata.get("source", chunk_id)
+    return get_vault(metadata["vault"]).document_id(source) if "vault" in metadata else source
+
+
+def get_query_embedding(query_text):
+    """Returns the query embedding, reusing the cached vector for a recently asked query."""
+    return get_query_embeddings([query_text])[0]
+
+
+def get_query_embeddings(query_texts):
+    """Returns one embedding per query; queries missing from the cache are encoded in one batch."""
+    model_name = embedding_signature()
+    cache = get_query_cache()
+    with span("query.embed", queries=len(query_texts)) as s:
+        vectors = [cache.get_embedding(model_name, text) if cache is not None else None for text in query_texts]
+        missing = [index for index, vector in enumerate(vectors) if vector is None]
+        s.set(cached=len(query_texts) - len(missing))
+        if missing:
+            encoded = get_embedding_model().encode([query_texts[index] for index in missing])
+            for index, vector in zip(missing, encoded):
+                vectors[index] = vector
+                if cache is not None:
+                    cache.put_embedding(model_name, query_texts[index], vector)
+        return [vector.tolist() for vector in vectors]
+
+
+def retrieve_chunks(query_text, n_results=2, vaults=None, where=None):
+    """Returns the best matching chunks as dicts with `id`, `text` and `metadata`.
+
+    With hybrid search enabled, the dense results from ChromaDB and the lexical
+    BM25 results are merged by weighted reciprocal rank fusion. vaults selects
+    the shards to search (see vaults.select_vaults), and where is a ChromaDB
+    metadata filter (see note_metadata.parse_filters) applied before ranking.
+    """
+    return retrieve_chunks_batch([query_text], n_results, vaults=vaults, where=where)[0]
+
+
+def retrieve_chunks_batch(query_texts, n_results=2, query_embeddings=None, vaults=None, where=None):
+    """Batched retrieve_chunks: returns one list of chunks per query, in order.
+
+    The queries are embedded together (unless query_embeddings is given) and
+    sent to each selected shard as one query; fusion and MMR then run per query.
+    With several shards, they are searched in parallel and their results are
+    merged by cosine similarity to the query. The where filter applies to
+    every query of the batch.
+    """
+    with span("retrieve", n_results=n_results, queries=len(query_texts), filtered=int(where is not None)) as s:
+        if query_embeddings is None:
+            query_embeddings = get_query_embeddings(query_texts)
+        shards = _open_shards(vaults)
+        if len(shards) == 1:
+            results = _retrieve_chunks(query_texts, query_embeddings, n_results, *shards[0], where=where)
         else:
-            raise ValueError(f"Unsupported provider: {provider}. Supported providers are 'groq', 'openai', 'ollama'.")
-
-    return _llm_client
-
-
-def relevant_documents(query_text, n_results=2):
-    collection = get_chroma_collection()
-    results = collection.query(
-        query_texts=[query_text],
-        n_results=n_results,
-        include=['documents']
-    )
-
-    documents = results.get('documents', [[]])[0]
-    document_ids = results.get('ids', [[]])[0]
-
-    if not documents:
+            results = _fan_out(query_texts, query_embeddings, n_results, shards, where)
+        s.set(chunks=sum(len(chunks) for chunks in results), shards=len(shards))
+    return results
+
+
+def _open_shards(vaults):
+    """Returns (vault, collection) for each selected vault; archive shards are opened, never created, on first use."""
+    shards = []
+    for vault in select_vaults(vaults):
+        collection = get_chroma_collection(vault, create=not vault.archive)
+        if collection is not None:
+            shards.append((vault, collection))
+    return shards
+
+
+def _fan_out(query_texts, query_embeddings, n_results, shards, where=None):
+    """Queries every shard in its own thread and keeps the n_results best scored chunks per query."""
+    if not shards:
+        return [[] for _ in query_texts]
+    with ThreadPoolExecutor(max_workers=len(shards), thread_name_prefix="querymd-shard") as executor:
+        per_shard = list(executor.map(
+            lambda shard: _retrieve_chunks(query_texts, query_embeddings, n_results, *shard, with_scores=True, where=where),
+            shards,
+        ))
+    with span("shards.merge", shards=len(shards)):
+        return [
+            sorted((chunk for chunks in row for chunk in chunks), key=lambda chunk: chunk["score"], reverse=True)[:n_results]
+            for row in zip(*per_shard)
+        ]
+
+
+def _retrieve_chunks(query_texts, query_embeddings, n_results, vault=None, collection=None, with_scores=False, where=None):
+    if not query_texts:
+        return []
+    vault = get_vault(vault)
+    collection = collection or get_chroma_collection(vault)
+    bm25_index = get_bm25_index(vault, create=not vault.archive)
+    use_mmr = bool(retrieval_config.get("mmr", True)) and n_results > 1
+    # With MMR, more candidates than needed are fetched so there is something to diversify from.
+    fetch = n_results * max(1, int(retrieval_config.get("fetch_multiplier", 4))) if use_mmr else n_results
+    candidates = max(fetch, int(retrieval_config.get("candidates", 20))) if bm25_index is not None else fetch
+    # Without stored text, only the chunks that are finally selected are read from disk.
+    include = ['documents', 'metadatas'] if STORE_TEXT else ['metadatas']
+    if use_mmr or with_scores:
+        include.append('embeddings')
+
+    with span("chroma.query", n_results=candidates, queries=len(query_texts), vault=vault.name):
+        results = collection.query(
+            query_embeddings=query_embeddings,
+            n_results=candidates,
+            where=where,
+            include=include
+        )
+
+    ranked = [
+        _rank_candidates(query_text, query_embedding, results, row, n_results, fetch, candidates, use_mmr, include,
+                         collection, bm25_index, where)
+        for row, (query_text, query_embedding) in enumerate(zip(query_texts, query_embeddings))
+    ]
+    ranked = [load_chunk_texts(chunks, vault.documents_dir) for chunks in ranked]
+    for chunks, query_embedding in zip(ranked, query_embeddings):
+        if with_scores and chunks:
+            vectors = np.asarray([chunk["embedding"] for chunk in chunks], dtype=np.float32)
+            for chunk, score in zip(chunks, cosine_similarity_matrix(vectors, query_embedding)):
+                chunk["score"] = float(score)
+        for chunk in chunks:
+            chunk.pop("embedding", None)
+            chunk["id"] = vault.document_id(chunk["id"])
+            chunk["metadata"] = {**chunk["metadata"], "vault": vault.name}
+    return ranked
+
+
+def _rank_candidates(query_text, query_embedding, results, row, n_results, fetch, candidates, use_mmr, include,
+                     collection, bm25_index, where=None):
+    """Fuses, diversifies and trims the ChromaDB results of one query (row) of a batch.
+
+    BM25 does not know about metadata, so with a where filter its hits are
+    checked against ChromaDB before fusion and non-matching ones are dropped.
+    """
+    document_ids = results.get('ids', [[]])[row]
+    documents = (results.get('documents') or [[]])[row] or [None] * len(document_ids)
+    metadatas = (results.get('metadatas') or [[]])[row] or [None] * len(document_ids)
+    embeddings = results['embeddings'][row] if 'embeddings' in include else [None] * len(document_ids)
+    chunks = {
+        doc_id: {"id": doc_id, "text": doc, "metadata": metadata or {}, "embedding": embedding}
+        for doc_id, doc, metadata, embedding in zip(document_ids, documents, metadatas, embeddings)
+    }
+
+    def fetch_chunks(chunk_ids):
+        with span("chroma.get", ids=len(chunk_ids)):
+            extra = collection.get(ids=chunk_ids, where=where, include=include)
+        extra_embeddings = extra['embeddings'] if 'embeddings' in include else [None] * len(extra['ids'])
+        extra_documents = extra['documents'] or [None] * len(extra['ids'])
+        for doc_id, doc, metadata, embedding in zip(extra['ids'], extra_documents, extra['metadatas'], extra_embeddings):
+            chunks[doc_id] = {"id": doc_id, "text": doc, "metadata": metadata or {}, "embedding": embedding}
+
+    if bm25_index is None:
+        ranked = [(chunk_id, None) for chunk_id in document_ids[:fetch]]
+    else:
+        with span("bm25.query", n_results=candidates):
+            lexical_ids = [chunk_id for chunk_id, _ in bm25_index.query(query_text, candidates)]
+        if where is not None:
+            unseen = [chunk_id for chunk_id in lexical_ids if chunk_id not in chunks]
+            if unseen:
+                fetch_chunks(unseen)
+            lexical_ids = [chunk_id for chunk_id in lexical_ids if chunk_id in chunks]
+        with span("rrf"):
+            fused = reciprocal_rank_fusion(
+                [document_ids, lexical_ids],
+                weights=[float(retrieval_config.get("vector_weight", 1.0)), float(retrieval_config.get("bm25_weight", 1.0))],
+                k=int(retrieval_config.get("rrf_k", 60)),
+            )
+        ranked = fused[:fetch]
+
+    missing_ids = [chunk_id for chunk_id, _ in ranked if chunk_id not in chunks]
+    if missing_ids:
+        fetch_chunks(missing_ids)
+
+    ranked = [(chunk_id, score) for chunk_id, score in ranked if chunk_id in chunks]
+    if use_mmr and len(ranked) > n_results:
+        with span("mmr", candidates=len(ranked)):
+            pool = [chunks[chunk_id] for chunk_id, _ in ranked]
+            vectors = np.asarray([chunk["embedding"] for chunk in pool], dtype=np.float32)
+            if bm25_index is None:
+                relevance = cosine_similarity_matrix(vectors, query_embedding)
+            else:
+                # Fused ranks have no absolute scale; normalise them so the best candidate scores 1.
+                scores = np.asarray([score for _, score in ranked], dtype=np.float32)
+                relevance = scores / scores.max()
+            order = maximal_marginal_relevance(
+                relevance, vectors, n_results, float(retrieval_config.get("mmr_lambda", 0.7))
+            )
+        selected = [pool[index] for index in order]
+    else:
+        selected = [chunks[chunk_id] for chunk_id, _ in ranked[:n_results]]
+
+    return [dict(chunk) for chunk in selected]
+
+
+def build_context(chunks):
+    """Joins retrieved chunks into the context block of the prompt."""
+    with span("prompt.context", chunks=len(chunks)):
+        return "\n\n".join([
+            f"Document '{format_chunk_reference(chunk['id'], chunk['metadata'])}':\n{chunk['text']}"
+            for chunk in chunks
+        ])
+
+
+def encode_spans(texts):
+    """Encodes candidate context spans with the shared model.
+
+    They bypass the index embedding cache: spans are thrown away after packing
+    and would otherwise push out the cached vectors of indexed chunks.
+    """
+    with span("prompt.encode_spans", texts=len(texts)):
+        return get_embedding_model().encode(list(texts), batch_size=ENCODE_BATCH_SIZE)
+
+
+def pack_context(query_text, chunks, query_embedding=None):
+    """Trims retrieved chunks to the [context] budget_tokens, keeping the spans closest to the query."""
+    budget = int(context_config.get("budget_tokens", 1500))
+    with span("prompt.pack", budget=budget, chunks=len(chunks)) as s:
+        packed, tokens = pack_chunks(
+            query_embedding if query_embedding is not None else get_query_embedding(query_text),
+            chunks,
+            budget,
+            encode_spans,
+            rank_weight=float(context_config.get("rank_weight", 0.05)),
+            max_span_tokens=int(context_config.get("max_span_tokens", 60)),
+        )
+        s.set(tokens=tokens)
+    log.debug(f"Context: {tokens} token(s) from {len(packed)} of {len(chunks)} chunk(s) (budget {budget}).")
+    return packed
+
+
+def relevant_documents(query_text, n_results=2, vaults=None):
+    query_text, where = parse_filters(query_text)
+    chunks = pack_context(query_text, retrieve_chunks(query_text, n_results, vaults, where))
+    if not chunks:
         return None, None
-
-    context = "\n\n".join([f"Document '{doc_id}':\n{doc}" for doc_id, doc in zip(document_ids, documents)])
-    return context, document_ids
-
-
-def query_with_llm(query_text, n_results=3):
-    provider = config["llm"].get("provider", "groq").lower()
-
-    try:
-        client = initialize_client(provider)
-    except (ValueError, ImportError, ConnectionError) as e:
-        return f"Error initializing LLM client: {e}", None
-
-    context, document_ids = relevant_documents(query_text, n_results)
-    if not context:
-        return "I looked through the available documents, but couldn't find specific information related to your query.", None
-
+    return build_context(chunks), [chunk["id"] for chunk in chunks]
+
+
+def cached_answer_key(query_text, chunks):
+    """Returns the answer-cache key for a query over the given retrieved chunks."""
+    llm_config = config["llm"]
+    system_prompt = build_messages("", "")[0]["content"]
+    settings = {
+        "provider": llm_config.get("provider", "groq").lower(),
+        "model_name": llm_config.get("model_name"),
+        "temperature": llm_config.get("temperature", 0.7),
+        "max_tokens": llm_config.get("max_tokens", 1024),
+        "system_prompt": hashlib.sha256(system_prompt.encode("utf-8")).hexdigest(),
+    }
+    chunk_keys = [
+        (chunk["id"], chunk["metadata"].get("content_hash") or content_hash(chunk["text"]))
+        for chunk in chunks
+    ]
+    return answer_key(query_text, chunk_keys, settings)
+
+
+def store_answer(key, answer, chunks):
+    """Caches an LLM answer together with the sources of the chunks it was built from."""
+    cache = get_query_cache()
+    if cache is None or not answer:
+        return
+    sources = [_chunk_source(chunk["id"], chunk["metadata"]) for chunk in chunks]
+    cache.put_answer(key, answer, [chunk["id"] for chunk in chunks], sources)
+
+
+def build_messages(query_text, context):
+    """Builds the system and user chat messages for a query and its retrieved context."""
     system_prompt = """
                 You are a helpful assistant designed to answer user questions based *only* on the provided context.
                 The context below is extracted from the user's notes. It might contain irrelevant information.
@@ -108,6 +391,31 @@ def query_with_llm(query_text, n_results=3):
                 Based *only* on the RELEVANT CONTEXT provided above, answer the QUESTION.
                 """
 
+    return [{"role": "system", "content": system_prompt}, {"role": "user", "content": user_context_prompt}]
+
+
+def query_with_llm(query_text, n_results=3, vaults=None):
+    provider = config["llm"].get("provider", "groq").lower()
+
+    query_text, where = parse_filters(query_text)
+    chunks = pack_context(query_text, retrieve_chunks(query_text, n_results, vaults, where))
+    if not chunks:
+        return "I looked through the available documents, but couldn't find specific information related to your query.", None
+    context, document_ids = build_context(chunks), [chunk["id"] for chunk in chunks]
+
+    with span("answer_cache.lookup") as s:
+        key = cached_answer_key(query_text, chunks)
+        cache = get_query_cache()
+        cached = cache.get_answer(key) if cache is not None else None
+        s.set(hit=int(cached is not None))
+    if cached is not None:
+        return cached
+
+    try:
+        client = initialize_client(provider)
+    except (ValueError, ImportError, ConnectionError) as e:
+        return f"Error initializing LLM client: {e}", None
+
     try:
         model_name = config["llm"].get("model_name")
         if not model_name:
@@ -118,10 +426,74 @@ def query_with_llm(query_text, n_results=3):
 
         llm_content = None
 
-        message_data = [{"role": "system", "content": system_prompt}, {"role": "user", "content": user_context_prompt}]
+        with span("prompt.messages") as s:
+            message_data = build_messages(query_text, context)
+            if s.recording:
+                s.set(tokens=sum(count_tokens(message["content"]) for message in message_data))
 
         if provider == 'ollama':
-            response = client.chat(
+            with span("llm.call", provider=provider, model=model_name):
+                response = client.chat(
+                    model=model_name,
+                    messages=message_data,
+                    options={
+                        'temperature': temperature,
+                    }
+                )
+            llm_content = response.get('message', {}).get('content', '')
+
+        elif provider in ['groq', 'openai']:
+            with span("llm.call", provider=provider, model=model_name):
+                response = client.chat.completions.create(
+                    model=model_name,
+                    messages=message_data,
+                    temperature=temperature,
+                    max_tokens=max_tokens
+                )
+            llm_content = response.choices[0].message.content
+        else:
+            return f"Unsupported provider '{provider}' encountered during API call.", document_ids
+
+        store_answer(key, llm_content.strip(), chunks)
+        return llm_content.strip(), document_ids
+
+    except Exception as e:
+        error_message = f"An error occurred while querying the LLM ({provider}, model: {model_name or 'Not Specified'}): {e}"
+        log.error(error_message)
+        return error_message, document_ids
+
+
+async def answer_with_async_client(client, query_text, chunks):
+    """Answers a query over already retrieved and packed chunks with an asyncio client.
+
+    client comes from initialize_async_client(provider); used by batch
+    mode to keep several LLM requests in flight. Returns (answer, referenced_ids).
+    """
+    provider = config["llm"].get("provider", "groq").lower()
+    if not chunks:
+        return "I looked through the available documents, but couldn't find specific information related to your query.", None
+    context, document_ids = build_context(chunks), [chunk["id"] for chunk in chunks]
+
+    with span("answer_cache.lookup") as s:
+        key = cached_answer_key(query_text, chunks)
+        cache = get_query_cache()
+        cached = cache.get_answer(key) if cache is not None else None
+        s.set(hit=int(cached is not None))
+    if cached is not None:
+        return cached
+
+    model_name = config["llm"].get("model_name")
+    try:
+        if not model_name:
+            raise ValueError(f"LLM model_name must be specified in config.toml for the '{provider}' provider.")
+
+        temperature = config["llm"].get("temperature", 0.7)
+        max_tokens = config["llm"].get("max_tokens", 1024)
+        message_data = build_messages(query_text, context)
+        request_start = time.perf_counter()
+
+        if provider == 'ollama':
+            response = await client.chat(
                 model=model_name,
                 messages=message_data,
                 options={
@@ -129,9 +501,8 @@ def query_with_llm(query_text, n_results=3):
                 }
             )
             llm_content = response.get('message', {}).get('content', '')
-
         elif provider in ['groq', 'openai']:
-            response = client.chat.completions.create(
+            response = await client.chat.completions.create(
                 model=model_name,
                 messages=message_data,
                 temperature=temperature,
@@ -141,18 +512,115 @@ def query_with_llm(query_text, n_results=3):
         else:
             return f"Unsupported provider '{provider}' encountered during API call.", document_ids
 
+        record("llm.call", request_start, time.perf_counter() - request_start, {"provider": provider, "model": model_name})
+        store_answer(key, llm_content.strip(), chunks)
         return llm_content.strip(), document_ids
 
     except Exception as e:
         error_message = f"An error occurred while querying the LLM ({provider}, model: {model_name or 'Not Specified'}): {e}"
-        print(f"[Error] {error_message}")
+        log.error(error_message)
         return error_message, document_ids
 
 
+def stream_query_with_llm(query_text, n_results=3, vaults=None):
+    """Streaming variant of query_with_llm.
+
+    Yields event dicts: first {"type": "ids", "referenced_ids": [...]} as soon as
+    retrieval finishes, then {"type": "text", "text": ...} for each chunk of the
+    answer as the provider generates it.
+    """
+    provider = config["llm"].get("provider", "groq").lower()
+
+    query_text, where = parse_filters(query_text)
+    chunks = pack_context(query_text, retrieve_chunks(query_text, n_results, vaults, where))
+    if not chunks:
+        yield {"type": "ids", "referenced_ids": None}
+        yield {"type": "text", "text": "I looked through the available documents, but couldn't find specific information related to your query."}
+        return
+    context, document_ids = build_context(chunks), [chunk["id"] for chunk in chunks]
+
+    with span("answer_cache.lookup") as s:
+        key = cached_answer_key(query_text, chunks)
+        cache = get_query_cache()
+        cached = cache.get_answer(key) if cache is not None else None
+        s.set(hit=int(cached is not None))
+    if cached is not None:
+        yield {"type": "ids", "referenced_ids": cached[1]}
+        yield {"type": "text", "text": cached[0], "cached": True}
+        return
+
+    yield {"type": "ids", "referenced_ids": document_ids}
+
+    try:
+        client = initialize_client(provider)
+    except (ValueError, ImportError, ConnectionError) as e:
+        yield {"type": "text", "text": f"Error initializing LLM client: {e}"}
+        return
+
+    model_name = config["llm"].get("model_name")
+    try:
+        if not model_name:
+            raise ValueError(f"LLM model_name must be specified in config.toml for the '{provider}' provider.")
+
+        temperature = config["llm"].get("temperature", 0.7)
+        max_tokens = config["llm"].get("max_tokens", 1024)
+        with span("prompt.messages") as s:
+            message_data = build_messages(query_text, context)
+            if s.recording:
+                s.set(tokens=sum(count_tokens(message["content"]) for message in message_data))
+        answer_parts = []
+        request_start = time.perf_counter()
+
+        if provider == 'ollama':
+            stream = client.chat(
+                model=model_name,
+                messages=message_data,
+                options={
+                    'temperature': temperature,
+                },
+                stream=True
+            )
+            for part in stream:
+                text = part.get('message', {}).get('content', '')
+                if text:
+                    if not answer_parts:
+                        record("llm.time_to_first_token", request_start, time.perf_counter() - request_start, {"provider": provider})
+                    answer_parts.append(text)
+                    yield {"type": "text", "text": text}
+
+        elif provider in ['groq', 'openai']:
+            stream = client.chat.completions.create(
+                model=model_name,
+                messages=message_data,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                stream=True
+            )
+            for part in stream:
+                if not part.choices:
+                    continue
+                text = part.choices[0].delta.content
+                if text:
+                    if not answer_parts:
+                        record("llm.time_to_first_token", request_start, time.perf_counter() - request_start, {"provider": provider})
+                    answer_parts.append(text)
+                    yield {"type": "text", "text": text}
+        else:
+            yield {"type": "text", "text": f"Unsupported provider '{provider}' encountered during API call."}
+            return
+
+        record("llm.stream", request_start, time.perf_counter() - request_start, {"provider": provider, "parts": len(answer_parts)})
+        store_answer(key, "".join(answer_parts).strip(), chunks)
+
+    except Exception as e:
+        error_message = f"An error occurred while querying the LLM ({provider}, model: {model_name or 'Not Specified'}): {e}"
+        log.error(error_message)
+        yield {"type": "text", "text": error_message}
+
+
 if __name__ == "__main__":
+    setup_logging()
     user_query = input("Enter your query: ")
-    if not config:
-        config = toml.load("config.toml")
     llm_response, ids = query_with_llm(user_query)
 
     print("-" * 20)
@@ -0,0 +1,48 @@
+import logging
+import os
+import sys
+import toml
+
+# Parsed once per process; every module reads its settings from here.
+CONFIG_PATH = os.environ.get("QUERYMD_CONFIG", "config.toml")
+config = toml.load(CONFIG_PATH)
+
+# All QueryMD modules log below this logger, e.g. "querymd.embeddings_manager".
+LOGGER_NAME = "querymd"
+
+
+class _StdoutHandler(logging.StreamHandler):
+    """Writes to whatever sys.stdout is at the time, so contextlib.redirect_stdout captures it."""
+
+    def __init__(self):
+        super().__init__(sys.stdout)
+
+    @property
+    def stream(self):
+        return sys.stdout
+
+    @stream.setter
+    def stream(self, value):
+        pass
+
+
+def get_logger(name):
+    """Returns the QueryMD logger for a module name."""
+    return logging.getLogger(f"{LOGGER_NAME}.{name}")
+
+
+def setup_logging(level=None, stream=None):
+    """Sends QueryMD's diagnostics to stdout at `level` or the [logging] level from config (default INFO).
+
+    Use "WARNING" to silence progress messages, or "DEBUG" for per-file details.
+    stream redirects them elsewhere, e.g. sys.stderr when stdout carries output.
+    """
+    level = str(level or config.get("logging", {}).get("level", "INFO")).upper()
+    logger = logging.getLogger(LOGGER_NAME)
+    logger.setLevel(level)
+    logger.propagate = False
+    if not any(isinstance(handler, logging.StreamHandler) for handler in logger.handlers):
+        handler = _StdoutHandler() if stream is None else logging.StreamHandler(stream)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+    return logger
@@ -0,0 +1,64 @@
+import mmap
+from pathlib import Path
+from embedding_cache import content_hash
+from profiling import span
+from settings import get_logger
+
+log = get_logger(__name__)
+
+
+def _read_spans(path, chunks):
+    """Fills in the text of chunks of one note from a read-only memory map; returns the IDs that no longer match."""
+    stale = []
+    with open(path, 'rb') as f:
+        if f.seek(0, 2) == 0:
+            return [chunk["id"] for chunk in chunks]
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            for chunk in chunks:
+                metadata = chunk["metadata"]
+                try:
+                    text = mapped[metadata["start_byte"]:metadata["end_byte"]].decode('utf-8').strip()
+                except (KeyError, UnicodeDecodeError):
+                    stale.append(chunk["id"])
+                    continue
+                if content_hash(text) != metadata.get("content_hash"):
+                    stale.append(chunk["id"])
+                    continue
+                chunk["text"] = text
+    return stale
+
+
+def load_chunk_texts(chunks, documents_dir):
+    """Reads the text of chunks indexed without it (see [embeddings] store_text) from their notes.
+
+    Only the byte span of each chunk is touched, through one memory map per
+    note, and its content hash is checked against the one recorded at index
+    time. Chunks whose note changed or disappeared since it was indexed are
+    dropped until the next refresh re-indexes it. Chunks that could not be
+    reproduced from their span (words of an overlong line) keep their text in
+    the `text` metadata. Returns the chunks that have text, in order.
+    """
+    by_source = {}
+    for chunk in chunks:
+        if chunk.get("text") is not None:
+            continue
+        stored_text = chunk["metadata"].pop("text", None)
+        if stored_text is not None:
+            chunk["text"] = stored_text
+            continue
+        by_source.setdefault(chunk["metadata"].get("source", chunk["id"]), []).append(chunk)
+    if not by_source:
+        return chunks
+
+    stale = set()
+    with span("text.read", notes=len(by_source)):
+        for source, group in by_source.items():
+            try:
+                stale.update(_read_spans(Path(documents_dir) / source, group))
+            except (OSError, ValueError) as e:
+                log.debug(f"Could not read {source}: {e}")
+                stale.update(chunk["id"] for chunk in group)
+    if stale:
+        log.warning(f"{len(stale)} retrieved section(s) changed on disk since they were indexed and were skipped; "
+                    f"refresh the index to pick up the new text.")
+    return [chunk for chunk in chunks if chunk["id"] not in stale]
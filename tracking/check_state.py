@@ -1,40 +1,81 @@
-from pathlib import Path
-import toml
-from tracking.git_tracking import check_files_state_git
-from tracking.mtime_tracking import check_files_state_mtime
+import argparse
 import time
+from settings import get_logger, setup_logging
+from vaults import get_vault, writable_vaults
 
-config = toml.load("config.toml")
+log = get_logger(__name__)
 
-TRACKING_METHOD = config['state_tracking'].get('method', 'mtime').lower()
 
-if TRACKING_METHOD not in ["mtime", "git"]:
-    print(f"Invalid state_tracking method '{TRACKING_METHOD}' in config. Must be 'mtime' or 'git'.")
-    print("Defaulting to 'mtime' method.")
-    TRACKING_METHOD = "mtime"
+def reset_tracking_state(vault=None):
+    """Forgets what was indexed in a vault, so the next check processes every note."""
+    vault = get_vault(vault)
+    for path in (vault.state_file, vault.state_db, vault.journal_file):
+        path.unlink(missing_ok=True)
 
-DOCUMENTS_DIR = Path(config["files"]["markdown_directory"]).resolve()
-STATE_FILE = Path(config['files']['state_file']).resolve()
 
+def check_files_state(vault=None):
+    """Checks file state of one vault, or of every non-archive vault, with each vault's tracking method.
 
-def check_files_state():
-    """Checks file state using the method specified in config.toml"""
-    if TRACKING_METHOD == "git":
-        return check_files_state_git()
-    elif TRACKING_METHOD == "mtime":
-        return check_files_state_mtime()
-    else:
-        print(f"Error: Unknown tracking method '{TRACKING_METHOD}'. Defaulting to mtime.")
-        return check_files_state_mtime()
+    Vaults are indexed independently: an error in one is logged and the others
+    are still checked. Returns True if any embeddings were updated.
+    """
+    vaults = writable_vaults() if vault is None else [get_vault(vault)]
+    changed = False
+    for current in vaults:
+        if len(vaults) > 1:
+            log.info(f"Checking vault '{current.name}'...")
+        try:
+            changed = _check_vault(current) or changed
+        except Exception as e:
+            if len(vaults) == 1:
+                raise
+            log.error(f"Error checking vault '{current.name}': {e}")
+    return changed
+
+
+def _check_vault(vault):
+    from embeddings_manager import check_index_compatibility
+    if check_index_compatibility(vault):
+        reset_tracking_state(vault)
+    # Only the configured tracker is imported, so GitPython is not loaded in mtime mode.
+    if vault.method == "git":
+        from tracking.git_tracking import check_files_state_git
+        return check_files_state_git(vault)
+    from tracking.mtime_tracking import check_files_state_mtime
+    return check_files_state_mtime(vault)
+
+
+def process_changed_paths(relative_paths, vault=None):
+    """Re-indexes only the given paths (relative to the vault's notes directory) with the vault's tracker."""
+    vault = get_vault(vault)
+    if vault.method == "git":
+        from tracking.git_tracking import process_changed_paths_git
+        return process_changed_paths_git(relative_paths, vault)
+    from tracking.mtime_tracking import process_changed_paths_mtime
+    return process_changed_paths_mtime(relative_paths, vault)
 
 
 if __name__ == "__main__":
-    print(f"Running check_state standalone test (Method: {TRACKING_METHOD.upper()})")
+    parser = argparse.ArgumentParser(description="Run an incremental index update.")
+    parser.add_argument("--vault", help="only update this vault (archives are only indexed when named here)")
+    parser.add_argument("--profile", action="store_true", help="print a per-stage timing breakdown")
+    parser.add_argument("--profile-trace", metavar="PATH", help="also write the spans as a Chrome trace JSON file")
+    args = parser.parse_args()
+    setup_logging()
+    if args.profile or args.profile_trace:
+        import profiling
+        profiling.enable()
+
+    vaults = [get_vault(args.vault)] if args.vault else writable_vaults()
+    methods = ", ".join(f"{vault.name}: {vault.method.upper()}" for vault in vaults)
+    print(f"Running check_state standalone test (Method: {methods})")
     start_time = time.time()
-    changes = check_files_state()
+    changes = check_files_state(args.vault)
     end_time = time.time()
     if changes:
         print("\nFile check and processing finished: Embeddings updated.")
     else:
         print("\nFile check finished: No embedding updates needed.")
     print(f"Total time: {end_time - start_time:.2f} seconds.")
+    if args.profile or args.profile_trace:
+        profiling.report(args.profile_trace)
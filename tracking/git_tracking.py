@@ -1,45 +1,50 @@
 import json
 from pathlib import Path
-import toml
-from embeddings_manager import remove_document_from_collection, process_file_for_embeddings
+from profiling import span
+from tracking.index_journal import index_changes, open_journal, recover
+from settings import get_logger
+from vaults import get_vault
 import git
 
-config = toml.load("config.toml")
+log = get_logger(__name__)
 
-TRACKING_METHOD = config['state_tracking'].get('method', 'mtime').lower()
-
-if TRACKING_METHOD not in ["mtime", "git"]:
-    raise ValueError(f"Invalid state_tracking method '{TRACKING_METHOD}' in config. Must be 'mtime' or 'git'.")
-
-DOCUMENTS_DIR = Path(config["files"]["markdown_directory"]).resolve()
-STATE_FILE = Path(config['files']['state_file']).resolve()
+REGULAR_FILE_MODES = ('100644', '100755')
+HASH_OBJECT_BATCH = 500
 
 
 def load_previous_state_git(state_file_path):
-    """Loads the last processed Git commit SHA."""
+    """Loads the Git tracking state: the last seen HEAD and the blob SHA indexed for each path.
+
+    Returns a dict with "last_processed_commit" (or None) and "blobs" (or None if
+    the state predates per-path blob tracking).
+    """
+    empty_state = {"last_processed_commit": None, "blobs": None}
     if state_file_path.exists():
         try:
             with open(state_file_path, 'r') as f:
                 content = f.read()
                 if not content:
-                    return None
+                    return empty_state
                 state_data = json.loads(content)
-                return state_data.get("last_processed_commit")
-        except (json.JSONDecodeError, KeyError, TypeError) as e:
-            print(f"Warning: State file {state_file_path} corrupted or invalid format ({e}). Re-processing all files.")
-            return None
-    return None
-
-
-def save_current_state_git(commit_sha, state_file_path):
-    """Saves the latest processed Git commit SHA."""
+                return {
+                    "last_processed_commit": state_data.get("last_processed_commit"),
+                    "blobs": state_data.get("blobs"),
+                }
+        except (json.JSONDecodeError, KeyError, TypeError, AttributeError) as e:
+            log.warning(f"State file {state_file_path} corrupted or invalid format ({e}). Re-processing all files.")
+            return empty_state
+    return empty_state
+
+
+def save_current_state_git(commit_sha, blobs, state_file_path):
+    """Saves the current HEAD SHA and the blob SHA indexed for each Markdown path."""
     try:
         state_file_path.parent.mkdir(parents=True, exist_ok=True)
-        state_data = {"last_processed_commit": commit_sha}
+        state_data = {"last_processed_commit": commit_sha, "blobs": blobs}
         with open(state_file_path, 'w') as f:
-            json.dump(state_data, f, indent=4)
+            json.dump(state_data, f, separators=(',', ':'), sort_keys=True)
     except Exception as e:
-        print(f"Error saving state file {state_file_path}: {e}")
+        log.error(f"Error saving state file {state_file_path}: {e}")
 
 
 def is_markdown_file_path(file_path_str):
@@ -51,120 +56,292 @@ def is_markdown_file_path(file_path_str):
         return False
 
 
-def check_files_state_git():
-    """Checks file states based on Git commits and updates embeddings."""
-    print(f"Using Git to track changes in: {DOCUMENTS_DIR}")
-    changes_processed = False
+def _split_z(output):
+    """Splits NUL-terminated git output into its entries."""
+    return [entry for entry in output.split('\0') if entry]
+
+
+def _hash_worktree_files(repo, paths):
+    """Returns {path: blob_sha} for working-tree files, as `git hash-object` computes them."""
+    blobs = {}
+    paths = sorted(paths)
+    for start in range(0, len(paths), HASH_OBJECT_BATCH):
+        batch = paths[start:start + HASH_OBJECT_BATCH]
+        with span("git.hash_object", files=len(batch)):
+            shas = repo.git.hash_object('--', *batch).splitlines()
+        blobs.update(zip(batch, shas))
+    return blobs
+
+
+def tree_blobs(repo, commit_sha):
+    """Returns {path: blob_sha} for the Markdown files in a commit's tree."""
+    blobs = {}
+    with span("git.ls_tree"):
+        entries = _split_z(repo.git.ls_tree('-r', '-z', commit_sha))
+    for entry in entries:
+        meta, path = entry.split('\t', 1)
+        mode, object_type, sha = meta.split()
+        if object_type == 'blob' and mode in REGULAR_FILE_MODES and is_markdown_file_path(path):
+            blobs[path] = sha
+    return blobs
+
+
+def working_tree_blobs(repo, documents_dir):
+    """Returns {path: blob_sha} for every Markdown file as it currently is on disk.
+
+    Blob SHAs come from the index for files whose working copy matches it; only
+    files with unstaged changes, merge conflicts or no index entry (untracked,
+    not ignored) are hashed from disk.
+    """
+    blobs = {}
+    to_hash = set()
+    with span("git.ls_files"):
+        index_entries = _split_z(repo.git.ls_files('-s', '-z'))
+    for entry in index_entries:
+        meta, path = entry.split('\t', 1)
+        mode, sha, stage = meta.split()
+        if mode not in REGULAR_FILE_MODES or not is_markdown_file_path(path):
+            continue
+        if stage != '0':
+            to_hash.add(path)
+        else:
+            blobs[path] = sha
+
+    # Tracked files whose working copy differs from the index (edited or deleted).
+    with span("git.diff"):
+        unstaged = _split_z(repo.git.diff('--name-only', '-z'))
+    for path in unstaged:
+        if is_markdown_file_path(path):
+            blobs.pop(path, None)
+            to_hash.add(path)
+
+    with span("git.untracked"):
+        untracked = _split_z(repo.git.ls_files('--others', '--exclude-standard', '-z'))
+    for path in untracked:
+        if is_markdown_file_path(path):
+            to_hash.add(path)
+
+    existing = [path for path in to_hash if (documents_dir / path).is_file()]
+    blobs.update(_hash_worktree_files(repo, existing))
+    return blobs
+
+
+def check_files_state_git(vault=None):
+    """Checks file states against the Git index and working tree and updates embeddings.
+
+    Every Markdown path is keyed by its blob SHA, so committed, staged and
+    unstaged edits, reverts and branch switches only re-embed paths whose
+    content actually differs from what was indexed.
+    """
+    vault = get_vault(vault)
+    documents_dir = vault.documents_dir
+    log.info(f"Using Git to track changes in: {documents_dir}")
     repo = None
 
     try:
-        repo = git.Repo(DOCUMENTS_DIR)
+        repo = git.Repo(documents_dir)
         if repo.bare:
-            print(f"Error: Directory {DOCUMENTS_DIR} is a bare Git repository. Cannot process files.")
+            log.error(f"Directory {documents_dir} is a bare Git repository. Cannot process files.")
             return False
 
     except git.InvalidGitRepositoryError:
-        print(f"Error: Directory {DOCUMENTS_DIR} is not a valid Git repository.")
-        print("Please ensure 'markdown_directory' in config.toml points to a Git repository root.")
+        log.error(f"Directory {documents_dir} is not a valid Git repository.")
+        log.info("Please ensure 'markdown_directory' in config.toml points to a Git repository root.")
         return False
 
     except Exception as e:
-        print(f"Error initializing Git repository object at {DOCUMENTS_DIR}: {e}")
+        log.error(f"Error initializing Git repository object at {documents_dir}: {e}")
         return False
 
     try:
         current_head_sha = repo.head.commit.hexsha
+    except ValueError:
+        current_head_sha = None  # Repository without commits yet: only the index and working tree count.
     except Exception as e:
-        print(f"Error getting current HEAD commit from repository: {e}")
+        log.error(f"Error getting current HEAD commit from repository: {e}")
         return False
 
-    last_processed_sha = load_previous_state_git(STATE_FILE)
-    print(f"  Current HEAD commit: {current_head_sha[:7]}")
-    print(f"  Last processed commit: {last_processed_sha[:7] if last_processed_sha else 'None (processing all)'}")
+    journal = open_journal(vault)
+    try:
+        return _check_files_state_git(vault, repo, current_head_sha, journal)
+    finally:
+        journal.close()
 
-    files_to_process = set()
-    files_to_remove = set()
 
-    if last_processed_sha == current_head_sha:
-        print("No new commits detected. Embeddings are up-to-date.")
-        return False
+def _check_files_state_git(vault, repo, current_head_sha, journal):
+    previous_state = load_previous_state_git(vault.state_file)
+    last_processed_sha = previous_state["last_processed_commit"]
+    previous_blobs = previous_state["blobs"]
+    log.info(f"  Current HEAD commit: {current_head_sha[:7] if current_head_sha else 'None'}")
+    log.info(f"  Last processed commit: {last_processed_sha[:7] if last_processed_sha else 'None (processing all)'}")
 
     try:
-        commit_range = f"{last_processed_sha}..{current_head_sha}" if last_processed_sha else current_head_sha
-
-        if last_processed_sha:
+        if previous_blobs is None and last_processed_sha:
+            # State from before per-path tracking: what was indexed is exactly that commit's tree.
             try:
-                last_commit_obj = repo.commit(last_processed_sha)
-            except git.BadName:
-                print(f"Warning: Last processed commit '{last_processed_sha}' not found in repository history. Re-processing all files.")
-                last_processed_sha = None
-
-        if last_processed_sha:
-            print(f"Finding changes between {last_processed_sha[:7]} and {current_head_sha[:7]}...")
-            diffs = repo.commit(last_processed_sha).diff(current_head_sha)
-
-            for diff_item in diffs:
-                if diff_item.change_type == 'D' and is_markdown_file_path(diff_item.a_path):
-                    print(f"  - Detected deleted: {diff_item.a_path}")
-                    files_to_remove.add(diff_item.a_path)
-
-                elif diff_item.change_type in ('A', 'M', 'T') and is_markdown_file_path(diff_item.b_path):
-
-                    if diff_item.change_type == 'M':
-                        print(f"  - Detected modified: {diff_item.b_path}")
-                        files_to_remove.add(diff_item.b_path)
-                    elif diff_item.change_type == 'A':
-                        print(f"  - Detected added: {diff_item.b_path}")
-                    elif diff_item.change_type == 'T':
-                        print(f"  - Detected type change to file: {diff_item.b_path}")
-                    files_to_process.add(DOCUMENTS_DIR / diff_item.b_path)
-
-                elif diff_item.change_type == 'R':
-                    is_a_markdown = is_markdown_file_path(diff_item.a_path)
-                    is_b_markdown = is_markdown_file_path(diff_item.b_path)
-                    print(f"  - Detected renamed: {diff_item.a_path} -> {diff_item.b_path}")
-                    if is_a_markdown:
-                        files_to_remove.add(diff_item.a_path)  # Remove old path ID
-                    if is_b_markdown:
-                        files_to_process.add(DOCUMENTS_DIR / diff_item.b_path)  # Process new path
+                previous_blobs = tree_blobs(repo, last_processed_sha)
+            except git.GitCommandError:
+                log.warning(f"Last processed commit '{last_processed_sha}' not found in repository history. Re-processing all files.")
+                previous_blobs = None
+        if previous_blobs is None:
+            log.info("Processing all Markdown files in the working tree...")
+            previous_blobs = {}
+        previous_blobs, pending = _recover_blobs(vault, journal, previous_state["last_processed_commit"], previous_blobs)
 
-        else:
-            print("Processing all tracked Markdown files...")
-            tracked_files = repo.git.ls_files().splitlines()
-            for file_rel_path in tracked_files:
-                if is_markdown_file_path(file_rel_path):
-                    files_to_process.add(DOCUMENTS_DIR / file_rel_path)
+        current_blobs = working_tree_blobs(repo, vault.documents_dir)
 
     except git.GitCommandError as e:
-        print(f"Error executing Git command: {e}")
+        log.error(f"Error executing Git command: {e}")
         return False
     except Exception as e:
-        print(f"Error processing Git diff: {e}")
+        log.error(f"Error reading Git index and working tree: {e}")
         return False
 
+    files_to_remove = set()
+    files_to_process = set()
+
+    for path, sha in current_blobs.items():
+        previous_sha = previous_blobs.get(path)
+        if previous_sha == sha and path not in pending:
+            continue
+        if previous_sha is None:
+            log.info(f"  - Detected added: {path}")
+        else:
+            log.info(f"  - Detected modified: {path}")
+            files_to_remove.add(path)
+        files_to_process.add(path)
+
+    # Paths an interrupted run left unfinished may have chunks indexed even if they were never recorded.
+    for path in (previous_blobs.keys() | pending) - current_blobs.keys():
+        log.info(f"  - Detected deleted: {path}")
+        files_to_remove.add(path)
+    # Failed deletions are kept: their chunks are still indexed and are retried.
+    journal.forget(path for path, (state, *_) in journal.failures().items()
+                   if path not in current_blobs and state is not None)
+
     if not files_to_process and not files_to_remove:
-        print("No relevant Markdown file changes found in new commits.")
-        if not last_processed_sha:
-            save_current_state_git(current_head_sha, STATE_FILE)
+        log.info("No Markdown content changes detected. Embeddings are up-to-date.")
+        if current_head_sha != last_processed_sha or previous_state["blobs"] is None:
+            save_current_state_git(current_head_sha, current_blobs, vault.state_file)
+        journal.checkpoint()
         return False
 
-    print("\nProcessing detected changes...")
-    changes_processed = True
+    log.info("\nProcessing detected changes...")
 
-    if files_to_remove:
-        print(f"  - Removing embeddings for {len(files_to_remove)} file(s)...")
-        for relative_path_id in files_to_remove:
-            remove_document_from_collection(relative_path_id)
+    existing_files = {}
+    for relative_path in files_to_process:
+        abs_file_path = vault.documents_dir / relative_path
+        if abs_file_path.is_file():
+            existing_files[relative_path] = current_blobs[relative_path]
+        else:
+            log.warning(f"    - Warning: File {abs_file_path} not found, skipping processing.")
+            current_blobs.pop(relative_path, None)
+    changed, not_indexed = index_changes(journal, existing_files, files_to_remove, vault.documents_dir, vault)
+    _keep_previous_blobs(current_blobs, previous_blobs, not_indexed)
+
+    log.info(f"Updating tracking state (HEAD {current_head_sha[:7] if current_head_sha else 'None'}, {len(current_blobs)} file(s)).")
+    save_current_state_git(current_head_sha, current_blobs, vault.state_file)
+    journal.checkpoint()
+
+    return changed
+
+
+def _recover_blobs(vault, journal, last_processed_sha, blobs):
+    """Folds files completed by an interrupted run into the indexed blobs and saves them.
+
+    Returns (blobs, paths the interrupted run left unfinished).
+    """
+    completed, pending = recover(journal)
+    if not completed:
+        return blobs, pending
+    blobs = dict(blobs)
+    for path, sha in completed.items():
+        if sha is None:
+            blobs.pop(path, None)
+        else:
+            blobs[path] = sha
+    save_current_state_git(last_processed_sha, blobs, vault.state_file)
+    journal.forget(completed)
+    return blobs, pending
 
-    if files_to_process:
-        print(f"  - Adding/updating embeddings for {len(files_to_process)} file(s)...")
-        for abs_file_path in files_to_process:
-            if abs_file_path.is_file():
-                process_file_for_embeddings(str(abs_file_path), DOCUMENTS_DIR)
-            else:
-                print(f"    - Warning: File {abs_file_path} not found, skipping processing.")
 
-    print(f"Updating last processed commit to: {current_head_sha[:7]}")
-    save_current_state_git(current_head_sha, STATE_FILE)
+def _keep_previous_blobs(blobs, previous_blobs, paths):
+    """Resets paths that were not indexed to what was indexed before, so they still count as changed."""
+    for path in paths:
+        if path in previous_blobs:
+            blobs[path] = previous_blobs[path]
+        else:
+            blobs.pop(path, None)
+
+
+def _markdown_files_under(documents_dir, relative_dir):
+    """Returns the relative paths of Markdown files currently under a directory, skipping .git."""
+    found = []
+    for path in (documents_dir / relative_dir).rglob('*'):
+        relative_path = str(path.relative_to(documents_dir))
+        if '.git' not in path.parts and is_markdown_file_path(relative_path) and path.is_file():
+            found.append(relative_path)
+    return found
+
+
+def process_changed_paths_git(relative_paths, vault=None):
+    """Re-checks only the given paths (files or directories) against the stored blob SHAs.
+
+    Git-ignored files are skipped just like in a full check. Falls back to
+    check_files_state_git when there is no per-path state to compare against yet.
+    """
+    vault = get_vault(vault)
+    previous_state = load_previous_state_git(vault.state_file)
+    if previous_state["blobs"] is None:
+        return check_files_state_git(vault)
+
+    journal = open_journal(vault)
+    try:
+        return _process_changed_paths_git(vault, relative_paths, previous_state, journal)
+    finally:
+        journal.close()
+
+
+def _process_changed_paths_git(vault, relative_paths, previous_state, journal):
+    documents_dir = vault.documents_dir
+    blobs, pending = _recover_blobs(vault, journal, previous_state["last_processed_commit"], previous_state["blobs"])
+    try:
+        repo = git.Repo(documents_dir)
+        scope = set()
+        for relative_path in relative_paths:
+            if '.git' in Path(relative_path).parts:
+                continue
+            prefix = relative_path + '/'
+            scope.update(path for path in blobs if path.startswith(prefix))
+            if (documents_dir / relative_path).is_dir():
+                scope.update(_markdown_files_under(documents_dir, relative_path))
+            elif is_markdown_file_path(relative_path):
+                scope.add(relative_path)
+        scope.update(pending)
+        if not scope:
+            return False
+
+        existing = [path for path in scope if (documents_dir / path).is_file()]
+        ignored = set(repo.ignored(*existing)) if existing else set()
+        current = _hash_worktree_files(repo, [path for path in existing if path not in ignored])
+    except git.GitCommandError as e:
+        log.error(f"Error executing Git command: {e}")
+        return False
+
+    files_to_process = [path for path, sha in current.items() if blobs.get(path) != sha or path in pending]
+    files_to_remove = [path for path in scope if path in pending or (path in blobs and blobs.get(path) != current.get(path))]
+    if not files_to_process and not files_to_remove:
+        return False
 
-    return changes_processed
+    changed, not_indexed = index_changes(
+        journal, {path: current[path] for path in files_to_process}, files_to_remove, documents_dir, vault
+    )
+
+    previous_blobs = dict(blobs)
+    for path in files_to_remove:
+        blobs.pop(path, None)
+    blobs.update((path, current[path]) for path in files_to_process)
+    _keep_previous_blobs(blobs, previous_blobs, not_indexed)
+    save_current_state_git(previous_state["last_processed_commit"], blobs, vault.state_file)
+    journal.checkpoint()
+    return changed
@@ -0,0 +1,201 @@
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from embeddings_manager import process_files_for_embeddings, remove_documents_from_collection
+from profiling import span
+from settings import config, get_logger
+from vaults import get_vault
+
+log = get_logger(__name__)
+
+indexing_config = config.get("indexing", {})
+
+RETRY_BACKOFF_SECONDS = float(indexing_config.get("retry_backoff_seconds", 60))
+RETRY_BACKOFF_MAX_SECONDS = float(indexing_config.get("retry_backoff_max_seconds", 6 * 3600))
+
+
+class IndexJournal:
+    """Write-ahead journal of the files an index run is working on.
+
+    Each row holds a relative path, its status ("pending", "done" or "failed")
+    and the tracker state (mtime tuple, blob SHA, or None for a deletion) to
+    record once the file is indexed. Rows are committed after every ChromaDB
+    write, while the tracker's own state file is only saved at the end of a
+    run; after a crash, replay() returns what was completed so the tracker can
+    pick up where it stopped. Failed files keep their row, with an attempt
+    count and an exponentially growing retry time.
+    """
+
+    def __init__(self, path, backoff_seconds=RETRY_BACKOFF_SECONDS, backoff_max_seconds=RETRY_BACKOFF_MAX_SECONDS):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.backoff_seconds = backoff_seconds
+        self.backoff_max_seconds = backoff_max_seconds
+        self._lock = threading.Lock()
+        # Rows are written from the indexing pipeline's writer thread.
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS files (
+                   path TEXT PRIMARY KEY,
+                   status TEXT NOT NULL,
+                   state TEXT,
+                   attempts INTEGER NOT NULL DEFAULT 0,
+                   next_retry REAL,
+                   error TEXT
+               ) WITHOUT ROWID"""
+        )
+        self._conn.commit()
+
+    def _rows(self, status):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT path, state, attempts, next_retry, error FROM files WHERE status = ?", (status,)
+            ).fetchall()
+
+    def replay(self):
+        """Returns {path: state} for files completed by a run that did not get to save its state."""
+        return {path: json.loads(state) for path, state, _, _, _ in self._rows("done")}
+
+    def pending(self):
+        """Returns the paths an interrupted run had started on but not completed."""
+        return {path for path, _, _, _, _ in self._rows("pending")}
+
+    def failures(self):
+        """Returns {path: (state, attempts, next_retry, error)} for files that failed to index."""
+        return {path: (json.loads(state), attempts, next_retry, error)
+                for path, state, attempts, next_retry, error in self._rows("failed")}
+
+    def deferred(self, files, now=None):
+        """Returns {path: next_retry} for files in {path: state} that failed with this same state and are still backing off."""
+        now = time.time() if now is None else now
+        return {
+            path: next_retry for path, (state, _, next_retry, _) in self.failures().items()
+            if path in files and next_retry > now and state == json.loads(json.dumps(files[path]))
+        }
+
+    def begin(self, files, deletions=()):
+        """Marks {path: target state} and deleted paths as pending, before any index write."""
+        rows = [(path, json.dumps(state)) for path, state in files.items()]
+        rows += [(path, json.dumps(None)) for path in deletions]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                """INSERT INTO files (path, status, state) VALUES (?, 'pending', ?)
+                   ON CONFLICT(path) DO UPDATE SET status = 'pending', state = excluded.state""",
+                rows,
+            )
+
+    def record(self, done, failed=None):
+        """Commits completed files ({path: state}) and failures ({path: (state, error)}) in one transaction."""
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                """INSERT INTO files (path, status, state, attempts, next_retry, error) VALUES (?, 'done', ?, 0, NULL, NULL)
+                   ON CONFLICT(path) DO UPDATE SET status = 'done', state = excluded.state,
+                   attempts = 0, next_retry = NULL, error = NULL""",
+                [(path, json.dumps(state)) for path, state in done.items()],
+            )
+            for path, (state, error) in (failed or {}).items():
+                row = self._conn.execute("SELECT attempts FROM files WHERE path = ?", (path,)).fetchone()
+                attempts = (row[0] if row else 0) + 1
+                delay = min(self.backoff_max_seconds, self.backoff_seconds * 2 ** (attempts - 1))
+                self._conn.execute(
+                    """INSERT INTO files (path, status, state, attempts, next_retry, error) VALUES (?, 'failed', ?, ?, ?, ?)
+                       ON CONFLICT(path) DO UPDATE SET status = 'failed', state = excluded.state,
+                       attempts = excluded.attempts, next_retry = excluded.next_retry, error = excluded.error""",
+                    (path, json.dumps(state), attempts, now + delay, error),
+                )
+
+    def forget(self, paths):
+        """Drops the rows of paths that no longer need retrying (e.g. deleted files)."""
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM files WHERE path = ?", [(path,) for path in paths])
+
+    def checkpoint(self):
+        """Clears completed and pending rows once the tracker has saved its state; failures are kept."""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM files WHERE status != 'failed'")
+
+    def close(self):
+        self._conn.close()
+
+
+def open_journal(vault=None):
+    # The journal lives next to the vault's tracker state file, which it checkpoints into.
+    return IndexJournal(get_vault(vault).journal_file)
+
+
+def recover(journal):
+    """Returns what an interrupted run left in the journal, as (completed, pending).
+
+    completed maps the files it finished to their state; pending holds the
+    paths it had started on, which may have some chunks indexed. Trackers
+    re-index the pending paths that still exist and remove the rest.
+    """
+    completed = journal.replay()
+    pending = journal.pending()
+    if completed or pending:
+        log.info(f"Resuming an interrupted index run: {len(completed)} file(s) were completed, "
+                 f"{len(pending)} file(s) were still in progress.")
+    return completed, pending
+
+
+def index_changes(journal, files_to_process, files_to_remove, base_dir, vault=None):
+    """Applies one run's changes to the index, journaling progress per batch.
+
+    files_to_process maps relative paths to re-index to the state to record
+    for them; files_to_remove holds paths whose existing embeddings are stale
+    (deleted or modified files). Files and deletions that recently failed with
+    the same state are skipped until their retry time. A file whose old
+    embeddings cannot be removed fails as a whole, so it is neither re-indexed
+    on top of them nor dropped from the tracker state. Returns (changed,
+    not_indexed): whether the index was touched at all, and the paths whose new
+    state must not be saved (failed and skipped files, which stay "changed" so a
+    later check retries them).
+    """
+    deletions = [path for path in files_to_remove if path not in files_to_process]
+    deferred = journal.deferred({**dict.fromkeys(deletions), **files_to_process})
+    if deferred:
+        next_retry = min(deferred.values()) - time.time()
+        log.info(f"  - Skipping {len(deferred)} file(s) that failed recently (next retry in {max(0, next_retry):.0f}s).")
+    to_process = {path: state for path, state in files_to_process.items() if path not in deferred}
+    deletions = [path for path in deletions if path not in deferred]
+
+    # Files retried after a failure or an interrupted run may have some chunks indexed already.
+    interrupted = (journal.pending() | set(journal.failures())) & to_process.keys()
+    stale = (set(files_to_remove) - deferred.keys()) | interrupted
+
+    with span("journal.begin", files=len(to_process) + len(deletions)):
+        journal.begin(to_process, deletions)
+
+    failed = {}
+    if stale:
+        log.info(f"  - Removing embeddings for {len(stale)} file ID(s)...")
+        failed = dict.fromkeys(remove_documents_from_collection(stale, vault), "Could not remove its old embeddings")
+    journal.record(
+        {path: None for path in deletions if path not in failed},
+        {path: (to_process.get(path), error) for path, error in failed.items()},
+    )
+    to_process = {path: state for path, state in to_process.items() if path not in failed}
+
+    def on_commit(done, failures):
+        with span("journal.commit", files=len(done) + len(failures)):
+            journal.record(
+                {path: to_process[path] for path in done if path in to_process},
+                {path: (to_process[path], error) for path, error in failures.items() if path in to_process},
+            )
+        failed.update(failures)
+
+    if to_process:
+        log.info(f"  - Adding/updating embeddings for {len(to_process)} file(s)...")
+        process_files_for_embeddings([Path(base_dir) / path for path in to_process], base_dir, on_commit=on_commit, vault=vault)
+
+    if failed:
+        retries = journal.failures()
+        for path, error in sorted(failed.items()):
+            attempts, next_retry = retries[path][1], retries[path][2]
+            log.warning(f"    - Failed to index {path} (attempt {attempts}, retry in {max(0, next_retry - time.time()):.0f}s): {error}")
+    return bool(stale or to_process), set(deferred) | set(failed)
@@ -1,150 +1,304 @@
 import os
 import json
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-import toml
-from embeddings_manager import remove_document_from_collection, process_file_for_embeddings
+import hashlib
+from profiling import span
+from tracking.index_journal import index_changes, open_journal, recover
+from settings import config, get_logger
+from vaults import get_vault
 
-config = toml.load("config.toml")
+log = get_logger(__name__)
 
-TRACKING_METHOD = config['state_tracking'].get('method', 'mtime').lower()
+IGNORED_DIRS = frozenset(config['state_tracking'].get('ignore_dirs', ['.git']))
+SCAN_WORKERS = int(config['state_tracking'].get('scan_workers', 1))
+MARKDOWN_EXTENSIONS = ('.md', '.markdown')
 
-if TRACKING_METHOD not in ["mtime", "git"]:
-    raise ValueError(f"Invalid state_tracking method '{TRACKING_METHOD}' in config. Must be 'mtime' or 'git'.")
 
-DOCUMENTS_DIR = Path(config["files"]["markdown_directory"]).resolve()
-STATE_FILE = Path(config['files']['state_file']).resolve()
+class MtimeStateStore:
+    """Compact SQLite store of (relative path -> mtime_ns, size, content hash).
 
+    Only rows that changed are written, inside a single transaction.
+    """
 
-def load_previous_state_mtime(state_file_path):
-    if state_file_path.exists():
-        try:
-            with open(state_file_path, 'r') as f:
-                content = f.read()
-                if not content:
-                    return {}
-                return json.loads(content)
-        except json.JSONDecodeError:
-            print(f"Warning: State file {state_file_path} is corrupted (mtime mode). Starting fresh.")
-            return {}
-        except Exception as e:
-            print(f"Error loading state file {state_file_path} (mtime mode): {e}. Starting fresh.")
-            return {}
-    return {}
-
-
-def save_current_state_mtime(state_data, state_file_path):
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path))
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS files (
+                   path TEXT PRIMARY KEY,
+                   mtime_ns INTEGER NOT NULL,
+                   size INTEGER NOT NULL,
+                   hash BLOB
+               ) WITHOUT ROWID"""
+        )
+        self._conn.commit()
+
+    def load(self):
+        """Returns {relative_path: (mtime_ns, size, hash)}."""
+        return {path: (mtime_ns, size, digest.hex() if digest else None) for path, mtime_ns, size, digest in self._conn.execute(
+            "SELECT path, mtime_ns, size, hash FROM files"
+        )}
+
+    def apply(self, upserts, deletes):
+        """Writes changed rows ({path: (mtime_ns, size, hash)}) and removes deleted paths."""
+        if not upserts and not deletes:
+            return
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO files (path, mtime_ns, size, hash) VALUES (?, ?, ?, ?)",
+                [(path, mtime_ns, size, bytes.fromhex(digest) if digest else None)
+                 for path, (mtime_ns, size, digest) in upserts.items()],
+            )
+            self._conn.executemany("DELETE FROM files WHERE path = ?", [(path,) for path in deletes])
+
+    def close(self):
+        self._conn.close()
+
+
+def load_legacy_state_mtime(state_file_path, base_dir):
+    """Reads a pre-SQLite JSON state file (keyed by absolute path) as {relative_path: (mtime_ns, size, hash)}."""
     try:
-        state_file_path.parent.mkdir(parents=True, exist_ok=True)
-        with open(state_file_path, 'w') as f:
-            json.dump(state_data, f, indent=4)
-    except Exception as e:
-        print(f"Error saving state file {state_file_path} (mtime mode): {e}")
+        with open(state_file_path, 'r') as f:
+            content = f.read()
+        data = json.loads(content) if content else {}
+    except (OSError, json.JSONDecodeError) as e:
+        log.warning(f"Could not read legacy state file {state_file_path} ({e}). Starting fresh.")
+        return {}
+
+    state = {}
+    for abs_path_str, entry in data.items():
+        try:
+            relative_path = str(Path(abs_path_str).relative_to(base_dir))
+            state[relative_path] = (int(entry['mtime'] * 1_000_000_000), entry['size'], entry.get('hash'))
+        except (ValueError, KeyError, TypeError):
+            continue
+    return state
+
+
+def file_content_hash(file_path):
+    """Returns the SHA-256 hex digest of a file's bytes."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
 
 
 def is_markdown_file_path(file_path_str):
     """Checks if a string path ends with a markdown extension."""
-    extensions = ['.md', '.markdown']
-    try:
-        return Path(file_path_str).suffix.lower() in extensions
-    except Exception:
-        return False
+    return file_path_str.lower().endswith(MARKDOWN_EXTENSIONS)
 
 
-def check_files_state_mtime():
-    """Original state check based on mtime and size."""
-    print(f"Using mtime tracking method for directory: {DOCUMENTS_DIR}")
+def _scan_tree(top, prefix, ignored_dirs):
+    """Iteratively walks one directory tree with os.scandir.
 
-    if not DOCUMENTS_DIR.is_dir():
-        print(f"Error: Document directory not found or is not a directory: {DOCUMENTS_DIR}")
-        return False
+    Ignored directories are pruned before descending and every Markdown file
+    costs a single stat call. Returns {relative_path: (mtime_ns, size)}.
+    """
+    found = {}
+    stack = [(top, prefix)]
+    while stack:
+        directory, rel_dir = stack.pop()
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if entry.name not in ignored_dirs:
+                                stack.append((entry.path, rel_dir + entry.name + os.sep))
+                        elif is_markdown_file_path(entry.name) and entry.is_file():
+                            stat = entry.stat()
+                            found[rel_dir + entry.name] = (stat.st_mtime_ns, stat.st_size)
+                    except OSError as e:
+                        log.warning(f"Error accessing file {entry.path}: {e}. Skipping.")
+        except OSError as e:
+            log.warning(f"Error scanning directory {directory}: {e}. Skipping.")
+    return found
+
+
+def scan_markdown_files(base_dir, ignored_dirs=IGNORED_DIRS, workers=SCAN_WORKERS):
+    """Returns {relative_path: (mtime_ns, size)} for every Markdown file under base_dir.
+
+    With workers > 1, each top-level subdirectory is scanned in its own thread.
+    """
+    base_dir = str(base_dir)
+    if workers <= 1:
+        return _scan_tree(base_dir, "", ignored_dirs)
 
-    abs_state_file = STATE_FILE.resolve()
-    previous_state = load_previous_state_mtime(abs_state_file)
-    current_state = {}
-    found_files = set()
-    files_to_process_abs = []
-    files_to_remove_abs = []
-    changes_made = False
+    found = {}
+    subtrees = []
+    with os.scandir(base_dir) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                if entry.name not in ignored_dirs:
+                    subtrees.append((entry.path, entry.name + os.sep))
+            elif is_markdown_file_path(entry.name) and entry.is_file():
+                stat = entry.stat()
+                found[entry.name] = (stat.st_mtime_ns, stat.st_size)
 
-    for root, _, filenames in os.walk(DOCUMENTS_DIR):
-        if '.git' in Path(root).parts:
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for subtree in executor.map(lambda args: _scan_tree(*args, ignored_dirs), subtrees):
+            found.update(subtree)
+    return found
+
+
+def _sync_changes(vault, store, journal, previous_state, current_files, scope=None, pending=()):
+    """Re-indexes changed files and records their state.
+
+    current_files holds the scanned {relative_path: (mtime_ns, size)}; scope, if
+    given, limits which previously known paths may be treated as deleted (for a
+    partial scan). pending holds the paths an interrupted run left unfinished:
+    they are re-indexed if they still exist and removed otherwise. Progress is
+    journaled per batch (see index_journal), and files that fail keep their old
+    state so they are retried. Returns True if any embeddings were updated.
+    """
+    upserts = {}
+    files_to_process = []
+    touched_only = False
+
+    for relative_path, (mtime_ns, size) in current_files.items():
+        previous = previous_state.get(relative_path)
+        if previous is not None and previous[0] == mtime_ns and previous[1] == size and relative_path not in pending:
             continue
 
-        for filename in filenames:
-            file_path = Path(root) / filename
-            if not is_markdown_file_path(str(file_path)):
-                continue
+        try:
+            with span("file.hash", bytes=size):
+                current_hash = file_content_hash(vault.documents_dir / relative_path)
+        except OSError as e:
+            log.warning(f"Error accessing file {relative_path}: {e}. Skipping.")
+            continue
+        upserts[relative_path] = (mtime_ns, size, current_hash)
+
+        if previous is not None and previous[2] == current_hash and relative_path not in pending:
+            # Touched (e.g. by a sync tool) but unchanged: only the state needs updating.
+            touched_only = True
+            continue
+        files_to_process.append(relative_path)
 
-            abs_path_str = str(file_path.resolve())
-            found_files.add(abs_path_str)
-
-            try:
-                if not file_path.is_file():
-                    continue
-
-                current_mtime = os.path.getmtime(file_path)
-                current_size = os.path.getsize(file_path)
-                current_state[abs_path_str] = {
-                    'mtime': current_mtime,
-                    'size': current_size
-                }
-
-                prev_file_state = previous_state.get(abs_path_str)
-                if not prev_file_state:
-                    # print(f"Detected new file: {file_path.relative_to(DOCUMENTS_DIR)}") # Optional
-                    files_to_process_abs.append(abs_path_str)
-                elif (prev_file_state['mtime'] != current_mtime or prev_file_state['size'] != current_size):
-                    # print(f"Detected modified file: {file_path.relative_to(DOCUMENTS_DIR)}") # Optional
-                    files_to_process_abs.append(abs_path_str)
-
-            except OSError as e:
-                print(f"Error accessing file {file_path}: {e}. Skipping.")
-            except Exception as e:
-                print(f"Unexpected error processing file {file_path}: {e}. Skipping.")
-
-    previous_files_abs = set(previous_state.keys())
-    deleted_files_abs = previous_files_abs - found_files
-    files_to_remove_abs.extend(list(deleted_files_abs))
-
-    # if deleted_files_abs:
-    #     deleted_relative = [str(Path(p).relative_to(DOCUMENTS_DIR)) for p in deleted_files_abs]
-    #     print(f"Detected deleted files: {', '.join(deleted_relative)}")
-
-    if not files_to_process_abs and not files_to_remove_abs:
-        save_current_state_mtime(current_state, abs_state_file)
+    candidates = previous_state if scope is None else (path for path in scope if path in previous_state)
+    deleted_files = [path for path in candidates if path not in current_files]
+    # An interrupted run may have indexed chunks of a new file that is gone now.
+    deleted_files += [path for path in pending if path not in current_files and path not in previous_state]
+    if scope is None:
+        # Failed deletions are kept: their chunks are still indexed and are retried.
+        journal.forget(path for path, (state, *_) in journal.failures().items()
+                       if path not in current_files and state is not None)
+
+    if not files_to_process and not deleted_files:
+        with span("state.save", rows=len(upserts)):
+            store.apply(upserts, [])
+        journal.checkpoint()
+        if touched_only:
+            log.info("Only file timestamps changed; contents are unchanged. Embeddings are up-to-date.")
         return False
 
-    print("\nProcessing detected changes (mtime)...")
-    changes_made = True
-
-    files_needing_removal_ids = set()
-
-    for abs_path_str in files_to_remove_abs:
-        if abs_path_str in previous_state:
-            try:
-                relative_path = str(Path(abs_path_str).relative_to(DOCUMENTS_DIR.resolve()))
-                files_needing_removal_ids.add(relative_path)
-            except ValueError:
-                pass
-
-    for abs_path_str in files_to_process_abs:
-        if abs_path_str in previous_state:
-            try:
-                relative_path = str(Path(abs_path_str).relative_to(DOCUMENTS_DIR.resolve()))
-                files_needing_removal_ids.add(relative_path)
-            except ValueError:
-                pass
-
-    if files_needing_removal_ids:
-        print(f"  - Removing embeddings for {len(files_needing_removal_ids)} file ID(s)...")
-        for doc_id in files_needing_removal_ids:
-            remove_document_from_collection(doc_id)
-
-    if files_to_process_abs:
-        print(f"  - Adding/updating embeddings for {len(files_to_process_abs)} file(s)...")
-        for file_path_str in files_to_process_abs:
-            process_file_for_embeddings(file_path_str, DOCUMENTS_DIR.resolve())
-
-    print("Change processing complete (mtime).")
-    save_current_state_mtime(current_state, abs_state_file)
-    return changes_made
+    log.info("\nProcessing detected changes (mtime)...")
+
+    files_needing_removal_ids = set(deleted_files)
+    files_needing_removal_ids.update(path for path in files_to_process if path in previous_state)
+
+    changed, not_indexed = index_changes(
+        journal, {path: upserts[path] for path in files_to_process}, files_needing_removal_ids, vault.documents_dir, vault
+    )
+
+    log.info("Change processing complete (mtime).")
+    upserts = {path: values for path, values in upserts.items() if path not in not_indexed}
+    deleted_files = [path for path in deleted_files if path not in not_indexed]
+    with span("state.save", rows=len(upserts) + len(deleted_files)):
+        store.apply(upserts, deleted_files)
+    journal.checkpoint()
+    return changed
+
+
+def _load_state(vault, store, journal):
+    """Loads the stored state, migrating a legacy JSON state file on first use.
+
+    Files completed by an interrupted run are replayed from the journal first.
+    Returns (previous state, paths the interrupted run left unfinished).
+    """
+    with span("state.load") as s:
+        previous_state = store.load()
+        s.set(rows=len(previous_state))
+    if not previous_state and vault.state_file.is_file():
+        log.info(f"Migrating mtime state from {vault.state_file} to {vault.state_db}...")
+        previous_state = load_legacy_state_mtime(vault.state_file, vault.documents_dir)
+        store.apply(previous_state, [])
+    completed, pending = recover(journal)
+    if completed:
+        upserts = {path: tuple(values) for path, values in completed.items() if values is not None}
+        deletes = [path for path, values in completed.items() if values is None]
+        store.apply(upserts, deletes)
+        journal.forget(completed)
+        previous_state.update(upserts)
+        for path in deletes:
+            previous_state.pop(path, None)
+    return previous_state, pending
+
+
+def check_files_state_mtime(vault=None):
+    """State check based on mtime and size, with a content-hash check for touched files."""
+    vault = get_vault(vault)
+    log.info(f"Using mtime tracking method for directory: {vault.documents_dir}")
+
+    if not vault.documents_dir.is_dir():
+        log.error(f"Document directory not found or is not a directory: {vault.documents_dir}")
+        return False
+
+    store = MtimeStateStore(vault.state_db)
+    journal = open_journal(vault)
+    try:
+        previous_state, pending = _load_state(vault, store, journal)
+        with span("scan.mtime", workers=vault.scan_workers) as s:
+            current_files = scan_markdown_files(vault.documents_dir, vault.ignore_dirs, vault.scan_workers)
+            s.set(files=len(current_files))
+        return _sync_changes(vault, store, journal, previous_state, current_files, pending=pending)
+    finally:
+        journal.close()
+        store.close()
+
+
+def is_ignored_path(relative_path, ignored_dirs=IGNORED_DIRS):
+    """Checks if any component of a relative path is an ignored directory."""
+    return any(part in ignored_dirs for part in Path(relative_path).parts)
+
+
+def process_changed_paths_mtime(relative_paths, vault=None):
+    """Re-checks only the given paths (files or directories) instead of scanning the whole vault.
+
+    A directory expands to the Markdown files currently under it plus every
+    previously indexed path beneath it, which covers directory renames and deletes.
+    Paths left unfinished by an interrupted run are always re-checked too.
+    """
+    vault = get_vault(vault)
+    store = MtimeStateStore(vault.state_db)
+    journal = open_journal(vault)
+    try:
+        previous_state, pending = _load_state(vault, store, journal)
+        scope = set()
+        current_files = {}
+        for relative_path in [*relative_paths, *sorted(pending)]:
+            if is_ignored_path(relative_path, vault.ignore_dirs):
+                continue
+            abs_path = vault.documents_dir / relative_path
+            prefix = relative_path + os.sep
+            scope.update(path for path in previous_state if path.startswith(prefix))
+            if abs_path.is_dir():
+                for path, values in scan_markdown_files(abs_path, vault.ignore_dirs, workers=1).items():
+                    current_files[prefix + path] = values
+                    scope.add(prefix + path)
+            elif is_markdown_file_path(relative_path):
+                scope.add(relative_path)
+                try:
+                    stat = abs_path.stat()
+                    current_files[relative_path] = (stat.st_mtime_ns, stat.st_size)
+                except FileNotFoundError:
+                    pass
+        if not scope:
+            return False
+        return _sync_changes(vault, store, journal, previous_state, current_files, scope, pending)
+    finally:
+        journal.close()
+        store.close()
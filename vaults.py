@@ -0,0 +1,119 @@
+from pathlib import Path
+from settings import config, get_logger
+
+log = get_logger(__name__)
+
+embeddings_config = config["embeddings"]
+tracking_config = config.get("state_tracking", {})
+retrieval_config = config.get("retrieval", {})
+
+# The vault configured by [files] keeps the unsuffixed collection, index and state file names.
+DEFAULT_VAULT = "default"
+
+
+class Vault:
+    """One notes directory with its own tracking method, state and ChromaDB collection (shard).
+
+    Archive vaults are left out of automatic refreshes and watching; their shard
+    is only opened, and never created, when a query selects it.
+    """
+
+    def __init__(self, name, markdown_directory, state_file=None, method="mtime", collection_name=None,
+                 embeddings_path=None, ignore_dirs=(".git",), scan_workers=1, archive=False):
+        self.name = name
+        self.documents_dir = Path(markdown_directory).expanduser().resolve()
+        self.method = method.lower()
+        if self.method not in ("mtime", "git"):
+            log.warning(f"Invalid state_tracking method '{method}' for vault '{name}'. Must be 'mtime' or 'git'.")
+            log.warning("Defaulting to 'mtime' method.")
+            self.method = "mtime"
+        self.embeddings_path = Path(embeddings_path or embeddings_config["embeddings_path"]).expanduser()
+        self.collection_name = collection_name or self._suffixed(embeddings_config["collection_name"], "_")
+        # By default the state is kept with the index rather than written into the notes.
+        self.state_file = Path(state_file or self.index_path("state", ".json")).expanduser().resolve()
+        self.ignore_dirs = frozenset(ignore_dirs)
+        self.scan_workers = int(scan_workers)
+        self.archive = bool(archive)
+
+    def __repr__(self):
+        return f"Vault({self.name!r}, {str(self.documents_dir)!r}, method={self.method!r}, archive={self.archive})"
+
+    @property
+    def is_default(self):
+        return self.name == DEFAULT_VAULT
+
+    def _suffixed(self, stem, separator):
+        return stem if self.is_default else f"{stem}{separator}{self.name}"
+
+    def index_path(self, stem, suffix):
+        """Returns the path of a per-vault index file in embeddings_path, e.g. bm25.sqlite3 or bm25_team.sqlite3."""
+        return self.embeddings_path / f"{self._suffixed(stem, '_')}{suffix}"
+
+    @property
+    def state_db(self):
+        # mtime state lives in a SQLite file next to the configured state file.
+        return self.state_file.with_suffix('.sqlite3')
+
+    @property
+    def journal_file(self):
+        return self.state_file.with_suffix('.journal.sqlite3')
+
+    def document_id(self, chunk_id):
+        """Returns the ID a chunk is referenced by in query results: prefixed with the vault name when there are several."""
+        return chunk_id if len(VAULTS) == 1 else f"{self.name}:{chunk_id}"
+
+
+def _load_vaults():
+    """Reads the default vault from [files] / [state_tracking] and any named [vaults.<name>] tables."""
+    defaults = {
+        "method": tracking_config.get("method", "mtime"),
+        "ignore_dirs": tracking_config.get("ignore_dirs", [".git"]),
+        "scan_workers": tracking_config.get("scan_workers", 1),
+    }
+    vaults = {}
+    files_config = config.get("files", {})
+    if "markdown_directory" in files_config:
+        vaults[DEFAULT_VAULT] = Vault(
+            DEFAULT_VAULT, files_config["markdown_directory"], files_config.get("state_file"),
+            collection_name=embeddings_config["collection_name"], **defaults,
+        )
+    for name, table in config.get("vaults", {}).items():
+        if name in vaults:
+            raise ValueError(f"Vault '{name}' is defined twice; '{DEFAULT_VAULT}' is the vault configured in [files].")
+        if "markdown_directory" not in table:
+            raise ValueError(f"[vaults.{name}] needs a markdown_directory.")
+        settings = {**defaults, **table}
+        vaults[name] = Vault(name, **settings)
+    if not vaults:
+        raise ValueError("No vault configured: set markdown_directory in [files] or add a [vaults.<name>] table.")
+    return vaults
+
+
+VAULTS = _load_vaults()
+
+
+def get_vault(name=None):
+    """Returns a vault by name, or the first configured vault."""
+    if name is None:
+        return next(iter(VAULTS.values()))
+    if isinstance(name, Vault):
+        return name
+    try:
+        return VAULTS[name]
+    except KeyError:
+        raise ValueError(f"Unknown vault '{name}'. Configured vaults: {', '.join(VAULTS)}.")
+
+
+def writable_vaults():
+    """Returns the vaults that are indexed by refreshes and watch mode (every vault except archives)."""
+    return [vault for vault in VAULTS.values() if not vault.archive]
+
+
+def select_vaults(names=None):
+    """Returns the vaults a query searches: the given names, else [retrieval] vaults, else every non-archive vault."""
+    names = names or retrieval_config.get("vaults")
+    if not names:
+        return writable_vaults()
+    if isinstance(names, str):
+        names = [name.strip() for name in names.split(",") if name.strip()]
+    return [get_vault(name) for name in dict.fromkeys(names)]
@@ -0,0 +1,139 @@
+import errno
+import os
+import threading
+from pathlib import Path
+from tracking.check_state import check_files_state, process_changed_paths
+from settings import config, get_logger, setup_logging
+from vaults import writable_vaults
+
+log = get_logger(__name__)
+
+watch_config = config.get("watch", {})
+
+DEBOUNCE_MS = int(watch_config.get("debounce_ms", 1000))
+POLL_INTERVAL = float(watch_config.get("poll_interval", 30))
+
+
+def _is_watch_limit_error(error):
+    """Checks if an error means the kernel refused more inotify watches or instances."""
+    if isinstance(error, OSError) and error.errno in (errno.ENOSPC, errno.EMFILE):
+        return True
+    # watchfiles raises the watch limit as a plain OSError without errno ("... Error { kind: MaxFilesWatch }").
+    message = str(error).lower()
+    return any(marker in message for marker in ("os error 28", "os error 24", "inotify", "watch limit", "maxfileswatch"))
+
+
+def _vault_relative_path(path, vaults):
+    """Returns (vault, relative path) for the innermost watched vault containing path, or (None, None)."""
+    for vault in sorted(vaults, key=lambda vault: len(vault.documents_dir.parts), reverse=True):
+        try:
+            relative_path = os.path.relpath(path, vault.documents_dir)
+        except ValueError:
+            continue
+        if relative_path.startswith('..') or relative_path == '.':
+            continue
+        return vault, relative_path
+    return None, None
+
+
+def relevant_relative_paths(paths, vaults=None):
+    """Maps absolute event paths to {vault: vault-relative paths} worth re-checking.
+
+    Paths are not filtered by extension: a renamed or deleted directory (which
+    may have a dot in its name, e.g. v1.2/) can only be told apart from a file
+    by the tracker, which expands directories, checks the notes indexed under
+    them and ignores everything that is not Markdown.
+    """
+    vaults = writable_vaults() if vaults is None else vaults
+    relative_paths = {}
+    for path in paths:
+        vault, relative_path = _vault_relative_path(path, vaults)
+        if vault is None:
+            continue
+        if any(part in vault.ignore_dirs or part == '.git' for part in Path(relative_path).parts):
+            continue
+        relative_paths.setdefault(vault, set()).add(relative_path)
+    return relative_paths
+
+
+def apply_changes(paths, lock=None):
+    """Feeds one coalesced batch of changed paths through each affected vault's incremental update."""
+    changes = relevant_relative_paths(paths)
+    if not changes:
+        return False
+    changed = False
+    for vault, relative_paths in changes.items():
+        log.info(f"Change detected in {len(relative_paths)} path(s) of vault '{vault.name}'; updating embeddings...")
+        with lock or threading.Lock():
+            changed = process_changed_paths(sorted(relative_paths), vault) or changed
+    return changed
+
+
+def _poll(stop_event, lock):
+    """Fallback loop: runs every vault's full incremental check periodically."""
+    log.info(f"Falling back to a periodic scan every {POLL_INTERVAL:.0f}s.")
+    while not stop_event.wait(POLL_INTERVAL):
+        with lock:
+            check_files_state()
+
+
+def watch(stop_event=None, lock=None):
+    """Watches every non-archive vault directory and incrementally indexes notes as they change.
+
+    Bursts of events (e.g. editor save sequences) are debounced and coalesced by
+    watchfiles before being applied. If inotify watch limits are hit, or
+    watchfiles is not installed, it falls back to a periodic scan. Runs until
+    stop_event is set or the process is interrupted.
+    """
+    stop_event = stop_event or threading.Event()
+    lock = lock or threading.Lock()
+
+    with lock:
+        check_files_state()
+
+    try:
+        from watchfiles import DefaultFilter, watch as watch_files
+    except ImportError:
+        log.warning("watchfiles is not installed (pip install watchfiles).")
+        _poll(stop_event, lock)
+        return
+
+    vaults = writable_vaults()
+    directories = [vault.documents_dir for vault in vaults]
+    ignored_dirs = set().union(*(vault.ignore_dirs for vault in vaults)) | {'.git'}
+    watch_filter = DefaultFilter(ignore_dirs=tuple(ignored_dirs | set(DefaultFilter.ignore_dirs)))
+    log.info(f"Watching {', '.join(map(str, directories))} for changes (Ctrl+C to stop)...")
+    try:
+        for changes in watch_files(
+            *directories,
+            watch_filter=watch_filter,
+            debounce=DEBOUNCE_MS,
+            stop_event=stop_event,
+            raise_interrupt=False,
+        ):
+            try:
+                apply_changes({path for _, path in changes}, lock)
+            except Exception as e:
+                log.error(f"Error updating embeddings for changed files: {e}")
+    except (OSError, RuntimeError) as e:
+        if not _is_watch_limit_error(e):
+            raise
+        log.warning(f"Could not watch {', '.join(map(str, directories))} ({e}).")
+        log.info("Raise fs.inotify.max_user_watches to use event-based watching.")
+        _poll(stop_event, lock)
+
+
+def start_watch_thread(lock=None):
+    """Starts watch() in a daemon thread and returns (thread, stop_event)."""
+    stop_event = threading.Event()
+    thread = threading.Thread(target=watch, args=(stop_event, lock), name="querymd-watch", daemon=True)
+    thread.start()
+    return thread, stop_event
+
+
+if __name__ == "__main__":
+    setup_logging()
+    try:
+        watch()
+    except KeyboardInterrupt:
+        pass